@@ -1,4 +1,5 @@
 from pathlib import Path
+import logging
 import environ
 import dj_database_url
 
@@ -71,6 +72,7 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "base.sellerstats.SellerStatsMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 
     # REQUIRED FOR ALLAUTH
@@ -119,6 +121,36 @@ else:
         }
     }
 
+# =========================
+# CACHE
+# Search generations, the typeahead event log, the homepage snapshot and
+# the featured rotation pool are shared between gunicorn workers and the
+# scheduler through this cache, so production needs CACHE_URL pointing at
+# redis (e.g. redis://host:6379/1). locmem is per process: without a
+# shared cache each worker keeps its own copy, which still works but
+# lets workers disagree, so production only warns about it.
+# =========================
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+}
+if not DEBUG and CACHES["default"]["BACKEND"].endswith(("LocMemCache", "DummyCache")):
+    logging.getLogger(__name__).warning(
+        "CACHE_URL is not set to a shared cache such as redis://; every worker "
+        "keeps its own search generations, homepage snapshot and rotation pool"
+    )
+
+# =========================
+# SEARCH
+# Dotted path to a base.search backend class. Leave empty to pick one
+# from the database engine: Postgres tsvector + GIN, SQLite FTS5,
+# plain icontains for anything else. base.search.segments.SegmentSearchBackend
+# is a database-independent alternative (run rebuild_search_index first).
+# =========================
+SEARCH_BACKEND = env("SEARCH_BACKEND", default="")
+# Segment files for base.search.segments.SegmentSearchBackend, shared by
+# every worker on the host
+SEARCH_INDEX_DIR = env("SEARCH_INDEX_DIR", default=str(BASE_DIR / "search_index"))
+
 # =========================
 # PASSWORD VALIDATION
 # =========================
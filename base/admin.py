@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.db import transaction
-from .models import User, Ad, Comment, Category, AdImage, PendingFeaturedAd, FeaturedAd, FeaturedAdHistory, Notification
+from .models import User, Ad, Comment, Category, Location, LocationAlias, SynonymGroup, SearchQueryStat, AdImage, PendingFeaturedAd, FeaturedAd, FeaturedAdHistory, Notification
 import logging
 
 logger = logging.getLogger(__name__)
@@ -82,10 +82,42 @@ class CommentInline(admin.TabularInline):
     extra = 0
     readonly_fields = ['text', 'user', 'timestamp']
 
+class LocationAliasInline(admin.TabularInline):
+    model = LocationAlias
+    extra = 1
+    fields = ('name',)
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'region')
+    list_filter = ('kind', 'region')
+    search_fields = ('name', 'aliases__name')
+    inlines = [LocationAliasInline]
+
+@admin.register(SynonymGroup)
+class SynonymGroupAdmin(admin.ModelAdmin):
+    list_display = ('words',)
+    search_fields = ('words',)
+
+@admin.register(SearchQueryStat)
+class SearchQueryStatAdmin(admin.ModelAdmin):
+    """Top, zero-result and slow searches, filled by rollup_search_log"""
+    list_display = ('query', 'day', 'searches', 'zero_results', 'p50_ms', 'p95_ms', 'p99_ms')
+    list_filter = ('day',)
+    search_fields = ('query',)
+    ordering = ('-day', '-searches')
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Ad)
 class AdAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'advertiser', 'is_approved', 'created_at', 'price', 'status_indicator']
-    list_filter = ['is_approved', 'category', 'status']
+    list_filter = ['is_approved', 'category', 'status', 'place']
     actions = ['approve_ads', 'reject_ads', 'send_notification']
     inlines = [AdImageInline, CommentInline]
     readonly_fields = ['created_at', 'views']
@@ -122,9 +154,8 @@ class AdAdmin(admin.ModelAdmin):
                                 featured_start_date=pending_featured.featured_start_date,
                                 featured_expiry_date=pending_featured.featured_expiry_date
                             )
+                            # The featured scheduler sets is_featured from the dates
                             pending_featured.delete()
-                            ad.is_featured = True
-                            ad.save(update_fields=['is_featured'])
                         
                         approved += 1
                         logger.info(f"Ad {ad.name} approved and featured status handled")
@@ -262,10 +293,10 @@ class PendingFeaturedAdAdmin(admin.ModelAdmin):
 
 @admin.register(FeaturedAd)
 class FeaturedAdAdmin(admin.ModelAdmin):
-    list_display = ('id', 'ad_link', 'featured_start_date', 'featured_expiry_date', 'is_active_display')
+    list_display = ('id', 'ad_link', 'featured_start_date', 'featured_expiry_date', 'state', 'impressions', 'is_active_display')
     list_select_related = ['ad']  # Optimize database queries
-    readonly_fields = ['ad_link', 'payment_screenshot_preview']
-    list_filter = ['featured_start_date']
+    readonly_fields = ['ad_link', 'payment_screenshot_preview', 'state', 'impressions']
+    list_filter = ['state', 'featured_start_date']
     search_fields = ['ad__name']
     
     def ad_link(self, obj):
@@ -0,0 +1,32 @@
+# comments.py
+"""
+Comment threads of an ad detail page.
+
+Every reply keeps the id of its thread's top-level comment in
+Comment.root, so a page of threads takes two queries whatever the
+nesting: one for the top-level comments and one for all of their
+replies, both with the authors joined. Pages are keyed on the last
+top-level comment id, so "load more" stays cheap on long threads.
+"""
+from django.db.models import Prefetch
+
+THREADS_PER_PAGE = 10
+
+
+def thread_page(ad, after=None, per_page=THREADS_PER_PAGE):
+    """
+    Up to per_page top-level comments of ad after the given id, each with
+    its replies in thread_replies, and the id to pass to load the next
+    page (None on the last page).
+    """
+    from .models import Comment
+
+    threads = Comment.objects.filter(ad=ad, parent=None).select_related('user').order_by('pk')
+    if after:
+        threads = threads.filter(pk__gt=after)
+    threads = list(threads.prefetch_related(Prefetch(
+        'thread_replies',
+        queryset=Comment.objects.select_related('user').order_by('pk'),
+    ))[:per_page + 1])
+    next_after = threads[per_page - 1].pk if len(threads) > per_page else None
+    return threads[:per_page], next_after
@@ -0,0 +1,154 @@
+# featured.py
+"""
+Scheduler for featured ads.
+
+Ad.is_featured is the single "currently featured" flag that listings
+filter on. It is only written here: FeaturedAd.state moves from scheduled
+to active at featured_start_date and to expired at featured_expiry_date,
+and the transitions that are due are found with indexed (state, due time)
+lookups. run_due() applies them, sends the expiry and expiring-soon
+notifications in bulk and returns when the next transition is due, so
+the run_featured_scheduler command can sleep until exactly then.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Advertisers are warned this long before their featuring ends
+EXPIRING_SOON = timedelta(days=3)
+
+
+def _locked(queryset):
+    """Rows claimed by this scheduler run; concurrent runs skip them"""
+    return queryset.select_for_update(skip_locked=True, of=('self',))
+
+
+def set_featured(rows, is_featured):
+    """Write Ad.is_featured for (_, ad id, category id) rows and expire what lists them"""
+    from .homepage import schedule_rebuild
+    from .models import Ad
+    from .rotation import schedule_rebuild as schedule_rotation_rebuild
+    from .search.cache import bump_ad_generations
+
+    # update() skips the Ad signals, so caches are expired here
+    Ad.objects.filter(pk__in=[ad_id for _, ad_id, _ in rows]).update(is_featured=is_featured)
+    category_ids = {category_id for _, _, category_id in rows}
+    transaction.on_commit(lambda: bump_ad_generations(category_ids))
+    transaction.on_commit(schedule_rebuild)
+    transaction.on_commit(schedule_rotation_rebuild)
+
+
+def _notify(rows, notification_type):
+    """One Notification per (advertiser id, ad id, message), in a single insert"""
+    from .models import Notification
+
+    Notification.objects.bulk_create([
+        Notification(user_id=advertiser_id, ad_id=ad_id, message=message, notification_type=notification_type)
+        for advertiser_id, ad_id, message in rows
+    ])
+
+
+@transaction.atomic
+def activate_due(now):
+    """Feature the ads whose start time has come"""
+    from .models import FeaturedAd
+
+    due = _locked(FeaturedAd.objects.filter(
+        state=FeaturedAd.SCHEDULED,
+        featured_start_date__lte=now,
+        featured_expiry_date__gt=now,
+    ))
+    rows = list(due.values_list('pk', 'ad_id', 'ad__category_id'))
+    if rows:
+        FeaturedAd.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(state=FeaturedAd.ACTIVE)
+        set_featured(rows, True)
+    return len(rows)
+
+
+@transaction.atomic
+def expire_due(now):
+    """Unfeature the ads whose expiry time has passed and tell their owners"""
+    from .models import FeaturedAd
+
+    due = _locked(FeaturedAd.objects.filter(
+        state__in=(FeaturedAd.SCHEDULED, FeaturedAd.ACTIVE),
+        featured_expiry_date__lte=now,
+    ))
+    rows = list(due.values_list('pk', 'ad_id', 'ad__category_id', 'state', 'ad__advertiser_id', 'ad__name'))
+    if not rows:
+        return 0
+    FeaturedAd.objects.filter(pk__in=[row[0] for row in rows]).update(state=FeaturedAd.EXPIRED)
+    set_featured([row[:3] for row in rows], False)
+    _notify([
+        (advertiser_id, ad_id, f'Your featured ad "{name}" has expired.')
+        for _, ad_id, _, state, advertiser_id, name in rows if state == FeaturedAd.ACTIVE
+    ], 'info')
+    return len(rows)
+
+
+@transaction.atomic
+def postpone_due(now):
+    """Unfeature active ads whose start was moved into the future"""
+    from .models import FeaturedAd
+
+    due = _locked(FeaturedAd.objects.filter(state=FeaturedAd.ACTIVE, featured_start_date__gt=now))
+    rows = list(due.values_list('pk', 'ad_id', 'ad__category_id'))
+    if rows:
+        FeaturedAd.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(state=FeaturedAd.SCHEDULED)
+        set_featured(rows, False)
+    return len(rows)
+
+
+@transaction.atomic
+def warn_expiring(now):
+    """Tell owners once that their featuring ends within EXPIRING_SOON"""
+    from .models import FeaturedAd
+
+    due = _locked(FeaturedAd.objects.filter(
+        state=FeaturedAd.ACTIVE,
+        expiring_notified=False,
+        featured_expiry_date__lte=now + EXPIRING_SOON,
+    ))
+    rows = list(due.values_list('pk', 'ad__advertiser_id', 'ad_id', 'ad__name', 'featured_expiry_date'))
+    if rows:
+        FeaturedAd.objects.filter(pk__in=[row[0] for row in rows]).update(expiring_notified=True)
+        _notify([
+            (advertiser_id, ad_id, f'Your featured ad "{name}" is expiring in {(expiry - now).days} day(s)!')
+            for _, advertiser_id, ad_id, name, expiry in rows
+        ], 'warning')
+    return len(rows)
+
+
+def next_due(now):
+    """When the next transition or warning is due, or None"""
+    from .models import FeaturedAd
+
+    moments = FeaturedAd.objects.aggregate(
+        start=Min('featured_start_date', filter=Q(state=FeaturedAd.SCHEDULED)),
+        expiry=Min('featured_expiry_date', filter=Q(state__in=(FeaturedAd.SCHEDULED, FeaturedAd.ACTIVE))),
+        warning=Min('featured_expiry_date', filter=Q(state=FeaturedAd.ACTIVE, expiring_notified=False)),
+    )
+    if moments['warning'] is not None:
+        moments['warning'] -= EXPIRING_SOON
+    due = [moment for moment in moments.values() if moment is not None]
+    return min(due) if due else None
+
+
+def run_due(now=None):
+    """Apply every transition that is due, return when the next one is"""
+    now = now or timezone.now()
+    expired = expire_due(now)
+    postponed = postpone_due(now)
+    activated = activate_due(now)
+    warned = warn_expiring(now)
+    if expired or postponed or activated or warned:
+        logger.info(
+            f"Featured scheduler: {activated} activated, {expired} expired, "
+            f"{postponed} postponed, {warned} expiry warnings"
+        )
+    return next_due(now)
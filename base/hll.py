@@ -0,0 +1,71 @@
+# hll.py
+"""
+HyperLogLog sketches for counting distinct visitors.
+
+A sketch is REGISTERS one-byte registers whatever the number of visitors
+(about 3% standard error), and two sketches merge by taking the larger
+register, so daily sketches add up to weekly or all-time uniques without
+keeping any visitor ids. Sketches with few visitors are stored as
+(index, value) pairs instead of the full register array.
+"""
+import hashlib
+import math
+import struct
+
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+# alpha_m bias correction for m >= 128
+ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+DENSE = 0
+SPARSE = 1
+PAIR = struct.Struct('<HB')
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers is not None else bytearray(REGISTERS)
+
+    def add(self, value):
+        hashed = _hash(value)
+        index = hashed >> (64 - PRECISION)
+        rest = hashed & ((1 << (64 - PRECISION)) - 1)
+        # Position of the first 1 bit in the remaining 54 bits
+        rank = (64 - PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        estimate = ALPHA * REGISTERS * REGISTERS / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        pairs = [(index, register) for index, register in enumerate(self.registers) if register]
+        if len(pairs) * PAIR.size < REGISTERS:
+            return bytes([SPARSE]) + b''.join(PAIR.pack(*pair) for pair in pairs)
+        return bytes([DENSE]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data or b'')
+        if not data:
+            return cls()
+        if data[0] == DENSE:
+            return cls(data[1:1 + REGISTERS])
+        sketch = cls()
+        for index, register in PAIR.iter_unpack(data[1:]):
+            sketch.registers[index] = register
+        return sketch
@@ -0,0 +1,116 @@
+# homepage.py
+"""
+Read model of the homepage.
+
+build_snapshot() runs the featured-ads join, the per-category counts and
+the 20-ads-per-category rails once and keeps the result as plain dicts in
+the cache, so index() costs a single cache read. Signals call
+schedule_rebuild() when approvals or featuring change; the rebuild runs
+REBUILD_DELAY seconds later in a background thread, so a burst of admin
+approvals leads to one recomputation.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Prefetch, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'homepage:snapshot'
+REBUILD_LOCK_KEY = 'homepage:rebuilding'
+# Changes within this many seconds are covered by a single rebuild
+REBUILD_DELAY = 5.0
+ADS_PER_CATEGORY = 20
+# Rebuilt at least this often, e.g. for ads aging out of "new" order
+MAX_AGE = timedelta(minutes=15)
+
+
+def ad_card(ad, category):
+    """Template fields of a listing card"""
+    return {
+        'id': ad.id,
+        'name': ad.name,
+        'price': ad.price,
+        'location': ad.location,
+        'created_at': ad.created_at,
+        'is_featured': ad.is_featured,
+        'cover_image_url': ad.cover_image_url,
+        'category_name': category.name,
+    }
+
+
+def build_snapshot():
+    """Featured count and category rails as plain, cacheable data"""
+    from .models import Ad, Category
+
+    now = timezone.now()
+    featured_count = Ad.objects.filter(status='approved', is_featured=True).count()
+
+    categories = Category.objects.annotate(
+        approved_ads_count=Count('ad', filter=Q(ad__status='approved'))
+    ).prefetch_related(
+        Prefetch(
+            'ad_set',
+            queryset=Ad.objects.filter(status='approved').only(
+                'id', 'category_id', 'name', 'price', 'location',
+                'created_at', 'is_featured', 'cover_image_url',
+            ).order_by('-created_at')[:ADS_PER_CATEGORY],
+            to_attr='approved_ads'
+        )
+    )
+
+    return {
+        'categories': [
+            {
+                'id': category.id,
+                'name': category.name,
+                'icon': category.icon,
+                'approved_ads_count': category.approved_ads_count,
+                'approved_ads': [ad_card(ad, category) for ad in category.approved_ads],
+            }
+            for category in categories
+        ],
+        'featured_count': featured_count,
+        'built_at': now,
+        'expires_at': now + MAX_AGE,
+    }
+
+
+def rebuild():
+    """Build and store a fresh snapshot"""
+    snapshot = build_snapshot()
+    cache.set(SNAPSHOT_KEY, snapshot, timeout=None)
+    return snapshot
+
+
+def schedule_rebuild():
+    """Rebuild the snapshot REBUILD_DELAY from now, unless one is already scheduled"""
+    if not cache.add(REBUILD_LOCK_KEY, 1, timeout=REBUILD_DELAY):
+        return
+
+    def run():
+        try:
+            time.sleep(REBUILD_DELAY)
+            rebuild()
+        except Exception as e:
+            logger.error(f"Error rebuilding the homepage snapshot: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_snapshot():
+    """The stored snapshot; only an empty cache builds one in the request"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return rebuild()
+    if snapshot['expires_at'] <= timezone.now():
+        # Served stale until the background rebuild lands
+        schedule_rebuild()
+    return snapshot
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from base import similar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the \"similar listings\" neighbours of every approved ad (run from cron). "
+        "Needs about 2.5 KB per approved ad for the feature matrix plus "
+        f"{similar.BATCH_MEMORY // (1024 * 1024)} MB for scoring."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbours', type=int, default=similar.NEIGHBOURS, help="Neighbours to keep per ad")
+
+    def handle(self, *args, **options):
+        ads = similar.build(count=max(options['neighbours'], 1))
+        self.stdout.write(self.style.SUCCESS(f"Stored similar listings for {ads} ads."))
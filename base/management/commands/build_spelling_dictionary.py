@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from base.search import spelling
+
+
+class Command(BaseCommand):
+    help = "Rebuild the \"did you mean\" dictionary from the approved ads (run from cron)"
+
+    def handle(self, *args, **options):
+        if spelling.rebuild(force=True):
+            self.stdout.write(self.style.SUCCESS(f"Spelling dictionary written to {spelling.spelling_path()}."))
+        else:
+            self.stdout.write("Another process is rebuilding the spelling dictionary.")
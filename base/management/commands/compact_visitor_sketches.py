@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base import viewcounts
+
+
+class Command(BaseCommand):
+    help = "Fold old daily visitor sketches into one all-time row per ad (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30, help="Days of daily sketches to keep")
+
+    def handle(self, *args, **options):
+        # The dashboard's weekly uniques read the last 7 daily sketches
+        if options['keep_days'] < 8:
+            raise CommandError("--keep-days must be at least 8")
+        viewcounts.flush()
+        before = timezone.localdate() - timedelta(days=options['keep_days'])
+        removed = viewcounts.compact_sketches(before)
+        self.stdout.write(self.style.SUCCESS(f"Compacted visitor sketches before {before}, {removed} rows removed."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from base import homepage
+
+
+class Command(BaseCommand):
+    help = "Rebuild the homepage snapshot now, e.g. after a deploy"
+
+    def handle(self, *args, **options):
+        snapshot = homepage.rebuild()
+        rails = sum(1 for category in snapshot['categories'] if category['approved_ads'])
+        self.stdout.write(self.style.SUCCESS(f"Homepage snapshot rebuilt with {rails} category rails."))
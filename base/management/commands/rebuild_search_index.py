@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from base.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for every ad"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Processes to build with, for backends that index in parallel chunks",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f"Rebuilding search index with {backend.__class__.__name__}...")
+        backend.rebuild(workers=max(options['workers'], 1))
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,80 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from base.models import User
+from base.sellerstats import recompute_range
+
+DEFAULT_CHECKPOINT = 'recompute_seller_stats.checkpoint.json'
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _recompute_chunk(bounds):
+    start, end = bounds
+    try:
+        return start, recompute_range(start, end)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Recompute every seller's stats in parallel id-range chunks, resumable after an interruption"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Processes to recompute with")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="User ids per chunk")
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="File recording the finished chunks")
+        parser.add_argument('--resume', action='store_true', help="Skip the chunks the checkpoint lists as done")
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        checkpoint = options['checkpoint']
+        done = set()
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = json.load(f)
+            if state['chunk_size'] != chunk_size:
+                raise CommandError(f"The checkpoint was written with --chunk-size {state['chunk_size']}")
+            done = set(state['done'])
+
+        ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        first, last = ids.first(), ids.last()
+        # Aligned to chunk_size, so a resumed run sees the same chunks
+        chunks = [] if first is None else [
+            (start, start + chunk_size)
+            for start in range(first - first % chunk_size, last + 1, chunk_size)
+            if start not in done
+        ]
+        total = len(chunks) + len(done)
+        self.stdout.write(f"{len(chunks)} of {total} chunks to recompute ({len(done)} done before).")
+
+        def finished(start, rows):
+            done.add(start)
+            with open(checkpoint + '.tmp', 'w') as f:
+                json.dump({'chunk_size': chunk_size, 'done': sorted(done)}, f)
+            os.replace(checkpoint + '.tmp', checkpoint)
+            self.stdout.write(f"[{len(done)}/{total}] ids {start}-{start + chunk_size - 1}: {rows} sellers")
+            return rows
+
+        written = 0
+        if options['workers'] > 1 and len(chunks) > 1:
+            # Forked children must not share the parent's database sockets
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                for future in as_completed([pool.submit(_recompute_chunk, chunk) for chunk in chunks]):
+                    written += finished(*future.result())
+        else:
+            for chunk in chunks:
+                written += finished(*_recompute_chunk(chunk))
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed the stats of {written} sellers."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from base.models import Ad, Location, LocationAlias
+from base.search.cache import bump_ad_generations
+from base.search.geo import encode
+from base.search.locations import location_candidates
+from base.sellerstats import refresh_ranks
+
+
+class Command(BaseCommand):
+    help = "Link ad locations to the gazetteer, e.g. after adding places or aliases"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Re-resolve every ad, not only the ones without a place",
+        )
+
+    def handle(self, *args, **options):
+        places = dict(LocationAlias.objects.values_list('key', 'location_id'))
+        coordinates = {
+            pk: (latitude, longitude)
+            for pk, latitude, longitude in Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .values_list('pk', 'latitude', 'longitude')
+        }
+        ads = Ad.objects.only('id', 'location', 'place_id', 'geohash', 'advertiser_id', 'category_id', 'status')
+        if not options['all']:
+            ads = ads.filter(place__isnull=True)
+
+        resolved = 0
+        sellers, categories = set(), set()
+        for ad in ads.iterator(chunk_size=500):
+            place_id = next((places[key] for key in location_candidates(ad.location) if key in places), None)
+            latitude, longitude = coordinates.get(place_id, (None, None))
+            geohash = encode(latitude, longitude) if latitude is not None else ''
+            if place_id != ad.place_id or geohash != ad.geohash:
+                # update() skips the save signals, so the leaderboards and
+                # cached searches that depend on place are refreshed below
+                Ad.objects.filter(pk=ad.pk).update(
+                    place_id=place_id, latitude=latitude, longitude=longitude, geohash=geohash
+                )
+                resolved += 1
+                if ad.status == 'approved':
+                    sellers.add(ad.advertiser_id)
+                    categories.add(ad.category_id)
+
+        if sellers:
+            refresh_ranks(sorted(sellers))
+            bump_ad_generations(categories)
+        self.stdout.write(self.style.SUCCESS(f"Updated the place of {resolved} ads."))
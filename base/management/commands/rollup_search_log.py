@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import SearchLog
+from base.search import querylog
+from base.search.hot import warm_hot_queries
+
+
+class Command(BaseCommand):
+    help = "Roll the search log up into daily query stats and refresh the hot queries (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help="Days to recompute, ending today")
+        parser.add_argument('--keep-days', type=int, default=30, help="Days of raw log to keep")
+        parser.add_argument('--top', type=int, default=querylog.HOT_QUERY_COUNT, help="Hot queries to precompute")
+
+    def handle(self, *args, **options):
+        # Entries still buffered by this process would miss today's stats
+        querylog.flush()
+        today = timezone.localdate()
+        for offset in range(max(options['days'], 1)):
+            day = today - timedelta(days=offset)
+            self.stdout.write(f"{day}: {querylog.rollup_day(day)} distinct queries")
+
+        cutoff = timezone.now() - timedelta(days=options['keep_days'])
+        pruned, _ = SearchLog.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f"Pruned {pruned} log entries older than {options['keep_days']} days.")
+
+        hot = querylog.pick_hot_queries(options['top'])
+        warm_hot_queries()
+        self.stdout.write(self.style.SUCCESS(f"Precomputed the first page of {len(hot)} hot queries."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from base import featured
+
+# New and edited FeaturedAds are applied by a signal, so the queue only
+# needs re-reading this often in case that was missed
+POLL_INTERVAL = 60.0
+
+
+class Command(BaseCommand):
+    help = "Start and expire featured ads at their scheduled times and send the expiry notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Apply what is due and exit (for cron)")
+
+    def handle(self, *args, **options):
+        while True:
+            due = featured.run_due()
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Featured ads up to date, next change at {due or 'none scheduled'}."))
+                return
+            connection.close()
+            wait = POLL_INTERVAL
+            if due is not None:
+                wait = min(max((due - timezone.now()).total_seconds(), 1.0), POLL_INTERVAL)
+            time.sleep(wait)
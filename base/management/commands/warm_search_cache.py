@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from base.search.hot import warm_hot_queries
+
+
+class Command(BaseCommand):
+    help = "Precompute the first page of the hot search queries, e.g. after a deploy"
+
+    def handle(self, *args, **options):
+        warmed = warm_hot_queries()
+        self.stdout.write(self.style.SUCCESS(f"Warmed {warmed} hot queries."))
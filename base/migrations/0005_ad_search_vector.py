@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE base_ad SET search_vector = "
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('simple', concat_ws(' ', motortype, geartype, color)), 'C')"
+        )
+        schema_editor.execute(
+            "CREATE INDEX base_ad_search_vector_gin ON base_ad USING gin (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE base_ad_fts USING fts5("
+            "name, description, attributes, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO base_ad_fts (rowid, name, description, attributes) "
+            "SELECT id, name, coalesce(description, ''), "
+            "coalesce(motortype, '') || ' ' || coalesce(geartype, '') || ' ' || coalesce(color, '') "
+            "FROM base_ad"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS base_ad_search_vector_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS base_ad_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_alter_adimage_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_ad_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['status', '-is_featured', '-created_at', '-id'], name='base_ad_status_561baa_idx'),
+        ),
+    ]
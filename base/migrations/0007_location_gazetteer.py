@@ -0,0 +1,122 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:01
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of base.search.locations.location_key, so later changes to
+# it cannot change what this migration writes
+def location_key(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+# region: {city: [spelling variants]}
+GAZETTEER = {
+    'Maroodi Jeex': {
+        'Hargeisa': ['Hargeysa', 'Hargaysa', 'Hargeisa City'],
+        'Gabiley': ['Gebiley'],
+        'Wajaale': ['Tog Wajaale', 'Togwajaale', 'Wajale'],
+        'Baligubadle': ['Balli Gubadle'],
+        'Salahlay': ['Salaxlay'],
+    },
+    'Awdal': {
+        'Borama': ['Boorama', 'Boramo'],
+        'Zeila': ['Saylac', 'Zeyla'],
+        'Lughaya': ['Lughaye'],
+        'Baki': [],
+    },
+    'Saaxil': {
+        'Berbera': ['Barbara'],
+        'Sheikh': ['Sheekh', 'Shiikh'],
+    },
+    'Togdheer': {
+        'Burao': ['Burco', 'Burao City'],
+        'Oodweyne': ['Odweyne'],
+        'Buhodle': ['Buuhoodle'],
+    },
+    'Sanaag': {
+        'Erigavo': ['Ceerigaabo', 'Erigabo'],
+        'Elafweyn': ['Ceel Afweyn', 'El Afweyn'],
+        'Badhan': [],
+    },
+    'Sool': {
+        'Las Anod': ['Laascaanood', 'Lasanod', 'Las Aanod'],
+        'Aynabo': ['Caynabo'],
+        'Taleh': ['Taleex'],
+    },
+}
+
+
+def load_gazetteer(apps, schema_editor):
+    Location = apps.get_model('base', 'Location')
+    LocationAlias = apps.get_model('base', 'LocationAlias')
+    Ad = apps.get_model('base', 'Ad')
+
+    def add(name, kind, region=None, aliases=()):
+        location = Location.objects.create(name=name, kind=kind, region=region)
+        for alias in (name, *aliases):
+            LocationAlias.objects.get_or_create(
+                key=location_key(alias), defaults={'location': location, 'name': alias}
+            )
+        return location
+
+    for region_name, cities in GAZETTEER.items():
+        region = add(region_name, 'region')
+        for city_name, aliases in cities.items():
+            add(city_name, 'city', region, aliases)
+
+    # Resolve existing ads, whole text first and then each comma separated part
+    places = dict(LocationAlias.objects.values_list('key', 'location_id'))
+    for ad in Ad.objects.only('id', 'location').iterator(chunk_size=500):
+        text = ad.location or ''
+        for key in [location_key(text)] + [location_key(part) for part in text.split(',')]:
+            if key in places:
+                Ad.objects.filter(pk=ad.pk).update(place_id=places[key])
+                break
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_ad_base_ad_status_561baa_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('region', 'Region'), ('city', 'City')], default='city', max_length=10)),
+                ('region', models.ForeignKey(blank=True, limit_choices_to={'kind': 'region'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='places', to='base.location')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='place',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ads', to='base.location'),
+        ),
+        migrations.CreateModel(
+            name='LocationAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='base.location')),
+            ],
+            options={
+                'verbose_name_plural': 'location aliases',
+            },
+        ),
+        migrations.RunPython(load_gazetteer, migrations.RunPython.noop),
+    ]
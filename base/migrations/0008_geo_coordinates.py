@@ -0,0 +1,105 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:02
+
+from django.db import migrations, models
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+# Frozen copy of base.search.geo.encode, so later changes to it cannot
+# change what this migration writes
+def encode(latitude, longitude, precision=7):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+# Approximate town centres for the places loaded in 0007
+COORDINATES = {
+    'Hargeisa': (9.5624, 44.0770),
+    'Gabiley': (9.6956, 43.6197),
+    'Wajaale': (9.6047, 43.3388),
+    'Borama': (9.9361, 43.1828),
+    'Zeila': (11.3530, 43.4730),
+    'Lughaya': (10.6806, 43.9392),
+    'Berbera': (10.4396, 45.0143),
+    'Sheikh': (9.9333, 45.2000),
+    'Burao': (9.5221, 45.5336),
+    'Oodweyne': (9.4092, 45.0640),
+    'Buhodle': (8.2308, 46.3281),
+    'Erigavo': (10.6162, 47.3679),
+    'Elafweyn': (9.9292, 47.2197),
+    'Badhan': (10.7142, 48.3356),
+    'Las Anod': (8.4774, 47.3597),
+    'Aynabo': (8.9500, 46.4333),
+    'Taleh': (9.1500, 48.4200),
+}
+
+
+def load_coordinates(apps, schema_editor):
+    Location = apps.get_model('base', 'Location')
+    Ad = apps.get_model('base', 'Ad')
+
+    for name, (latitude, longitude) in COORDINATES.items():
+        Location.objects.filter(name=name).update(latitude=latitude, longitude=longitude)
+
+    for location in Location.objects.filter(latitude__isnull=False):
+        Ad.objects.filter(place=location).update(
+            latitude=location.latitude,
+            longitude=location.longitude,
+            geohash=encode(location.latitude, location.longitude),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_location_gazetteer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(load_coordinates, migrations.RunPython.noop),
+    ]
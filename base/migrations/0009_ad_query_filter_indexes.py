@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_geo_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['vehicle_type'], name='base_ad_vehicle_984a37_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['electronics_type'], name='base_ad_electro_55870e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['property_type'], name='base_ad_propert_2e2664_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['year'], name='base_ad_year_758b99_idx'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:08
+
+import re
+
+from django.db import migrations, models
+
+
+# Frozen copy of base.search.text.tokenize, so later changes to it cannot
+# change what this migration writes
+def tokenize(text):
+    if not text:
+        return []
+    return re.findall(r'\w+', text.lower())
+
+
+# Somali/English words and common spellings that should find each other
+DEFAULT_GROUPS = (
+    'car, gaari, baabuur, cars',
+    'phone, telefoon, taleefan, telefon, mobile',
+    'house, guri, aqal',
+    'land, dhul',
+    'motorcycle, mooto, motorbike',
+    'apartment, flat',
+    'laptop, laabtoob',
+    'rent, kiro, kireyn',
+    'shop, dukaan',
+    'truck, lorry, xamuul',
+)
+SOURCE_FIELDS = ('name', 'description', 'motortype', 'geartype', 'color')
+
+
+def load_synonyms(apps, schema_editor):
+    SynonymGroup = apps.get_model('base', 'SynonymGroup')
+    Ad = apps.get_model('base', 'Ad')
+
+    mapping = {}
+    for words in DEFAULT_GROUPS:
+        SynonymGroup.objects.create(words=words)
+        group = {word for part in words.split(',') for word in tokenize(part)}
+        for word in group:
+            mapping.setdefault(word, set()).update(group - {word})
+
+    for ad in Ad.objects.only('id', *SOURCE_FIELDS).iterator(chunk_size=500):
+        words = set()
+        for field in SOURCE_FIELDS:
+            words.update(tokenize(getattr(ad, field) or ''))
+        extra = set()
+        for word in words:
+            extra.update(mapping.get(word, ()))
+        if extra - words:
+            Ad.objects.filter(pk=ad.pk).update(search_synonyms=' '.join(sorted(extra - words)))
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE base_ad SET search_vector = "
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', concat_ws(' ', description, search_synonyms)), 'B') || "
+            "setweight(to_tsvector('simple', concat_ws(' ', motortype, geartype, color)), 'C')"
+        )
+    elif vendor == 'sqlite':
+        # FTS5 tables cannot gain columns; recreate it with a synonyms column
+        schema_editor.execute("DROP TABLE IF EXISTS base_ad_fts")
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE base_ad_fts USING fts5("
+            "name, description, attributes, synonyms, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO base_ad_fts (rowid, name, description, attributes, synonyms) "
+            "SELECT id, name, coalesce(description, ''), "
+            "coalesce(motortype, '') || ' ' || coalesce(geartype, '') || ' ' || coalesce(color, ''), "
+            "search_synonyms FROM base_ad"
+        )
+
+
+def unload_synonyms(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS base_ad_fts")
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE base_ad_fts USING fts5("
+            "name, description, attributes, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO base_ad_fts (rowid, name, description, attributes) "
+            "SELECT id, name, coalesce(description, ''), "
+            "coalesce(motortype, '') || ' ' || coalesce(geartype, '') || ' ' || coalesce(color, '') "
+            "FROM base_ad"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_ad_query_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SynonymGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('words', models.CharField(help_text='Comma separated, e.g. car, gaari, baabuur', max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='search_synonyms',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(load_synonyms, unload_synonyms),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_cover_images(apps, schema_editor):
+    Ad = apps.get_model('base', 'Ad')
+    AdImage = apps.get_model('base', 'AdImage')
+
+    covers = {}
+    for image in AdImage.objects.order_by('-pk').iterator(chunk_size=1000):
+        # Descending, so the lowest pk of each ad is the one kept
+        covers[image.ad_id] = image
+    for ad_id, image in covers.items():
+        Ad.objects.filter(pk=ad_id).update(
+            cover_image=image,
+            cover_image_url=image.image.url if image.image else '',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_search_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='cover_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='base.adimage'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='cover_image_url',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.RunPython(set_cover_images, migrations.RunPython.noop),
+    ]
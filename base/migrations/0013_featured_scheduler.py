@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:18
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_featured_states(apps, schema_editor):
+    FeaturedAd = apps.get_model('base', 'FeaturedAd')
+    Ad = apps.get_model('base', 'Ad')
+
+    now = timezone.now()
+    # Rows not covered here stay scheduled, the default
+    FeaturedAd.objects.filter(featured_expiry_date__lte=now).update(state='expired')
+    FeaturedAd.objects.filter(
+        featured_start_date__lte=now, featured_expiry_date__gt=now
+    ).update(state='active')
+
+    # Ads featured by hand keep their flag; those with dates follow them
+    Ad.objects.filter(featuredad__state='active').update(is_featured=True)
+    Ad.objects.filter(featuredad__state__in=('scheduled', 'expired')).update(is_featured=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_ad_cover_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='featuredad',
+            name='expiring_notified',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='featuredad',
+            name='state',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('expired', 'Expired')], default='scheduled', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='featuredad',
+            index=models.Index(fields=['state', 'featured_start_date'], name='base_featur_state_f2927f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='featuredad',
+            index=models.Index(fields=['state', 'featured_expiry_date'], name='base_featur_state_45152b_idx'),
+        ),
+        migrations.RunPython(set_featured_states, migrations.RunPython.noop),
+    ]
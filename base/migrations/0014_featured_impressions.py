@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_featured_scheduler'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='featuredad',
+            name='impressions',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
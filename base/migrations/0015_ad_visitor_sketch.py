@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_featured_impressions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdVisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('cumulative', models.BooleanField(default=False)),
+                ('registers', models.BinaryField()),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketches', to='base.ad')),
+            ],
+            options={
+                'unique_together': {('ad', 'day')},
+            },
+        ),
+    ]
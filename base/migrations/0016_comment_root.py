@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_comment_roots(apps, schema_editor):
+    Comment = apps.get_model('base', 'Comment')
+
+    parents = dict(Comment.objects.filter(parent__isnull=False).values_list('pk', 'parent_id'))
+    roots = {}
+    for pk in parents:
+        root = pk
+        while root in parents:
+            root = parents[root]
+        roots.setdefault(root, []).append(pk)
+    for root, pks in roots.items():
+        Comment.objects.filter(pk__in=pks).update(root_id=root)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_ad_visitor_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='base.comment'),
+        ),
+        migrations.RunPython(set_comment_roots, migrations.RunPython.noop),
+    ]
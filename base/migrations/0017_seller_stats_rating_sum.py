@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:24
+
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def set_rating_sums(apps, schema_editor):
+    SellerRating = apps.get_model('base', 'SellerRating')
+    SellerStats = apps.get_model('base', 'SellerStats')
+
+    sums = SellerRating.objects.filter(seller=OuterRef('user')).order_by().values('seller').annotate(
+        total=Sum('rating')
+    ).values('total')
+    SellerStats.objects.update(rating_sum=Coalesce(Subquery(sums, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_comment_root'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sellerstats',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(set_rating_sums, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast
+
+PRIOR_MEAN = 3.5
+PRIOR_RATINGS = 5
+
+
+def build_seller_ranks(apps, schema_editor):
+    Ad = apps.get_model('base', 'Ad')
+    SellerRank = apps.get_model('base', 'SellerRank')
+    SellerStats = apps.get_model('base', 'SellerStats')
+
+    SellerStats.objects.update(reputation=(
+        (Cast(F('rating_sum'), FloatField()) + PRIOR_RATINGS * PRIOR_MEAN)
+        / (Cast(F('total_ratings'), FloatField()) + PRIOR_RATINGS)
+    ))
+    stats = {
+        user_id: (score, count) for user_id, score, count in
+        SellerStats.objects.values_list('user_id', 'reputation', 'total_ratings')
+    }
+    scopes = {}
+    groups = Ad.objects.filter(status='approved').order_by().values_list(
+        'advertiser_id', 'category_id', 'place_id'
+    ).annotate(count=Count('pk'))
+    for seller_id, category_id, place_id, count in groups:
+        for scope in {(None, None), (category_id, None), (None, place_id), (category_id, place_id)}:
+            key = (seller_id, *scope)
+            scopes[key] = scopes.get(key, 0) + count
+    SellerRank.objects.bulk_create([
+        SellerRank(
+            seller_id=seller_id,
+            category_id=category_id,
+            place_id=place_id,
+            reputation=stats.get(seller_id, (PRIOR_MEAN, 0))[0],
+            total_ratings=stats.get(seller_id, (PRIOR_MEAN, 0))[1],
+            approved_ads=count,
+        )
+        for (seller_id, category_id, place_id), count in scopes.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_seller_stats_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sellerstats',
+            name='reputation',
+            field=models.FloatField(default=3.5),
+        ),
+        migrations.CreateModel(
+            name='SellerRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reputation', models.FloatField()),
+                ('total_ratings', models.PositiveIntegerField(default=0)),
+                ('approved_ads', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.category')),
+                ('place', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.location')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'place', '-reputation', '-total_ratings'], name='base_seller_categor_4ab3c1_idx')],
+            },
+        ),
+        migrations.RunPython(build_seller_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_seller_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarAd',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_ads', to='base.ad')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='base.ad')),
+            ],
+            options={
+                'ordering': ['ad', 'rank'],
+                'unique_together': {('ad', 'rank')},
+            },
+        ),
+    ]
@@ -4,6 +4,11 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+from django.contrib.postgres.search import SearchVectorField
+from .featured import EXPIRING_SOON
+from .sellerstats import PRIOR_MEAN
+from .search.locations import location_key
+from .viewcounts import record_view
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -81,14 +86,10 @@ class User(AbstractUser):
 
     # Seller Rating Methods
     def get_seller_stats(self):
-        """Get or create seller statistics for this user"""
-        from django.db import transaction
-        
-        with transaction.atomic():
-            stats, created = SellerStats.objects.get_or_create(user=self)
-            if created:
-                stats.update_stats()
-            return stats
+        """Get or create seller statistics for this user, read once per request"""
+        from .sellerstats import load
+
+        return load([self.pk])[self.pk]
     
     def get_average_rating(self):
         """Get average rating as float"""
@@ -142,37 +143,44 @@ class User(AbstractUser):
     
     def get_positive_rating_percentage(self, threshold=4):
         """Get percentage of ratings that are positive (>= threshold)"""
-        total_ratings = self.get_rating_count()
-        if total_ratings == 0:
+        from .sellerstats import STAR_FIELDS
+
+        stats = self.get_seller_stats()
+        if stats.total_ratings == 0:
             return 0
         
-        positive_ratings = SellerRating.objects.filter(
-            seller=self, 
-            rating__gte=threshold
-        ).count()
+        positive_ratings = sum(
+            getattr(stats, field) for star, field in STAR_FIELDS.items() if star >= threshold
+        )
         
-        return (positive_ratings / total_ratings) * 100
+        return (positive_ratings / stats.total_ratings) * 100
+    
+    def get_reputation(self):
+        """Bayesian average rating, pulled towards PRIOR_MEAN while ratings are few"""
+        return self.get_seller_stats().reputation
     
     def is_trusted_seller(self, min_ratings=5, min_rating=4.0):
         """Check if this user meets criteria to be considered a trusted seller"""
         if self.get_rating_count() < min_ratings:
             return False
-        return self.get_average_rating() >= min_rating
+        return self.get_reputation() >= min_rating
     
     def get_seller_level(self):
-        """Get seller level based on ratings and performance"""
-        avg_rating = self.get_average_rating()
+        """Get seller level based on reputation and performance"""
+        # Reputation already discounts sellers with few ratings, so the
+        # thresholds sit below the raw averages they replace
+        reputation = self.get_reputation()
         rating_count = self.get_rating_count()
         
         if rating_count == 0:
             return "New Seller"
         elif rating_count < 3:
             return "Beginner Seller"
-        elif avg_rating >= 4.8 and rating_count >= 10:
+        elif reputation >= 4.5 and rating_count >= 10:
             return "Top Rated Seller"
-        elif avg_rating >= 4.5 and rating_count >= 5:
+        elif reputation >= 4.2 and rating_count >= 5:
             return "Rated Seller"
-        elif avg_rating >= 4.0:
+        elif reputation >= 3.9:
             return "Reliable Seller"
         else:
             return "Seller"
@@ -197,6 +205,97 @@ class Category(models.Model):
         return self.name
 
 
+class Location(models.Model):
+    """Canonical city or region that free-text ad locations resolve to"""
+    KIND_CHOICES = (
+        ('region', 'Region'),
+        ('city', 'City'),
+    )
+
+    name = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='city')
+    region = models.ForeignKey(
+        'self', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='places',
+        limit_choices_to={'kind': 'region'}
+    )
+    # Centre of the place; copied onto ads for radius search
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The canonical spelling resolves like any other alias
+        LocationAlias.objects.get_or_create(
+            key=location_key(self.name), defaults={'location': self, 'name': self.name}
+        )
+
+
+class LocationAlias(models.Model):
+    """Alternative spelling of a Location, e.g. Hargeysa for Hargeisa"""
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='aliases')
+    name = models.CharField(max_length=100)
+    # Normalized lookup key, see base.search.locations.location_key
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'location aliases'
+
+    def __str__(self):
+        return f"{self.name} → {self.location}"
+
+    def save(self, *args, **kwargs):
+        self.key = location_key(self.name)
+        super().save(*args, **kwargs)
+
+
+class SearchLog(models.Model):
+    """One search, appended in batches by base.search.querylog"""
+    # Normalized query string, see base.search.querylog.query_string
+    query = models.CharField(max_length=255)
+    results = models.PositiveIntegerField()
+    latency_ms = models.FloatField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.query or '(empty search)'
+
+
+class SearchQueryStat(models.Model):
+    """Daily rollup of SearchLog per query"""
+    day = models.DateField(db_index=True)
+    query = models.CharField(max_length=255)
+    searches = models.PositiveIntegerField(default=0)
+    zero_results = models.PositiveIntegerField(default=0)
+    p50_ms = models.FloatField(default=0)
+    p95_ms = models.FloatField(default=0)
+    p99_ms = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'query')
+        ordering = ['-day', '-searches']
+
+    def __str__(self):
+        return f"{self.day} {self.query or '(empty search)'}"
+
+
+class SynonymGroup(models.Model):
+    """Words and spellings that should find each other in search"""
+    words = models.CharField(
+        max_length=255, unique=True,
+        help_text="Comma separated, e.g. car, gaari, baabuur"
+    )
+
+    def __str__(self):
+        return self.words
+
+
 class Ad(models.Model):
     # ----- Status and Types -----
     STATUS_CHOICES = (
@@ -306,6 +405,11 @@ class Ad(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     location = models.CharField(max_length=255)
+    # Gazetteer entry the free-text location resolved to, if any
+    place = models.ForeignKey(
+        Location, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='ads'
+    )
     ad_type = models.CharField(
         max_length=10,
         choices=AD_TYPE_CHOICES,
@@ -434,15 +538,37 @@ class Ad(models.Model):
         default='pending'
     )
 
+    # ----- Geo -----
+    # Geocoded from the gazetteer; geohash drives the radius search index
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+
+    # ----- Cover image -----
+    # First AdImage and its URL, kept in sync by signals so listing cards
+    # need no image query
+    cover_image = models.ForeignKey(
+        'AdImage', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+', editable=False
+    )
+    cover_image_url = models.CharField(max_length=500, blank=True, default='', editable=False)
+
+    # ----- Search -----
+    # Weighted tsvector kept in sync by base.search (Postgres only, unused on sqlite)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    # Synonyms of the ad's words from SynonymGroup, indexed with the other fields
+    search_synonyms = models.TextField(blank=True, default='', editable=False)
+
     def __str__(self):
         return f"{self.name} - {self.get_ad_type_display()} ({self.location})"
 
     def increment_views(self):
-        self.views = models.F('views') + 1
-        self.save(update_fields=['views'])
+        # Buffered and added to views in batches by base.viewcounts
+        record_view(self.pk)
 
     def is_currently_featured(self):
-        return hasattr(self, 'featuredad') and self.featuredad.is_active()
+        # Flipped at the featuring start and expiry by base.featured
+        return self.is_featured
     class Meta:
         
         ordering = ['-created_at']
@@ -453,18 +579,53 @@ class Ad(models.Model):
             models.Index(fields=["category"]),
             models.Index(fields=["price"]),
             models.Index(fields=["created_at"]),
+            # Filters the search box query parser compiles to
+            models.Index(fields=["vehicle_type"]),
+            models.Index(fields=["electronics_type"]),
+            models.Index(fields=["property_type"]),
+            models.Index(fields=["year"]),
+            # Keyset pagination key for browsing approved ads
+            models.Index(fields=["status", "-is_featured", "-created_at", "-id"]),
         ]
 
 
 class FeaturedAd(models.Model):
+    SCHEDULED = 'scheduled'
+    ACTIVE = 'active'
+    EXPIRED = 'expired'
+    STATE_CHOICES = (
+        (SCHEDULED, 'Scheduled'),
+        (ACTIVE, 'Active'),
+        (EXPIRED, 'Expired'),
+    )
+
     ad = models.OneToOneField(Ad, on_delete=models.CASCADE, related_name='featuredad')
     payment_screenshot = models.ImageField(upload_to='payment_screenshots/')
     featured_start_date = models.DateTimeField(default=timezone.now)
     featured_expiry_date = models.DateTimeField()
+    # Moved along by base.featured at the start and expiry times, which
+    # also mirrors it onto Ad.is_featured
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=SCHEDULED, editable=False)
+    expiring_notified = models.BooleanField(default=False, editable=False)
+    # Homepage slot impressions, flushed in batches by base.rotation
+    impressions = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Due-time queue of the featured scheduler
+            models.Index(fields=['state', 'featured_start_date']),
+            models.Index(fields=['state', 'featured_expiry_date']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.ad.is_approved:
             raise ValueError(f"Cannot create FeaturedAd for unapproved ad: {self.ad.name}")
+        if self.state == self.EXPIRED and self.featured_expiry_date > timezone.now():
+            # Extended after expiring: back in the queue
+            self.state = self.SCHEDULED
+        if self.featured_expiry_date > timezone.now() + EXPIRING_SOON:
+            # Warn again before the new expiry
+            self.expiring_notified = False
         super().save(*args, **kwargs)
 
     def is_active(self):
@@ -498,12 +659,59 @@ class AdImage(models.Model):
     image = models.ImageField( upload_to='ad_images/'
     )
 
+    def refresh_ad_cover(self):
+        """Point the ad's cover at its first remaining image, or clear it"""
+        cover = AdImage.objects.filter(ad_id=self.ad_id).order_by('pk').first()
+        # update() skips the Ad signals: the cover is not searchable data
+        Ad.objects.filter(pk=self.ad_id).update(
+            cover_image=cover,
+            cover_image_url=cover.image.url if cover and cover.image else '',
+        )
+
+class AdVisitorSketch(models.Model):
+    """
+    HyperLogLog sketch (base.hll) of an ad's distinct visitors on one day.
+    compact_visitor_sketches folds old days into a single cumulative row
+    dated with the last day it covers.
+    """
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='visitor_sketches')
+    day = models.DateField()
+    cumulative = models.BooleanField(default=False)
+    registers = models.BinaryField()
+
+    class Meta:
+        unique_together = ('ad', 'day')
+
+    def __str__(self):
+        return f"Visitors of {self.ad_id} on {self.day}"
+
+class SimilarAd(models.Model):
+    """One of an ad's precomputed "more like this" neighbours (base.similar)"""
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='similar_ads')
+    similar = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('ad', 'rank')
+        ordering = ['ad', 'rank']
+
+    def __str__(self):
+        return f"{self.similar_id} is #{self.rank + 1} like {self.ad_id}"
+
 class Comment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='comments')
     text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    # Top-level comment of the thread, for loading a thread in one query (base.comments)
+    root = models.ForeignKey('self', null=True, blank=True, editable=False, on_delete=models.CASCADE, related_name='thread_replies')
+
+    def save(self, *args, **kwargs):
+        if self.parent_id and not self.root_id:
+            self.root_id = self.parent.root_id or self.parent_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Comment by {self.user.email} on {self.ad.name}"
@@ -613,17 +821,27 @@ class SellerRating(models.Model):
         return f"{self.rater.get_short_name()} rated {self.seller.get_short_name()} - {self.rating} stars"
     
     def save(self, *args, **kwargs):
-        """Override save to update seller stats"""
-        super().save(*args, **kwargs)
-        # Update seller stats
-        self.seller.get_seller_stats().update_stats()
+        """Override save to apply the change to the seller stats"""
+        from django.db import transaction
+        from .sellerstats import rating_changed
+
+        with transaction.atomic():
+            old = None
+            if self.pk:
+                old = SellerRating.objects.filter(pk=self.pk).values_list('seller_id', 'rating').first()
+            super().save(*args, **kwargs)
+            rating_changed(old, (self.seller_id, self.rating))
     
     def delete(self, *args, **kwargs):
-        """Override delete to update seller stats"""
-        seller = self.seller
-        super().delete(*args, **kwargs)
-        # Update seller stats
-        seller.get_seller_stats().update_stats()
+        """Override delete to apply the change to the seller stats"""
+        from django.db import transaction
+        from .sellerstats import rating_changed
+
+        with transaction.atomic():
+            old = SellerRating.objects.filter(pk=self.pk).values_list('seller_id', 'rating').first()
+            result = super().delete(*args, **kwargs)
+            rating_changed(old, None)
+        return result
 
 class SellerStats(models.Model):
     user = models.OneToOneField(
@@ -632,7 +850,11 @@ class SellerStats(models.Model):
         related_name='seller_stats'
     )
     total_ratings = models.PositiveIntegerField(default=0)
+    # Sum of the stars, so average_rating can be kept up to date with deltas
+    rating_sum = models.PositiveIntegerField(default=0)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    # Bayesian average, see base.sellerstats
+    reputation = models.FloatField(default=PRIOR_MEAN)
     response_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     total_ads = models.PositiveIntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
@@ -654,48 +876,11 @@ class SellerStats(models.Model):
         return f"Stats for {self.user.get_short_name()}"
     
     def update_stats(self):
-        """Update all seller statistics"""
-        from django.db.models import Avg, Count, Q
-        
-        # Update rating stats
-        ratings = SellerRating.objects.filter(seller=self.user)
-        self.total_ratings = ratings.count()
-        
-        if self.total_ratings > 0:
-            # Calculate average rating
-            avg_result = ratings.aggregate(avg=Avg('rating'))
-            self.average_rating = avg_result['avg'] or 0.00
-            
-            # Update rating distribution
-            self.five_star_count = ratings.filter(rating=5).count()
-            self.four_star_count = ratings.filter(rating=4).count()
-            self.three_star_count = ratings.filter(rating=3).count()
-            self.two_star_count = ratings.filter(rating=2).count()
-            self.one_star_count = ratings.filter(rating=1).count()
-        else:
-            self.average_rating = 0.00
-            self.five_star_count = 0
-            self.four_star_count = 0
-            self.three_star_count = 0
-            self.two_star_count = 0
-            self.one_star_count = 0
-        
-        # Update ad count (only approved ads)
-        self.total_ads = Ad.objects.filter(
-            advertiser=self.user, 
-            status='approved'
-        ).count()
-        
-        # Update response rate (you can implement this based on your messaging system)
-        # For now, we'll set a placeholder or keep the existing value
-        if not self.response_rate:
-            # Simple heuristic based on ratings and ad count
-            if self.total_ads > 0 and self.total_ratings > 0:
-                self.response_rate = min(100, (self.total_ratings / self.total_ads) * 100)
-            else:
-                self.response_rate = 0.00
-        
-        self.save()
+        """Recompute all seller statistics from the ratings and ads"""
+        from .sellerstats import recompute
+
+        recompute([self.user_id])
+        self.refresh_from_db()
     
     def get_rating_percentage(self, star_rating):
         """Get percentage of a specific star rating"""
@@ -709,4 +894,28 @@ class SellerStats(models.Model):
         if self.total_ratings == 0:
             return 0
         positive_count = self.four_star_count + self.five_star_count
-        return (positive_count / self.total_ratings) * 100
\ No newline at end of file
+        return (positive_count / self.total_ratings) * 100
+
+
+class SellerRank(models.Model):
+    """
+    A seller's entry on the top sellers leaderboard of one scope: all
+    sellers (no category or place), a category, a place, or both. Rows
+    exist for the scopes the seller has approved ads in and are kept by
+    base.sellerstats, so a leaderboard is one range scan of the index.
+    """
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ranks')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    place = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    reputation = models.FloatField()
+    total_ratings = models.PositiveIntegerField(default=0)
+    approved_ads = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'place', '-reputation', '-total_ratings']),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} in {self.category_id or 'all'}/{self.place_id or 'all'}: {self.reputation:.2f}"
+
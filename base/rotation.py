@@ -0,0 +1,192 @@
+# rotation.py
+"""
+Fair rotation of the featured slots on the homepage.
+
+Every active FeaturedAd gets impressions in proportion to what it paid
+for: the slots go to the ads with the fewest impressions per day of
+featuring. pick() reads the pool (cards, stored impressions and weights)
+with a single cache get and adds the impressions this worker served
+since the pool was built, which it keeps in memory. Impressions are
+flushed every FLUSH_INTERVAL, and when the worker exits, to shared cache
+counters. rebuild_pool() moves the counters into FeaturedAd.impressions
+when it refreshes the pool, holding POOL_LOCK_KEY so two rebuilds never
+persist the same counts.
+"""
+import atexit
+import heapq
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY = 'featured:pool'
+POOL_LOCK_KEY = 'featured:pool:rebuilding'
+# Expires a lock left behind by a worker that died mid-rebuild
+POOL_LOCK_TIMEOUT = 60
+REBUILD_SCHEDULED_KEY = 'featured:pool:scheduled'
+POOL_MAX_AGE = timedelta(minutes=1)
+# Changes within this many seconds are covered by a single rebuild
+REBUILD_DELAY = 2.0
+FLUSH_INTERVAL = 10.0
+SLOTS = 8
+
+
+def _counter_key(featured_id):
+    return f'featured:impressions:{featured_id}'
+
+
+class _Impressions:
+    """Impressions served by this worker: unflushed, and since the pool was built"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.served = Counter()
+        self.pool_version = None
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def served_since(self, pool):
+        """{featured id: impressions} this worker served since pool was built"""
+        if pool['version'] != self.pool_version:
+            with self.lock:
+                self.served = Counter()
+                self.pool_version = pool['version']
+        return self.served
+
+    def add(self, featured_ids):
+        with self.lock:
+            self.counts.update(featured_ids)
+            self.served.update(featured_ids)
+            if time.monotonic() - self.flushed_at < FLUSH_INTERVAL:
+                return
+            counts = self.take()
+        threading.Thread(target=flush_impressions, args=(counts,), daemon=True).start()
+
+    def take(self):
+        counts, self.counts = self.counts, Counter()
+        self.flushed_at = time.monotonic()
+        return counts
+
+
+_impressions = _Impressions()
+
+
+@atexit.register
+def flush():
+    """Add the unflushed impressions to the shared counters, e.g. when the worker exits"""
+    with _impressions.lock:
+        counts = _impressions.take()
+    if counts:
+        flush_impressions(counts)
+
+
+def flush_impressions(counts):
+    """Add a worker's impression counts to the shared counters"""
+    for featured_id, count in counts.items():
+        key = _counter_key(featured_id)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # First flush for this ad; add() fails if another worker just created it
+            if not cache.add(key, count, timeout=None):
+                cache.incr(key, count)
+
+
+def _persist_counters(featured_ids):
+    """Move the shared counters into FeaturedAd.impressions; call with POOL_LOCK_KEY held"""
+    from .models import FeaturedAd
+
+    keys = {_counter_key(featured_id): featured_id for featured_id in featured_ids}
+    for key, count in cache.get_many(list(keys)).items():
+        if count:
+            FeaturedAd.objects.filter(pk=keys[key]).update(impressions=F('impressions') + count)
+            # decr, not delete: flushes since the read are kept
+            cache.decr(key, count)
+
+
+def rebuild_pool():
+    """
+    Store the active featured ads with their impressions and weights.
+
+    While another rebuild holds POOL_LOCK_KEY the pool is only built and
+    returned: persisting the counters again would count them twice, and
+    the other rebuild stores its own pool.
+    """
+    from .homepage import ad_card
+    from .models import FeaturedAd
+
+    locked = cache.add(POOL_LOCK_KEY, 1, timeout=POOL_LOCK_TIMEOUT)
+    try:
+        active = FeaturedAd.objects.filter(state=FeaturedAd.ACTIVE, ad__status='approved')
+        if locked:
+            _persist_counters(list(active.values_list('pk', flat=True)))
+        featured = list(active.select_related('ad__category').defer('ad__search_vector'))
+
+        now = timezone.now()
+        pool = {
+            'ads': [
+                dict(
+                    ad_card(featured_ad.ad, featured_ad.ad.category),
+                    featured_id=featured_ad.pk,
+                    impressions=featured_ad.impressions,
+                    # Days paid for, so a month-long featuring gets a month's share
+                    weight=max((featured_ad.featured_expiry_date - featured_ad.featured_start_date).total_seconds() / 86400, 1.0),
+                )
+                for featured_ad in featured
+            ],
+            'version': uuid.uuid4().hex,
+            'expires_at': now + POOL_MAX_AGE,
+        }
+        if locked:
+            cache.set(POOL_KEY, pool, timeout=None)
+        return pool
+    finally:
+        if locked:
+            cache.delete(POOL_LOCK_KEY)
+
+
+def schedule_rebuild():
+    """Rebuild the pool shortly, unless a rebuild is already scheduled"""
+    if not cache.add(REBUILD_SCHEDULED_KEY, 1, timeout=REBUILD_DELAY):
+        return
+
+    def run():
+        try:
+            time.sleep(REBUILD_DELAY)
+            rebuild_pool()
+        except Exception as e:
+            logger.error(f"Error rebuilding the featured rotation pool: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def pick(slots=SLOTS):
+    """Cards for the featured slots, least served per paid day first"""
+    pool = cache.get(POOL_KEY)
+    if pool is None:
+        pool = rebuild_pool()
+    elif pool['expires_at'] <= timezone.now():
+        schedule_rebuild()
+    if not pool['ads']:
+        return []
+
+    served = _impressions.served_since(pool)
+    chosen = heapq.nsmallest(
+        slots, pool['ads'],
+        # random() spreads ties between ads with equal shares
+        key=lambda card: ((card['impressions'] + served[card['featured_id']]) / card['weight'], random.random()),
+    )
+    _impressions.add([card['featured_id'] for card in chosen])
+    return chosen
@@ -0,0 +1,10 @@
+# search/__init__.py
+from .backends import get_search_backend, index_ad, remove_ad
+from .pagination import KeysetPaginator, estimate_count
+from .ranking import CLOSE_TIER, EXACT_TIER, rank_ads
+
+__all__ = [
+    'get_search_backend', 'index_ad', 'remove_ad',
+    'rank_ads', 'EXACT_TIER', 'CLOSE_TIER',
+    'KeysetPaginator', 'estimate_count',
+]
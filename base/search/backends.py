@@ -0,0 +1,240 @@
+# search/backends.py
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .text import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Searchable Ad fields, grouped by weight (name ranks above description,
+# description above the vehicle attributes). Synonym expansions rank like
+# the description
+NAME_FIELDS = ('name',)
+DESCRIPTION_FIELDS = ('description',)
+ATTRIBUTE_FIELDS = ('motortype', 'geartype', 'color')
+SYNONYM_FIELDS = ('search_synonyms',)
+INDEXED_FIELDS = NAME_FIELDS + DESCRIPTION_FIELDS + ATTRIBUTE_FIELDS + SYNONYM_FIELDS
+
+
+def attribute_text(ad):
+    """Join the low-weight attribute fields of an ad into one string"""
+    return ' '.join(getattr(ad, field) or '' for field in ATTRIBUTE_FIELDS)
+
+
+class BaseSearchBackend:
+    """Interface shared by all search backends"""
+
+    def index_ad(self, ad):
+        """Add or refresh a single ad in the index"""
+        raise NotImplementedError
+
+    def remove_ad(self, ad_id):
+        """Drop a single ad from the index"""
+        raise NotImplementedError
+
+    def rebuild(self, workers=1):
+        """Re-index every ad from scratch, in parallel where the backend can"""
+        raise NotImplementedError
+
+    def match(self, terms, require_all=False):
+        """Q object matching ads containing any (or every) term"""
+        raise NotImplementedError
+
+    def rank(self, terms):
+        """Text relevance expression in [0, 1), name hits above description hits"""
+        raise NotImplementedError
+
+    def filter(self, queryset, keyword):
+        """Restrict an Ad queryset to rows matching any word of the keyword"""
+        terms = tokenize(keyword)
+        if not terms:
+            return queryset
+        return queryset.filter(self.match(terms))
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """icontains fallback for databases without a text index"""
+
+    # Per-term score for a hit in each field group
+    field_weights = (
+        (NAME_FIELDS, 1.0),
+        (DESCRIPTION_FIELDS, 0.4),
+        (SYNONYM_FIELDS, 0.4),
+        (ATTRIBUTE_FIELDS, 0.2),
+    )
+
+    def index_ad(self, ad):
+        pass
+
+    def remove_ad(self, ad_id):
+        pass
+
+    def rebuild(self, workers=1):
+        pass
+
+    def _term_q(self, term, fields=INDEXED_FIELDS):
+        query = Q()
+        for field in fields:
+            query |= Q(**{f'{field}__icontains': term})
+        return query
+
+    def match(self, terms, require_all=False):
+        query = Q()
+        for term in terms:
+            if require_all:
+                query &= self._term_q(term)
+            else:
+                query |= self._term_q(term)
+        return query
+
+    def rank(self, terms):
+        score = Value(0.0)
+        for term in terms:
+            for fields, weight in self.field_weights:
+                score = score + Case(
+                    When(self._term_q(term, fields), then=Value(weight)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+        # Squash into [0, 1) like the real text indexes do
+        return score / (score + Value(float(len(terms))))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector stored on Ad.search_vector, backed by a GIN index"""
+
+    # 'simple' skips English stemming so Somali words are indexed as typed
+    config = 'simple'
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector(*NAME_FIELDS, weight='A', config=self.config)
+            + SearchVector(*DESCRIPTION_FIELDS, *SYNONYM_FIELDS, weight='B', config=self.config)
+            + SearchVector(*ATTRIBUTE_FIELDS, weight='C', config=self.config)
+        )
+
+    def _query(self, terms, require_all=False):
+        from django.contrib.postgres.search import SearchQuery
+
+        # Prefix match each word so "toyo" still finds "toyota"
+        operator = ' & ' if require_all else ' | '
+        raw = operator.join(f'{term}:*' for term in terms)
+        return SearchQuery(raw, search_type='raw', config=self.config)
+
+    def index_ad(self, ad):
+        from ..models import Ad
+
+        Ad.objects.filter(pk=ad.pk).update(search_vector=self._vector())
+
+    def remove_ad(self, ad_id):
+        # The vector lives on the ad row itself and goes away with it
+        pass
+
+    def rebuild(self, workers=1):
+        from ..models import Ad
+
+        Ad.objects.update(search_vector=self._vector())
+
+    def match(self, terms, require_all=False):
+        return Q(search_vector=self._query(terms, require_all))
+
+    def rank(self, terms):
+        from django.contrib.postgres.search import SearchRank
+
+        # Weights are D, C, B, A; normalization 32 scales to rank / (rank + 1)
+        return SearchRank(
+            F('search_vector'),
+            self._query(terms),
+            weights=[0.1, 0.2, 0.4, 1.0],
+            normalization=Value(32),
+        )
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """FTS5 virtual table keyed by Ad id, used by the local sqlite database"""
+
+    table = 'base_ad_fts'
+
+    # bm25 column weights for name, description, attributes, synonyms
+    column_weights = (10.0, 3.0, 1.0, 3.0)
+
+    def _match(self, terms, require_all=False):
+        operator = ' AND ' if require_all else ' OR '
+        return operator.join(f'"{term}"*' for term in terms)
+
+    def index_ad(self, ad):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [ad.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description, attributes, synonyms) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [ad.pk, ad.name, ad.description or '', attribute_text(ad), ad.search_synonyms or '']
+            )
+
+    def remove_ad(self, ad_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [ad_id])
+
+    def rebuild(self, workers=1):
+        from ..models import Ad
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        for ad in Ad.objects.only('id', *INDEXED_FIELDS).iterator(chunk_size=500):
+            self.index_ad(ad)
+
+    def match(self, terms, require_all=False):
+        return Q(id__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [self._match(terms, require_all)]
+        ))
+
+    def rank(self, terms):
+        # bm25() is negative, lower is better; flip it and squash into [0, 1)
+        weights = ', '.join(str(weight) for weight in self.column_weights)
+        bm25 = RawSQL(
+            f'SELECT -bm25({self.table}, {weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = base_ad.id',
+            [self._match(terms)],
+            output_field=FloatField(),
+        )
+        score = Coalesce(bm25, Value(0.0))
+        return score / (score + Value(1.0))
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Return the configured backend, falling back on the database engine"""
+    backend_path = getattr(settings, 'SEARCH_BACKEND', '')
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return SimpleSearchBackend()
+
+
+def index_ad(ad):
+    """Refresh an ad in the search index without breaking the caller"""
+    try:
+        get_search_backend().index_ad(ad)
+    except Exception as e:
+        logger.error(f"Error indexing ad {ad.pk} for search: {str(e)}")
+
+
+def remove_ad(ad_id):
+    """Remove an ad from the search index without breaking the caller"""
+    try:
+        get_search_backend().remove_ad(ad_id)
+    except Exception as e:
+        logger.error(f"Error removing ad {ad_id} from search index: {str(e)}")
@@ -0,0 +1,57 @@
+# search/cache.py
+import hashlib
+import json
+
+from django.core.cache import cache
+
+# Bumped whenever the set of approved ads changes
+APPROVED_ADS = 'approved_ads'
+
+
+def _generation_key(name):
+    return f'search:gen:{name}'
+
+
+def get_generation(name):
+    """Current value of a named generation counter"""
+    return cache.get_or_set(_generation_key(name), 1, timeout=None)
+
+
+def bump_generation(name):
+    """Invalidate everything cached under a generation counter"""
+    key = _generation_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+
+
+def make_key(prefix, generation, params):
+    """Stable cache key for a dict of normalized query parameters"""
+    digest = hashlib.md5(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'search:{prefix}:{generation}:{digest}'
+
+
+def category_generation(category_id):
+    """Name of the generation counter of the approved ads in one category"""
+    return f'category:{category_id}'
+
+
+def bump_ad_generations(category_ids):
+    """Invalidate searches over all ads and within the given categories"""
+    bump_generation(APPROVED_ADS)
+    for category_id in {category_id for category_id in category_ids if category_id}:
+        bump_generation(category_generation(category_id))
+
+
+def search_generation(category_id=None):
+    """
+    Generation of everything a search can return: its category's counter
+    when it is limited to one category, APPROVED_ADS otherwise. Browsing
+    one category is not expired by changes in the others.
+    """
+    if category_id:
+        return f'c{get_generation(category_generation(category_id))}'
+    return get_generation(APPROVED_ADS)
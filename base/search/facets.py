@@ -0,0 +1,105 @@
+# search/facets.py
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .cache import make_key, search_generation
+
+FACET_TIMEOUT = 60 * 10
+
+# (lower, upper) bounds in dollars; None means open ended
+PRICE_BUCKETS = (
+    (0, 100),
+    (100, 500),
+    (500, 1000),
+    (1000, 5000),
+    (5000, 20000),
+    (20000, None),
+)
+
+
+def price_bucket_label(index):
+    lower, upper = PRICE_BUCKETS[index]
+    if upper is None:
+        return f'${lower:,}+'
+    return f'${lower:,} - ${upper:,}'
+
+
+def price_bucket_filter(index):
+    """Filter kwargs for a price bucket index, or None if it is invalid"""
+    try:
+        index = int(index)
+    except (TypeError, ValueError):
+        return None
+    # Negative indexes would count from the end
+    if not 0 <= index < len(PRICE_BUCKETS):
+        return None
+    lower, upper = PRICE_BUCKETS[index]
+    bounds = {'price__gte': lower}
+    if upper is not None:
+        bounds['price__lt'] = upper
+    return bounds
+
+
+def price_bucket_expression():
+    whens = []
+    for index, (lower, upper) in enumerate(PRICE_BUCKETS):
+        if upper is not None:
+            whens.append(When(price__lt=upper, then=Value(index)))
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def compute_facets(queryset):
+    """
+    Count matches per category, ad type, location and price bucket.
+
+    A single GROUP BY over all four dimensions is rolled up in Python, so
+    adding facets does not add queries.
+    """
+    from ..models import Ad
+
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket_expression())
+        .values('category_id', 'category__name', 'ad_type', 'place__name', 'location', 'price_bucket')
+        .annotate(total=Count('pk'))
+    )
+
+    categories = defaultdict(int)
+    category_names = {}
+    ad_types = defaultdict(int)
+    locations = defaultdict(int)
+    prices = defaultdict(int)
+    for row in rows:
+        categories[row['category_id']] += row['total']
+        category_names[row['category_id']] = row['category__name']
+        ad_types[row['ad_type']] += row['total']
+        # Gazetteer name when the ad resolved to a place, its own text otherwise
+        locations[row['place__name'] or row['location'].strip().title()] += row['total']
+        prices[row['price_bucket']] += row['total']
+
+    ad_type_labels = dict(Ad.AD_TYPE_CHOICES)
+
+    def ordered(counts, label):
+        return [
+            {'value': value, 'label': label(value), 'count': count}
+            for value, count in sorted(counts.items(), key=lambda item: -item[1])
+        ]
+
+    return {
+        'category': ordered(categories, category_names.get),
+        'ad_type': ordered(ad_types, lambda value: ad_type_labels.get(value, value)),
+        'location': ordered(locations, lambda value: value)[:10],
+        'price': sorted(ordered(prices, price_bucket_label), key=lambda item: item['value']),
+    }
+
+
+def cached_facets(queryset, params):
+    """compute_facets, cached per query until the ads it covers change"""
+    key = make_key('facets', search_generation(params.get('category')), params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACET_TIMEOUT)
+    return facets
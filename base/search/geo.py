@@ -0,0 +1,107 @@
+# search/geo.py
+import math
+
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Length of the geohash stored on Ad; 7 characters is a ~150 m cell
+PRECISION = 7
+EARTH_RADIUS_KM = 6371.0
+# Largest radius a search may ask for
+MAX_RADIUS_KM = 500
+# Radii offered on the search page, in km
+RADIUS_CHOICES = (5, 10, 25, 50, 100)
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle.
+
+    Picks the finest precision whose cells are still at least radius_km
+    across, then returns the centre cell and its eight neighbours.
+    """
+    lat_km = radius_km / 111.32
+    lon_km = radius_km / (111.32 * max(math.cos(math.radians(latitude)), 0.01))
+    precision = PRECISION
+    while precision > 1:
+        height, width = cell_size(precision)
+        if height >= lat_km and width >= lon_km:
+            break
+        precision -= 1
+
+    height, width = cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0, height):
+        for dlon in (-width, 0, width):
+            lat = min(max(latitude + dlat, -90.0), 90.0)
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in km from a point to Ad.latitude/longitude, in SQL"""
+    lat = math.radians(latitude)
+    dlat = (Radians(F('latitude')) - lat) / 2
+    dlon = (Radians(F('longitude')) - math.radians(longitude)) / 2
+    a = Power(Sin(dlat), 2) + math.cos(lat) * Cos(Radians(F('latitude'))) * Power(Sin(dlon), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Ads within radius_km of a point.
+
+    Geohash prefixes turn into index range scans that narrow the candidates
+    to nine cells; the exact distance is only computed for those rows.
+    """
+    cells = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        # Range instead of LIKE so a plain btree index serves it everywhere
+        cells |= Q(geohash__gte=cell, geohash__lte=cell + 'z' * (PRECISION - len(cell)))
+    return (
+        queryset.filter(cells)
+        .annotate(distance=distance_expression(latitude, longitude))
+        .filter(distance__lte=radius_km)
+    )
@@ -0,0 +1,51 @@
+# search/hot.py
+"""
+Precomputed first pages for the hot queries picked from the search log.
+
+Running a hot query fills the result and facet caches of its first page.
+Those expire with listing changes, so warm_in_background() recomputes the
+hot queries once the burst of changes has settled.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+from .querylog import hot_queries
+
+logger = logging.getLogger(__name__)
+
+# Changes within this many seconds are covered by a single warm-up
+WARM_DELAY = 5.0
+WARM_LOCK_KEY = 'search:warming'
+
+
+def warm_hot_queries():
+    """Compute the first page of every hot query, return how many there are"""
+    from django.http import QueryDict
+
+    from ..views import search_context
+
+    queries = hot_queries()
+    for query in queries:
+        search_context(QueryDict(query))
+    return len(queries)
+
+
+def warm_in_background():
+    """Rewarm the hot queries WARM_DELAY after listings change, from one worker"""
+    if not hot_queries() or not cache.add(WARM_LOCK_KEY, 1, timeout=WARM_DELAY):
+        return
+
+    def run():
+        try:
+            time.sleep(WARM_DELAY)
+            warm_hot_queries()
+        except Exception as e:
+            logger.error(f"Error warming the hot search queries: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
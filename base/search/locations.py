@@ -0,0 +1,53 @@
+# search/locations.py
+import unicodedata
+
+from django.db.models import Q
+
+from .text import tokenize
+
+
+def location_key(text):
+    """Lookup key for a place name: lowercase words, accents and punctuation dropped"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(tokenize(text))
+
+
+def location_candidates(text):
+    """Alias keys to try for free text, best first: the whole text, then each comma separated part"""
+    candidates = [location_key(text)]
+    candidates += [location_key(part) for part in (text or '').split(',')]
+    return [key for key in dict.fromkeys(candidates) if key]
+
+
+def resolve_location(text):
+    """
+    Match free text against the gazetteer, or return None.
+
+    Tries the whole text first, then each comma separated part, so
+    "Jigjiga Yar, Hargeisa" still resolves when only Hargeisa is known.
+    """
+    from ..models import LocationAlias
+
+    candidates = location_candidates(text)
+    if not candidates:
+        return None
+
+    # Canonical names are stored as aliases too, so this is one indexed lookup
+    hits = {
+        alias.key: alias.location
+        for alias in LocationAlias.objects.filter(key__in=candidates).select_related('location')
+    }
+    for key in candidates:
+        if key in hits:
+            return hits[key]
+    return None
+
+
+def location_filter(location):
+    """Indexed Ad filter for a place and, for regions, every place inside it"""
+    from ..models import Location
+
+    return Q(place__in=Location.objects.filter(Q(pk=location.pk) | Q(region=location)).values('pk'))
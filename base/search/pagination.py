@@ -0,0 +1,211 @@
+# search/pagination.py
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import Q
+
+# Result sets at least this big report an estimate instead of an exact count
+COUNT_CAP = 1000
+
+
+def _cursor_value(value):
+    # Full-precision timestamps: DjangoJSONEncoder would cut microseconds
+    # and break equality on created_at ties
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot store {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values, snapshot=None):
+    payload = values if snapshot is None else {'key': values, 'at': snapshot}
+    raw = json.dumps(payload, default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+
+
+def decode_cursor(cursor):
+    """Return the key values stored in a cursor, or None if it is malformed"""
+    values = _decode(cursor)
+    if isinstance(values, dict):
+        values = values.get('key')
+    return values if isinstance(values, list) else None
+
+
+def cursor_snapshot(cursor):
+    """Return the snapshot value stored in a cursor, or None"""
+    payload = _decode(cursor)
+    return payload.get('at') if isinstance(payload, dict) else None
+
+
+def estimate_count(queryset, cap=COUNT_CAP):
+    """
+    Return (count, is_estimate) for a queryset.
+
+    Counting stops after cap + 1 rows so big result sets cost the same as
+    small ones; past the cap Postgres reports its planner estimate.
+    """
+    capped = queryset.order_by().values('pk')[:cap + 1].count()
+    if capped <= cap:
+        return capped, False
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]['Plan']['Plan Rows']), cap), True
+    return cap, True
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, iterable like a regular Page"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination for a queryset with a total ordering.
+
+    The ordering is read from queryset.query.order_by and must end in a
+    unique column (normally id). Each page is fetched with a WHERE on the
+    last seen key instead of an OFFSET, so page 500 costs the same as page 1.
+
+    snapshot, if given, is stored in every cursor the paginator hands
+    out (see cursor_snapshot), for orderings computed from a value such
+    as the current time that later pages must reuse.
+    """
+
+    def __init__(self, queryset, per_page, count_cap=COUNT_CAP, snapshot=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_cap = count_cap
+        self.snapshot = snapshot
+        self.keys = [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in queryset.query.order_by
+        ]
+        self._count = None
+
+    def count_and_flag(self):
+        """(count, is_estimate), counted on first use"""
+        if self._count is None:
+            self._count = estimate_count(self.queryset, self.count_cap)
+        return self._count
+
+    def set_count(self, count, is_estimate):
+        """Use a count obtained elsewhere, e.g. from a cache, instead of counting"""
+        self._count = (count, is_estimate)
+
+    @property
+    def count(self):
+        return self.count_and_flag()[0]
+
+    @property
+    def count_is_estimate(self):
+        return self.count_and_flag()[1]
+
+    def _key_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def _parse_cursor(self, cursor):
+        """
+        Key values of a cursor converted to their fields' types, or None
+        if it is malformed or does not fit this paginator's ordering
+        """
+        values = decode_cursor(cursor)
+        if values is None or len(values) != len(self.keys):
+            return None
+        try:
+            values = [self._key_field(name).to_python(value) for (name, _), value in zip(self.keys, values)]
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            return None
+        # Keys are never null, and a None would break the seek lookups
+        return values if all(value is not None for value in values) else None
+
+    def _key_values(self, obj):
+        return [getattr(obj, name) for name, _ in self.keys]
+
+    def _cursor(self, obj):
+        return encode_cursor(self._key_values(obj), self.snapshot)
+
+    def _seek(self, values, backwards):
+        """Q for rows strictly after (or before) the given key values"""
+        names = [name for name, _ in self.keys]
+        seek = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(names[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            seek |= step
+        return seek
+
+    def get_page(self, after=None, before=None):
+        """Fetch the page following the `after` cursor or preceding `before`"""
+        before_values = self._parse_cursor(before)
+        after_values = None if before_values else self._parse_cursor(after)
+        queryset = self.queryset
+
+        if before_values:
+            reverse_order = [
+                name if descending else f'-{name}' for name, descending in self.keys
+            ]
+            rows = list(
+                queryset.filter(self._seek(before_values, backwards=True))
+                .order_by(*reverse_order)[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = list(reversed(rows[:self.per_page]))
+            previous_cursor = self._cursor(rows[0]) if has_previous and rows else None
+            next_cursor = self._cursor(rows[-1]) if rows else None
+            return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+        if after_values:
+            queryset = queryset.filter(self._seek(after_values, backwards=False))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self._cursor(rows[-1]) if has_next else None
+        previous_cursor = self._cursor(rows[0]) if after_values and rows else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
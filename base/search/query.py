@@ -0,0 +1,224 @@
+# search/query.py
+import re
+
+from django.utils import timezone
+
+from .locations import location_key
+
+# Words that only glue the structured parts together
+STOPWORDS = {'a', 'an', 'and', 'at', 'for', 'in', 'near', 'of', 'the', 'to', 'with'}
+BELOW_WORDS = ('under', 'below', 'less than', 'max', 'up to', 'upto', 'cheaper than')
+ABOVE_WORDS = ('over', 'above', 'more than', 'min', 'from', 'at least')
+# Ad fields whose *_CHOICES values can be typed straight into the search box
+CHOICE_FIELDS = (
+    ('ad_type', 'AD_TYPE_CHOICES'),
+    ('vehicle_type', 'VEHICLE_TYPE_CHOICES'),
+    ('electronics_type', 'ELECTRONICS_TYPE_CHOICES'),
+    ('property_type', 'PROPERTY_TYPE_CHOICES'),
+)
+# Choice values too vague to act as a filter
+IGNORED_CHOICES = {'other'}
+MIN_YEAR = 1950
+# Longest phrase (in words) looked up as a category, choice or place
+MAX_PHRASE = 3
+
+AMOUNT_RE = re.compile(r'^\$?(\d+(?:[.,]\d+)*)([km]?)\$?$')
+RANGE_RE = re.compile(r'^(\$?[\d.,]+[km]?)-(\$?[\d.,]+[km]?)$')
+COMPARE_RE = re.compile(r'^(<=?|>=?)(\$?[\d.,]+[km]?)$')
+
+
+def parse_amount(token):
+    """Price typed as 5000, $5,000, 5k or 1.5m, or None"""
+    match = AMOUNT_RE.match(token)
+    if not match:
+        return None
+    number, suffix = match.groups()
+    try:
+        value = float(number.replace(',', ''))
+    except ValueError:
+        return None
+    return value * {'': 1, 'k': 1000, 'm': 1000000}[suffix]
+
+
+def _is_year(token):
+    return token.isdigit() and len(token) == 4 and MIN_YEAR <= int(token) <= timezone.now().year + 1
+
+
+class ParsedQuery:
+    """
+    A search box query split into indexed filters and leftover free text.
+
+    filters holds Ad lookups (price__lte, year, ...), category a Category
+    from the list passed in and location the text of a known place.
+    boosts holds the choice values the words name (vehicle_type,
+    is_automatic, ...): the words stay in text, and ads with those values
+    rank higher rather than being the only ones kept. labels describes
+    the recognized filters other than category, for the filter chips.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.filters = {}
+        self.boosts = {}
+        self.category = None
+        self.location = ''
+        self.labels = []
+
+    def __bool__(self):
+        return bool(self.filters or self.boosts or self.category or self.location)
+
+
+def _vocabulary(categories):
+    from ..models import Ad
+
+    # Categories win over choice values: "jobs" means the Jobs category
+    vocabulary = {}
+    for category in categories:
+        name = category.name.lower()
+        for form in (name, f'{name}s', name.rstrip('s')):
+            vocabulary.setdefault(form, ('category', category, category.name))
+    for field, choices_name in CHOICE_FIELDS:
+        for value, label in getattr(Ad, choices_name):
+            if value in IGNORED_CHOICES:
+                continue
+            for phrase in (value.replace('_', ' '), label.lower()):
+                for form in (phrase, f'{phrase}s'):
+                    vocabulary.setdefault(form, (field, value, label))
+    return vocabulary
+
+
+def _take_phrase(words, i, phrases):
+    """Length of the phrase from phrases starting at words[i], or 0"""
+    for phrase in phrases:
+        size = len(phrase.split())
+        if ' '.join(words[i:i + size]) == phrase:
+            return size
+    return 0
+
+
+def _parse_prices(words, parsed):
+    """Pull price bounds and years out of the words, return what is left"""
+    left = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        below = _take_phrase(words, i, BELOW_WORDS)
+        above = 0 if below else _take_phrase(words, i, ABOVE_WORDS)
+        size = below or above
+        if size and i + size < len(words) and parse_amount(words[i + size]) is not None:
+            amount = parse_amount(words[i + size])
+            lookup = 'price__lte' if below else 'price__gte'
+            parsed.filters.setdefault(lookup, amount)
+            i += size + 1
+            continue
+
+        compare = COMPARE_RE.match(word)
+        if compare and parse_amount(compare.group(2)) is not None:
+            lookup = 'price__lte' if compare.group(1).startswith('<') else 'price__gte'
+            parsed.filters.setdefault(lookup, parse_amount(compare.group(2)))
+            i += 1
+            continue
+
+        span = RANGE_RE.match(word)
+        if span:
+            low, high = span.groups()
+            if _is_year(low) and _is_year(high):
+                parsed.filters.setdefault('year__gte', int(low))
+                parsed.filters.setdefault('year__lte', int(high))
+                i += 1
+                continue
+            low, high = parse_amount(low), parse_amount(high)
+            if low is not None and high is not None:
+                parsed.filters.setdefault('price__gte', min(low, high))
+                parsed.filters.setdefault('price__lte', max(low, high))
+                i += 1
+                continue
+
+        if _is_year(word) and 'year' not in parsed.filters:
+            parsed.filters['year'] = int(word)
+            i += 1
+            continue
+
+        if word in ('automatic', 'manual'):
+            parsed.boosts.setdefault('is_automatic', word == 'automatic')
+
+        left.append(word)
+        i += 1
+    return left
+
+
+def _parse_phrases(words, parsed, categories):
+    """Match categories and choice values, longest phrase first; choice words are kept"""
+    vocabulary = _vocabulary(categories)
+    left = []
+    i = 0
+    while i < len(words):
+        for size in range(min(MAX_PHRASE, len(words) - i), 0, -1):
+            entry = vocabulary.get(' '.join(words[i:i + size]))
+            if not entry:
+                continue
+            field, value, label = entry
+            if field == 'category':
+                if parsed.category is not None:
+                    continue
+                parsed.category = value
+            else:
+                # "phone" still has to match ads that say phone but are
+                # typed otherwise, so the words stay in the text query
+                parsed.boosts.setdefault(field, value)
+                left.extend(words[i:i + size])
+            i += size
+            break
+        else:
+            left.append(words[i])
+            i += 1
+    return left
+
+
+def _parse_location(words, parsed):
+    """Match one gazetteer place, in a single indexed alias lookup"""
+    from ..models import LocationAlias
+
+    grams = {}
+    for size in range(MAX_PHRASE, 0, -1):
+        for i in range(len(words) - size + 1):
+            key = location_key(' '.join(words[i:i + size]))
+            if key:
+                grams.setdefault(key, (i, size))
+    if not grams:
+        return words
+    known = set(LocationAlias.objects.filter(key__in=list(grams)).values_list('key', flat=True))
+    for key, (i, size) in grams.items():
+        if key in known:
+            parsed.location = ' '.join(words[i:i + size]).title()
+            return words[:i] + words[i + size:]
+    return words
+
+
+def parse_query(text, categories=()):
+    """
+    Split a query like "toyota under 5k Hargeisa automatic" into filters
+    that hit indexed columns, ranking boosts and the words for the text
+    index.
+    """
+    parsed = ParsedQuery()
+    words = (text or '').lower().split()
+    words = _parse_prices(words, parsed)
+    words = _parse_phrases(words, parsed, categories)
+    words = _parse_location(words, parsed)
+    parsed.text = ' '.join(word for word in words if word not in STOPWORDS)
+
+    if 'price__gte' in parsed.filters or 'price__lte' in parsed.filters:
+        low = parsed.filters.get('price__gte')
+        high = parsed.filters.get('price__lte')
+        if low is not None and high is not None:
+            parsed.labels.append(f'${low:,.0f} - ${high:,.0f}')
+        elif high is not None:
+            parsed.labels.append(f'Under ${high:,.0f}')
+        else:
+            parsed.labels.append(f'Over ${low:,.0f}')
+    if 'year' in parsed.filters:
+        parsed.labels.append(str(parsed.filters['year']))
+    elif 'year__gte' in parsed.filters:
+        parsed.labels.append(f"{parsed.filters['year__gte']} - {parsed.filters['year__lte']}")
+    return parsed
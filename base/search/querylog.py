@@ -0,0 +1,202 @@
+# search/querylog.py
+"""
+Low-overhead log of the searches people run.
+
+search_ads hands every search to record(), which only appends to an
+in-process buffer. The buffer is written to SearchLog with one bulk insert
+once it holds BUFFER_SIZE entries, from a daemon thread so the request
+never waits on it, and by a background flusher every FLUSH_INTERVAL
+seconds so a quiet worker does not sit on its entries. rollup_day()
+turns the raw log into per-day SearchQueryStat rows, from which
+pick_hot_queries() chooses the searches whose first page is kept cached.
+"""
+import atexit
+import logging
+import math
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 100
+FLUSH_INTERVAL = 10.0
+# Parameters that identify a search; cursors and coordinates are left out
+LOGGED_PARAMS = ('q', 'location', 'category', 'ad_type', 'price', 'radius')
+MAX_QUERY_LENGTH = 255
+
+HOT_QUERIES_KEY = 'search:hot'
+HOT_QUERY_COUNT = 50
+# Days of stats the hot queries are picked from
+HOT_WINDOW_DAYS = 7
+
+
+def normalize_params(params):
+    """{name: value} of the parameters that identify a search, lowercased"""
+    normalized = {}
+    for name in LOGGED_PARAMS:
+        value = ' '.join((params.get(name) or '').lower().split())
+        if value:
+            normalized[name] = value
+    return normalized
+
+
+def query_string(params):
+    """
+    Canonical query string for normalized parameters, at most
+    MAX_QUERY_LENGTH long. Values are cut before they are encoded so a
+    %-escape is never split.
+    """
+    parts = []
+    room = MAX_QUERY_LENGTH
+    for name, value in sorted(params.items()):
+        prefix = f"{'&' if parts else ''}{quote_plus(name)}="
+        # Every character encodes to at least one
+        value = value[:max(0, room - len(prefix))]
+        while value and len(prefix) + len(quote_plus(value)) > room:
+            value = value[:-1]
+        if not value:
+            break
+        parts.append(prefix + quote_plus(value))
+        room -= len(parts[-1])
+    return ''.join(parts)
+
+
+class _Buffer:
+    def __init__(self):
+        self.entries = []
+        self.lock = threading.Lock()
+        self.flusher_pid = None
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            # Started lazily, and again in each forked worker
+            if self.flusher_pid != os.getpid():
+                self.flusher_pid = os.getpid()
+                threading.Thread(target=self.run, daemon=True).start()
+            if len(self.entries) < BUFFER_SIZE:
+                return
+            entries = self.take()
+        threading.Thread(target=write_entries, args=(entries, True), daemon=True).start()
+
+    def take(self):
+        entries, self.entries = self.entries, []
+        return entries
+
+    def run(self):
+        stop = threading.Event()
+        while not stop.wait(FLUSH_INTERVAL):
+            try:
+                flush()
+            except Exception as e:
+                logger.error(f"Error flushing search log: {str(e)}")
+            finally:
+                connection.close()
+
+
+_buffer = _Buffer()
+
+
+def write_entries(entries, close_connection=False):
+    from ..models import SearchLog
+
+    try:
+        SearchLog.objects.bulk_create([SearchLog(**entry) for entry in entries])
+    except Exception as e:
+        logger.error(f"Error writing {len(entries)} search log entries: {str(e)}")
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def record(params, results, latency_ms):
+    """Buffer one search for the log"""
+    _buffer.add({
+        'query': query_string(normalize_params(params)),
+        'results': results,
+        'latency_ms': latency_ms,
+        'created_at': timezone.now(),
+    })
+
+
+@atexit.register
+def flush():
+    """Write whatever is buffered, e.g. when the worker exits"""
+    with _buffer.lock:
+        entries = _buffer.take()
+    if entries:
+        write_entries(entries)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    index = min(len(values), max(1, math.ceil(fraction * len(values)))) - 1
+    return values[index]
+
+
+def rollup_day(day):
+    """Recompute the SearchQueryStat rows of one day, return how many there are"""
+    from ..models import SearchLog, SearchQueryStat
+
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    rows = SearchLog.objects.filter(
+        created_at__gte=start, created_at__lt=start + timedelta(days=1)
+    ).values_list('query', 'results', 'latency_ms')
+
+    latencies = defaultdict(list)
+    zero_results = defaultdict(int)
+    for query, results, latency_ms in rows.iterator(chunk_size=5000):
+        latencies[query].append(latency_ms)
+        if not results:
+            zero_results[query] += 1
+
+    stats = []
+    for query, values in latencies.items():
+        values.sort()
+        stats.append(SearchQueryStat(
+            day=day,
+            query=query,
+            searches=len(values),
+            zero_results=zero_results[query],
+            p50_ms=percentile(values, 0.50),
+            p95_ms=percentile(values, 0.95),
+            p99_ms=percentile(values, 0.99),
+        ))
+    with transaction.atomic():
+        SearchQueryStat.objects.filter(day=day).delete()
+        SearchQueryStat.objects.bulk_create(stats, batch_size=500)
+    return len(stats)
+
+
+def pick_hot_queries(count=HOT_QUERY_COUNT):
+    """Store the most searched queries of the last HOT_WINDOW_DAYS that return results"""
+    from ..models import SearchQueryStat
+
+    since = timezone.localdate() - timedelta(days=HOT_WINDOW_DAYS)
+    queries = list(
+        SearchQueryStat.objects.filter(day__gte=since)
+        # Radius searches depend on the visitor's position
+        .exclude(query__contains='radius=')
+        .values('query')
+        .annotate(total=Sum('searches'), empty=Sum('zero_results'))
+        .exclude(total=F('empty'))
+        .order_by('-total', 'query')
+        .values_list('query', flat=True)[:count]
+    )
+    cache.set(HOT_QUERIES_KEY, queries, timeout=None)
+    return queries
+
+
+def hot_queries():
+    """Query strings of the current hot queries, most searched first"""
+    return cache.get(HOT_QUERIES_KEY) or []
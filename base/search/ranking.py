@@ -0,0 +1,111 @@
+# search/ranking.py
+from datetime import timedelta
+
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .backends import get_search_backend
+from .pagination import cursor_snapshot
+from .text import tokenize
+
+EXACT_TIER = 0
+CLOSE_TIER = 1
+
+# relevance = TEXT_WEIGHT * text rank + featured boost + recency bonus
+#             + QUERY_BOOST for ads with the choice values the query names
+TEXT_WEIGHT = 1.0
+FEATURED_BOOST = 0.5
+QUERY_BOOST = 0.5
+
+# (max age, bonus) steps approximating an exponential decay; plain
+# created_at comparisons keep the expression portable and index friendly
+RECENCY_STEPS = (
+    (timedelta(days=1), 0.3),
+    (timedelta(days=7), 0.2),
+    (timedelta(days=30), 0.1),
+    (timedelta(days=90), 0.05),
+)
+
+
+def recency_bonus(now=None):
+    """Step-wise decaying bonus for recently posted ads"""
+    now = now or timezone.now()
+    return Case(
+        *[When(created_at__gte=now - age, then=Value(bonus)) for age, bonus in RECENCY_STEPS],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def scoring_time(cursor):
+    """
+    The time the first page of a search was scored, stored in its page
+    cursors, or now for a first page. Scoring every page at the same time
+    keeps ads from crossing a RECENCY_STEPS boundary between page loads
+    and moving across the cursor.
+    """
+    scored_at = cursor_snapshot(cursor)
+    try:
+        scored_at = parse_datetime(scored_at) if isinstance(scored_at, str) else None
+    except ValueError:
+        scored_at = None
+    return scored_at or timezone.now()
+
+
+def featured_boost():
+    return Case(
+        When(is_featured=True, then=Value(FEATURED_BOOST)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def rank_ads(queryset, keyword='', exact_filter=None, boost=None, now=None):
+    """
+    Score, tier and order matching ads in a single query.
+
+    Ads matching any keyword term or the boost Q are kept. Those matching
+    every term and exact_filter land in EXACT_TIER, the rest in
+    CLOSE_TIER, and each tier is ordered by its relevance score, raised
+    for ads matching boost (featured first, then newest, when there is no
+    keyword). The recency bonus is computed as of now, the current time
+    by default.
+    """
+    backend = get_search_backend()
+    terms = tokenize(keyword)
+    exact = exact_filter or Q()
+
+    if terms:
+        queryset = queryset.filter(backend.match(terms) | boost if boost else backend.match(terms))
+        exact = backend.match(terms, require_all=True) & exact
+        text_rank = backend.rank(terms)
+        if boost:
+            text_rank = text_rank * Value(TEXT_WEIGHT) + Case(
+                When(boost, then=Value(QUERY_BOOST)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        else:
+            text_rank = text_rank * Value(TEXT_WEIGHT)
+
+    if exact:
+        tier = Case(
+            When(exact, then=Value(EXACT_TIER)),
+            default=Value(CLOSE_TIER),
+            output_field=IntegerField(),
+        )
+    else:
+        tier = Value(EXACT_TIER)
+
+    if not terms:
+        # Plain browsing keeps the (is_featured, created_at, id) order so
+        # keyset pagination can walk the composite index
+        return queryset.annotate(match_tier=tier).order_by(
+            'match_tier', '-is_featured', '-created_at', '-id'
+        )
+
+    return queryset.annotate(
+        match_tier=tier,
+        relevance=text_rank + featured_boost() + recency_bonus(now),
+    ).order_by('match_tier', '-relevance', '-created_at', '-id')
@@ -0,0 +1,48 @@
+# search/results.py
+"""
+Versioned cache of search result pages.
+
+A page is stored as its ordered ad ids under the normalized query, the
+page cursor and search_generation() of the category searched. Saving or
+deleting an ad bumps its category's counter, so stale entries are never
+read again, while other categories keep theirs. Changes that bump no
+counter (featured rotation, expiry, ranking drifting with time) show up
+once the entry expires after RESULTS_TIMEOUT.
+"""
+from django.core.cache import cache
+
+from .cache import make_key, search_generation
+from .pagination import KeysetPage
+
+RESULTS_TIMEOUT = 5 * 60
+
+
+def cached_page(paginator, params, after=None, before=None):
+    """
+    paginator.get_page(after, before), served from the cached ad ids when
+    the query's generation has not moved. params is the normalized query
+    and must hold its category id under 'category'.
+    """
+    key = make_key('results', search_generation(params.get('category')), dict(
+        params, after=after or '', before=before or '',
+    ))
+    cached = cache.get(key)
+    if cached is None:
+        page = paginator.get_page(after=after, before=before)
+        cache.set(key, {
+            'ids': [ad.pk for ad in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+            # Only pages with rows show the count
+            'count': paginator.count_and_flag() if page.object_list else None,
+        }, RESULTS_TIMEOUT)
+        return page
+
+    # The ranked queryset keeps match_tier and the other annotations
+    rows = paginator.queryset.in_bulk(cached['ids'])
+    if cached['count'] is not None:
+        paginator.set_count(*cached['count'])
+    return KeysetPage(
+        [rows[pk] for pk in cached['ids'] if pk in rows],
+        paginator, cached['next'], cached['previous'],
+    )
@@ -0,0 +1,694 @@
+# search/segments.py
+"""
+Self-contained inverted index stored as immutable segment files.
+
+Every gunicorn worker mmaps the same files, so the index lives once in the
+OS page cache instead of once per process. Saves and deletes are queued
+until their transaction commits and written by a background thread as
+one small delta segment per WRITE_INTERVAL; once there are too many
+deltas they are merged in a background thread. rebuild() writes a fresh set of base segments (in parallel chunks
+if asked) and swaps them in by atomically replacing the manifest.
+
+Segment layout, little endian:
+    header     magic, version, term count, doc count, deleted count
+    docs       sorted uint32 ad ids stored in this segment
+    deleted    sorted uint32 ad ids removed by this segment
+    terms      (term offset, term length, postings offset, postings count)
+    term blob  utf-8 terms in byte order
+    postings   (uint32 ad id, float32 weight) sorted by ad id
+"""
+import atexit
+import fcntl
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .backends import (
+    ATTRIBUTE_FIELDS, DESCRIPTION_FIELDS, INDEXED_FIELDS, NAME_FIELDS, SYNONYM_FIELDS, BaseSearchBackend,
+)
+from .text import tokenize
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GBSEG1'
+VERSION = 1
+HEADER = struct.Struct('<6sHIII')
+DOC = struct.Struct('<I')
+TERM = struct.Struct('<QIQI')
+POSTING = struct.Struct('<If')
+
+MANIFEST = 'manifest.json'
+LOCK = '.lock'
+MERGE_LOCK = '.merge.lock'
+# Segments are written here and only moved next to the manifest, under the
+# lock, when it starts referencing them
+STAGING = 'staging'
+
+# Per-occurrence weight of a word in each field group
+FIELD_WEIGHTS = (
+    (NAME_FIELDS, 10.0),
+    (DESCRIPTION_FIELDS, 3.0),
+    (SYNONYM_FIELDS, 3.0),
+    (ATTRIBUTE_FIELDS, 1.0),
+)
+# Merge deltas once there are more than this many
+MAX_DELTAS = 8
+# Fold merged deltas into the base once they hold this share of its docs
+FULL_MERGE_RATIO = 0.1
+# How many indexed words a query prefix may expand to
+MAX_EXPANSIONS = 64
+# Most ads a search matches, best scored first. Their ids are query
+# parameters, so this is further capped by the database's limit
+MATCH_LIMIT = 1000
+# Id lists in a ranked search (match, exact tier, rank), plus a share
+# of the parameters left for the other filters
+ID_LISTS = 4
+# How often a worker looks for a new manifest, in seconds
+SYNC_INTERVAL = 1.0
+# How often queued saves and deletes are written as a delta, in seconds
+WRITE_INTERVAL = 1.0
+
+
+def index_dir():
+    return str(getattr(settings, 'SEARCH_INDEX_DIR', os.path.join(settings.BASE_DIR, 'search_index')))
+
+
+def ad_postings(ad):
+    """{term: weight} for one ad"""
+    weights = defaultdict(float)
+    for fields, weight in FIELD_WEIGHTS:
+        for field in fields:
+            for term in tokenize(getattr(ad, field, '') or ''):
+                weights[term] += weight
+    return weights
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def write_segment(path, terms, docs=(), deleted=()):
+    """
+    Write a segment from an iterable of (term, [(ad_id, weight), ...]) in
+    term order. Postings are spooled to a temporary file so a merge never
+    holds more than one term's postings in memory.
+    """
+    directory = os.path.dirname(path)
+    entries = []
+    blob = bytearray()
+    with tempfile.TemporaryFile(dir=directory) as spool:
+        offset = 0
+        for term, postings in terms:
+            if not postings:
+                continue
+            encoded = term.encode()
+            entries.append((len(blob), len(encoded), offset, len(postings)))
+            blob += encoded
+            for ad_id, weight in postings:
+                spool.write(POSTING.pack(ad_id, weight))
+            offset += len(postings) * POSTING.size
+
+        docs = sorted(docs)
+        deleted = sorted(deleted)
+        blob_start = HEADER.size + (len(docs) + len(deleted)) * DOC.size + len(entries) * TERM.size
+        postings_start = blob_start + len(blob)
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, VERSION, len(entries), len(docs), len(deleted)))
+            for ad_id in docs:
+                out.write(DOC.pack(ad_id))
+            for ad_id in deleted:
+                out.write(DOC.pack(ad_id))
+            for term_offset, term_length, postings_offset, count in entries:
+                out.write(TERM.pack(blob_start + term_offset, term_length, postings_start + postings_offset, count))
+            out.write(blob)
+            spool.seek(0)
+            shutil.copyfileobj(spool, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+
+
+def build_terms(ads):
+    """Sorted (term, postings) for a batch of ads, plus the ad ids seen"""
+    return invert((ad.pk, ad_postings(ad)) for ad in ads)
+
+
+def invert(postings):
+    """Sorted (term, postings) for (ad id, {term: weight}) pairs, plus the ad ids seen"""
+    index = defaultdict(list)
+    docs = []
+    for ad_id, weights in postings:
+        docs.append(ad_id)
+        for term, weight in weights.items():
+            index[term].append((ad_id, weight))
+    terms = sorted(index, key=str.encode)
+    return ((term, sorted(index[term])) for term in terms), docs
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+class Segment:
+    """Read-only view of one segment file through a shared mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.term_count, self.doc_count, self.deleted_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a search segment")
+        self._docs_at = HEADER.size
+        self._deleted_at = self._docs_at + self.doc_count * DOC.size
+        self._terms_at = self._deleted_at + self.deleted_count * DOC.size
+
+    def _ids(self, start, count):
+        return [ad_id for (ad_id,) in DOC.iter_unpack(self._map[start:start + count * DOC.size])]
+
+    def docs(self):
+        return self._ids(self._docs_at, self.doc_count)
+
+    def deleted(self):
+        return self._ids(self._deleted_at, self.deleted_count)
+
+    def _entry(self, i):
+        return TERM.unpack_from(self._map, self._terms_at + i * TERM.size)
+
+    def _term(self, entry):
+        return self._map[entry[0]:entry[0] + entry[1]]
+
+    def _lower_bound(self, key):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(self._entry(middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def expand(self, prefix):
+        """(term, postings offset, count) for indexed words starting with prefix"""
+        key = prefix.encode()
+        i = self._lower_bound(key)
+        found = []
+        while i < self.term_count and len(found) < MAX_EXPANSIONS:
+            entry = self._entry(i)
+            term = self._term(entry)
+            if not term.startswith(key):
+                break
+            found.append((term.decode(), entry[2], entry[3]))
+            i += 1
+        return found
+
+    def postings(self, offset, count):
+        return POSTING.iter_unpack(self._map[offset:offset + count * POSTING.size])
+
+    def iter_terms(self):
+        """Every (term, postings offset, count) in term order"""
+        for i in range(self.term_count):
+            entry = self._entry(i)
+            yield self._term(entry).decode(), entry[2], entry[3]
+
+    def close(self):
+        self._map.close()
+
+
+class SegmentReader:
+    """
+    A consistent set of open segments: base segments with disjoint ads,
+    then deltas, each newer delta overriding what came before it.
+    """
+
+    def __init__(self, version, base, deltas):
+        self.version = version
+        self.base = base
+        self.deltas = deltas
+        # Ads replaced or deleted by delta i or any later delta
+        self._masks = []
+        mask = set()
+        for delta in reversed(deltas):
+            self._masks.append(set(mask))
+            mask.update(delta.docs())
+            mask.update(delta.deleted())
+        self._masks.reverse()
+        self._base_mask = mask
+        self.doc_count = sum(segment.doc_count for segment in base + deltas)
+
+    def _sources(self):
+        for segment in self.base:
+            yield segment, self._base_mask
+        for segment, mask in zip(self.deltas, self._masks):
+            yield segment, mask
+
+    def term_scores(self, prefix):
+        """{ad_id: score} for ads containing a word starting with prefix"""
+        expansions = [
+            (segment, mask, offset, count)
+            for segment, mask in self._sources()
+            for _, offset, count in segment.expand(prefix)
+        ]
+        if not expansions:
+            return {}
+        df = sum(count for _, _, _, count in expansions)
+        idf = math.log(1 + self.doc_count / df)
+        scores = defaultdict(float)
+        for segment, mask, offset, count in expansions:
+            for ad_id, weight in segment.postings(offset, count):
+                if ad_id not in mask:
+                    scores[ad_id] += weight * idf
+        return scores
+
+    def search(self, terms, require_all=False):
+        """{ad_id: score} for ads matching any (or every) term"""
+        total = defaultdict(float)
+        matched = None
+        for term in terms:
+            scores = self.term_scores(term)
+            for ad_id, score in scores.items():
+                total[ad_id] += score
+            if require_all:
+                matched = set(scores) if matched is None else matched & set(scores)
+        if require_all:
+            return {ad_id: total[ad_id] for ad_id in matched or ()}
+        return dict(total)
+
+    def iter_merged(self, sources):
+        """(term, postings) across sources in term order, masked ads dropped"""
+        def stream(index, segment):
+            for term, offset, count in segment.iter_terms():
+                yield term, index, offset, count
+
+        streams = [stream(index, segment) for index, (segment, _) in enumerate(sources)]
+        current, postings = None, []
+        for term, index, offset, count in heapq.merge(*streams, key=lambda item: item[0].encode()):
+            if term != current:
+                if postings:
+                    yield current, sorted(postings)
+                current, postings = term, []
+            segment, mask = sources[index]
+            postings.extend(
+                (ad_id, weight) for ad_id, weight in segment.postings(offset, count)
+                if ad_id not in mask
+            )
+        if postings:
+            yield current, sorted(postings)
+
+
+# ---------------------------------------------------------------------------
+# Index directory
+# ---------------------------------------------------------------------------
+
+class SegmentIndex:
+    """Manifest, locking and the per-process open reader for one directory"""
+
+    def __init__(self, path):
+        self.path = path
+        self._reader = None
+        self._open = {}
+        self._checked_at = 0.0
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+        self._merging = threading.Lock()
+        # {ad id: {term: weight}, or None once deleted} waiting for the writer
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._writer_pid = None
+        atexit.register(self.flush)
+
+    # ----- Manifest -----
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def read_manifest(self):
+        try:
+            with open(self._file(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': 0, 'base': [], 'deltas': []}
+
+    def _write_manifest(self, manifest):
+        manifest['version'] += 1
+        tmp_path = self._file(f'{MANIFEST}.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # The swap every worker sees: old or new manifest, never half of one
+        os.replace(tmp_path, self._file(MANIFEST))
+        self._remove_unused(manifest)
+
+    def _remove_unused(self, manifest):
+        # Workers that still map a removed file keep reading it until they
+        # switch; the OS frees it once the last mapping goes away
+        live = set(manifest['base']) | set(manifest['deltas'])
+        for name in os.listdir(self.path):
+            if name.endswith('.seg') and name not in live:
+                try:
+                    os.remove(self._file(name))
+                except FileNotFoundError:
+                    pass
+
+    @contextmanager
+    def locked(self, name=LOCK, blocking=True):
+        """Cross-process file lock; yields False if not blocking and busy"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(name), 'w') as handle:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(handle, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def new_segment_path(self, kind, directory=None):
+        directory = directory or self._file(STAGING)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f'{kind}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.seg')
+
+    def _publish(self, path):
+        """Move a staged segment next to the manifest; call with the lock held"""
+        name = os.path.basename(path)
+        os.replace(path, self._file(name))
+        return name
+
+    # ----- Reading -----
+
+    def reader(self):
+        """Current reader, reopened at most once per SYNC_INTERVAL"""
+        now = time.monotonic()
+        if self._reader is not None and now - self._checked_at < SYNC_INTERVAL:
+            return self._reader
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self._file(MANIFEST)).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if self._reader is None or mtime != self._manifest_mtime:
+                try:
+                    self._reader = self._load(self.read_manifest())
+                    self._manifest_mtime = mtime
+                except FileNotFoundError:
+                    # A merge removed a file between reading the manifest
+                    # and opening it; try again on the next request
+                    self._checked_at = 0.0
+                    if self._reader is None:
+                        raise
+        return self._reader
+
+    def _load(self, manifest):
+        names = manifest['base'] + manifest['deltas']
+        opened = {name: self._open.get(name) or Segment(self._file(name)) for name in names}
+        for name, segment in self._open.items():
+            if name not in opened:
+                segment.close()
+        self._open = opened
+        return SegmentReader(
+            manifest['version'],
+            [opened[name] for name in manifest['base']],
+            [opened[name] for name in manifest['deltas']],
+        )
+
+    # ----- Writing -----
+
+    def queue(self, ads=(), deleted=()):
+        """
+        Record new versions of some ads, or their removal, once the current
+        transaction commits. The writer thread turns everything queued in
+        a WRITE_INTERVAL into one delta.
+        """
+        changes = {ad_id: None for ad_id in deleted}
+        # Only approved ads are searchable, so the others are removed rather
+        # than taking up MATCH_LIMIT slots the status filter would drop
+        changes.update((ad.pk, ad_postings(ad) if ad.status == 'approved' else None) for ad in ads)
+        transaction.on_commit(lambda: self._enqueue(changes))
+
+    def _enqueue(self, changes):
+        with self._pending_lock:
+            self._pending.update(changes)
+            # Started lazily, and again in each forked worker
+            if self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._run_writer, daemon=True).start()
+
+    def _run_writer(self):
+        stop = threading.Event()
+        while not stop.wait(WRITE_INTERVAL):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing search index delta: {str(e)}")
+
+    def flush(self):
+        """Write the queued changes as one delta, e.g. on worker shutdown"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self._append_postings(
+                [(ad_id, weights) for ad_id, weights in pending.items() if weights is not None],
+                [ad_id for ad_id, weights in pending.items() if weights is None],
+            )
+        except Exception:
+            # Keep them for the next attempt, behind anything queued since
+            with self._pending_lock:
+                for ad_id, weights in pending.items():
+                    self._pending.setdefault(ad_id, weights)
+            raise
+
+    def append_delta(self, ads=(), deleted=()):
+        """Record new versions of some ads, or their removal, as a delta now"""
+        ads = list(ads)
+        self._append_postings(
+            [(ad.pk, ad_postings(ad)) for ad in ads if ad.status == 'approved'],
+            list(deleted) + [ad.pk for ad in ads if ad.status != 'approved'],
+        )
+
+    def _append_postings(self, postings, deleted):
+        terms, docs = invert(postings)
+        with self.locked():
+            path = self.new_segment_path('delta')
+            write_segment(path, terms, docs, deleted)
+            manifest = self.read_manifest()
+            manifest['deltas'].append(self._publish(path))
+            self._write_manifest(manifest)
+            needs_merge = len(manifest['deltas']) > MAX_DELTAS
+        if needs_merge:
+            threading.Thread(target=self.merge, daemon=True).start()
+
+    def merge(self):
+        """Merge the deltas into one, or into the base once they grow big"""
+        if not self._merging.acquire(blocking=False):
+            return
+        try:
+            with self.locked(MERGE_LOCK, blocking=False) as acquired:
+                if acquired:
+                    self._merge()
+        except Exception as e:
+            logger.error(f"Error merging search segments: {str(e)}")
+        finally:
+            self._merging.release()
+
+    def _merge(self):
+        # Writers and rebuild() wait for the lock, so the deltas merged are
+        # still the manifest's whole list when the result replaces them
+        with self.locked():
+            manifest = self.read_manifest()
+            if not manifest['deltas'] or (len(manifest['deltas']) == 1 and manifest['base']):
+                # Another process merged them first
+                return
+            path, full = self._write_merged(manifest)
+            name = self._publish(path)
+            if full:
+                manifest['base'] = [name]
+                manifest['deltas'] = []
+            else:
+                manifest['deltas'] = [name]
+            self._write_manifest(manifest)
+
+    def _write_merged(self, manifest):
+        """Stage the merge of the manifest's segments, return its path and whether it is a base"""
+        deltas = [Segment(self._file(name)) for name in manifest['deltas']]
+        base = [Segment(self._file(name)) for name in manifest['base']]
+        try:
+            reader = SegmentReader(manifest['version'], base, deltas)
+            delta_docs = sum(segment.doc_count for segment in deltas)
+            base_docs = sum(segment.doc_count for segment in base)
+            full = not base or delta_docs >= base_docs * FULL_MERGE_RATIO
+
+            sources = list(zip(deltas, reader._masks))
+            if full:
+                sources = [(segment, reader._base_mask) for segment in base] + sources
+            # Latest state of every ad the merged deltas touch
+            docs, removed = set(), set()
+            for segment in deltas:
+                for ad_id in segment.docs():
+                    docs.add(ad_id)
+                    removed.discard(ad_id)
+                for ad_id in segment.deleted():
+                    removed.add(ad_id)
+                    docs.discard(ad_id)
+            if full:
+                docs = {ad_id for segment in base for ad_id in segment.docs() if ad_id not in reader._base_mask} | docs
+                removed = set()
+
+            path = self.new_segment_path('base' if full else 'delta')
+            write_segment(path, reader.iter_merged(sources), docs, removed)
+        finally:
+            for segment in base + deltas:
+                segment.close()
+        return path, full
+
+    def rebuild(self, workers=1, chunk_size=5000):
+        """Index every approved ad into new base segments and swap them in"""
+        from ..models import Ad
+
+        os.makedirs(self.path, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='rebuild-', dir=self.path)
+        started = self.read_manifest()
+        bounds = Ad.objects.order_by('pk').values_list('pk', flat=True)
+        first, last = bounds.first(), bounds.last()
+        chunks = [] if first is None else [
+            (start, start + chunk_size) for start in range(first, last + 1, chunk_size)
+        ]
+
+        if workers > 1 and len(chunks) > 1:
+            # Forked children must not share the parent's database sockets
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                paths = list(pool.map(_build_chunk, [(staging, start, end) for start, end in chunks]))
+        else:
+            paths = [_build_chunk((staging, start, end)) for start, end in chunks]
+
+        try:
+            with self.locked():
+                current = self.read_manifest()
+                current['base'] = [self._publish(path) for path in paths if path]
+                # Deltas written during the rebuild may be newer than what it read
+                current['deltas'] = [name for name in current['deltas'] if name not in started['deltas']]
+                self._write_manifest(current)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _build_chunk(args):
+    """Build one base segment for approved ads with start <= id < end"""
+    from ..models import Ad
+
+    staging, start, end = args
+    ads = Ad.objects.filter(pk__gte=start, pk__lt=end, status='approved').only('id', *INDEXED_FIELDS).order_by('pk')
+    terms, docs = build_terms(ads.iterator(chunk_size=1000))
+    if not docs:
+        return None
+    path = os.path.join(staging, f'base-{start}-{uuid.uuid4().hex[:8]}.seg')
+    write_segment(path, terms, docs)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Backend
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def get_segment_index(path):
+    """One SegmentIndex per directory and process"""
+    return SegmentIndex(path)
+
+
+class SegmentSearchBackend(BaseSearchBackend):
+    """
+    Memory-mapped segment index in SEARCH_INDEX_DIR, for databases without
+    a usable text index (the sqlite fallback, read-only replicas).
+    """
+
+    @property
+    def index(self):
+        return get_segment_index(index_dir())
+
+    def index_ad(self, ad):
+        self.index.queue(ads=[ad])
+
+    def remove_ad(self, ad_id):
+        self.index.queue(deleted=[ad_id])
+
+    def rebuild(self, workers=1):
+        self.index.rebuild(workers=workers)
+
+    def _best(self, terms, require_all=False):
+        reader = self.index.reader()
+        return _cached_best(self.index.path, reader.version, tuple(terms), require_all, match_limit())
+
+    def match(self, terms, require_all=False):
+        return Q(pk__in=[ad_id for ad_id, _ in self._best(terms, require_all)])
+
+    def rank(self, terms):
+        # One When per distinct score rather than per ad keeps the
+        # parameters to about one per matched ad
+        by_score = defaultdict(list)
+        for ad_id, score in self._best(terms):
+            # Squash into [0, 1) like the database backends
+            by_score[round(score / (score + 1.0), 6)].append(ad_id)
+        if not by_score:
+            return Value(0.0)
+        return Case(
+            *[When(pk__in=ad_ids, then=Value(score)) for score, ad_ids in by_score.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+
+def match_limit():
+    """MATCH_LIMIT, lowered so a ranked search fits the database's parameter limit"""
+    limit = connection.features.max_query_params
+    if connection.vendor == 'sqlite':
+        # Django assumes SQLite's old default of 999; Python 3.11+ can ask
+        connection.ensure_connection()
+        getlimit = getattr(connection.connection, 'getlimit', None)
+        if getlimit:
+            limit = getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    if not limit:
+        return MATCH_LIMIT
+    return max(1, min(MATCH_LIMIT, limit // ID_LISTS))
+
+
+@lru_cache(maxsize=128)
+def _cached_best(path, version, terms, require_all, limit):
+    # match() and rank() run the same lookup for one search; the manifest
+    # version in the key drops entries as soon as the index changes
+    scores = get_segment_index(path).reader().search(terms, require_all)
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
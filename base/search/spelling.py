@@ -0,0 +1,311 @@
+# search/spelling.py
+"""
+"Did you mean" corrections with a symmetric-delete (SymSpell) dictionary.
+
+Every word of the approved ads is stored with all its variants of up to
+MAX_DISTANCE deleted characters. A misspelled term generates its own
+deletes, and the words sharing one of them are the only candidates whose
+edit distance is computed, so a lookup costs a few dozen hash probes
+however large the vocabulary is.
+
+The table is a file of open-addressing hash buckets, mmapped read-only by
+every worker like the search segments. Requests only read it; a
+refresher thread, started by the first corrections() call in each
+process, rebuilds it once it is older than REBUILD_INTERVAL, or
+build_spelling_dictionary does from cron. Commands such as migrate and
+shell never ask for corrections, so they never start one.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+
+from django.db import connection
+
+from .backends import INDEXED_FIELDS
+from .text import WORD_RE, tokenize
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GBSPL1'
+VERSION = 1
+HEADER = struct.Struct('<6sHBBII')
+WORD = struct.Struct('<III')
+BUCKET = struct.Struct('<QII')
+WORD_ID = struct.Struct('<I')
+
+FILENAME = 'spelling.dict'
+MAX_DISTANCE = 2
+# Only the start of long words generates deletes, as in SymSpell
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 3
+REBUILD_INTERVAL = 6 * 60 * 60
+# How often a worker looks for a rebuilt file, in seconds
+SYNC_INTERVAL = 60.0
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+def deletes(word, distance=MAX_DISTANCE):
+    """The word's prefix with every combination of up to distance characters removed"""
+    word = word[:PREFIX_LENGTH]
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {
+            variant[:i] + variant[i + 1:]
+            for variant in frontier if len(variant) > 1
+            for i in range(len(variant))
+        }
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, limit=MAX_DISTANCE):
+    """Optimal string alignment distance, or limit + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def spelling_path():
+    from .segments import index_dir
+
+    return os.path.join(index_dir(), FILENAME)
+
+
+def collect_vocabulary():
+    """Word counts over the searchable fields of approved ads"""
+    from ..models import Ad
+
+    counts = Counter()
+    rows = Ad.objects.filter(status='approved').values_list(*INDEXED_FIELDS)
+    for row in rows.iterator(chunk_size=1000):
+        for value in row:
+            counts.update(
+                word for word in tokenize(value or '')
+                if len(word) >= MIN_WORD_LENGTH and not word.isdigit()
+            )
+    return counts
+
+
+def write_dictionary(path, counts):
+    """Write the word table and delete buckets for a {word: count} vocabulary"""
+    words = sorted(counts)
+    buckets_by_key = {}
+    for word_id, word in enumerate(words):
+        for key in deletes(word):
+            buckets_by_key.setdefault(_hash(key), []).append(word_id)
+
+    # Power of two, at most half full, so probes stay short
+    bucket_count = 1
+    while bucket_count < 2 * max(len(buckets_by_key), 1):
+        bucket_count *= 2
+    buckets = [(0, 0, 0)] * bucket_count
+    ids = []
+    for key_hash, word_ids in buckets_by_key.items():
+        slot = key_hash & (bucket_count - 1)
+        while buckets[slot][2]:
+            slot = (slot + 1) & (bucket_count - 1)
+        buckets[slot] = (key_hash, len(ids), len(word_ids))
+        ids.extend(word_ids)
+
+    encoded = [word.encode() for word in words]
+    words_at = HEADER.size
+    buckets_at = words_at + len(words) * WORD.size
+    ids_at = buckets_at + bucket_count * BUCKET.size
+    blob_at = ids_at + len(ids) * WORD_ID.size
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, MAX_DISTANCE, PREFIX_LENGTH, len(words), bucket_count))
+        offset = blob_at
+        for word, raw in zip(words, encoded):
+            out.write(WORD.pack(offset, len(raw), counts[word]))
+            offset += len(raw)
+        for key_hash, start, count in buckets:
+            out.write(BUCKET.pack(key_hash, ids_at + start * WORD_ID.size, count))
+        for word_id in ids:
+            out.write(WORD_ID.pack(word_id))
+        for raw in encoded:
+            out.write(raw)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+
+
+class SpellingDictionary:
+    """Read-only mmapped view of a dictionary file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_distance, self.prefix_length, self.word_count, self.bucket_count = (
+            HEADER.unpack_from(self._map, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a spelling dictionary")
+        self._buckets_at = HEADER.size + self.word_count * WORD.size
+
+    def _word(self, word_id):
+        offset, length, count = WORD.unpack_from(self._map, HEADER.size + word_id * WORD.size)
+        return self._map[offset:offset + length].decode(), count
+
+    def _word_ids(self, key):
+        key_hash = _hash(key)
+        slot = key_hash & (self.bucket_count - 1)
+        while True:
+            stored, offset, count = BUCKET.unpack_from(self._map, self._buckets_at + slot * BUCKET.size)
+            if not count:
+                return ()
+            if stored == key_hash:
+                return [word_id for (word_id,) in WORD_ID.iter_unpack(self._map[offset:offset + count * WORD_ID.size])]
+            slot = (slot + 1) & (self.bucket_count - 1)
+
+    def lookup(self, term):
+        """(word, distance) of the closest known word, most frequent on ties, or None"""
+        best = None
+        seen = set()
+        for key in deletes(term, self.max_distance):
+            for word_id in self._word_ids(key):
+                if word_id in seen:
+                    continue
+                seen.add(word_id)
+                word, count = self._word(word_id)
+                distance = edit_distance(term, word, self.max_distance)
+                if distance > self.max_distance:
+                    continue
+                if best is None or (distance, -count) < (best[1], -best[2]):
+                    best = (word, distance, count)
+        return best[:2] if best else None
+
+    def close(self):
+        self._map.close()
+
+
+class _Holder:
+    """Per-process dictionary, reopened when the file is replaced"""
+
+    def __init__(self):
+        self.dictionary = None
+        self.mtime = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.refresher_pid = None
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at >= SYNC_INTERVAL:
+            with self.lock:
+                self.checked_at = now
+                path = spelling_path()
+                try:
+                    mtime = os.stat(path).st_mtime
+                except FileNotFoundError:
+                    mtime = None
+                if mtime is not None and mtime != self.mtime:
+                    # The old map is left to the garbage collector, other
+                    # threads may still be reading it
+                    self.dictionary = SpellingDictionary(path)
+                    self.mtime = mtime
+        return self.dictionary
+
+
+_holder = _Holder()
+
+
+def start_refresher():
+    """
+    Check every SYNC_INTERVAL, from a daemon thread, whether the dictionary
+    is missing or older than REBUILD_INTERVAL and rebuild it if so. Runs
+    once per process, and again in each forked worker.
+    """
+    with _holder.lock:
+        if _holder.refresher_pid == os.getpid():
+            return
+        _holder.refresher_pid = os.getpid()
+
+    def run():
+        stop = threading.Event()
+        while not stop.wait(SYNC_INTERVAL):
+            try:
+                try:
+                    age = time.time() - os.stat(spelling_path()).st_mtime
+                except FileNotFoundError:
+                    age = None
+                if (age is None or age > REBUILD_INTERVAL) and rebuild():
+                    # Pick the new file up on the next request
+                    _holder.checked_at = 0.0
+            except Exception as e:
+                logger.error(f"Error rebuilding the spelling dictionary: {str(e)}")
+            finally:
+                connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def rebuild(force=False):
+    """Rebuild the dictionary file from the approved ads, once across workers"""
+    path = spelling_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        try:
+            try:
+                # Another worker may have just finished a rebuild
+                if not force and time.time() - os.stat(path).st_mtime < SYNC_INTERVAL:
+                    return False
+            except FileNotFoundError:
+                pass
+            write_dictionary(path, collect_vocabulary())
+            return True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def corrections(text):
+    """
+    {word: correction} for the words of a query that are not in the
+    dictionary but close to a word that is. Words with digits and very
+    short words are left alone.
+    """
+    start_refresher()
+    dictionary = _holder.get()
+    if dictionary is None:
+        return {}
+    found = {}
+    for word in tokenize(text):
+        if len(word) < MIN_WORD_LENGTH or any(char.isdigit() for char in word):
+            continue
+        match = dictionary.lookup(word)
+        if match and match[1] > 0:
+            found[word] = match[0]
+    return found
+
+
+def correct(text, found):
+    """text with the words in found replaced, keeping everything else"""
+    # The same word boundaries as tokenize(), so "toyta," is corrected too
+    return WORD_RE.sub(lambda match: found.get(match.group().lower(), match.group()), text or '')
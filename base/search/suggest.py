@@ -0,0 +1,243 @@
+# search/suggest.py
+import bisect
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection
+
+from .text import tokenize
+
+logger = logging.getLogger(__name__)
+
+AD = 'ad'
+CATEGORY = 'category'
+LOCATION = 'location'
+
+# Changes are shared between gunicorn workers through a numbered event
+# log in the cache; each worker replays what it has not seen yet
+EVENT_SEQ_KEY = 'suggest:seq'
+EVENT_TIMEOUT = 60 * 60
+# How often a worker looks for new events, in seconds
+SYNC_INTERVAL = 1.0
+# Keys are cut at this many characters; nobody types further than that
+MAX_KEY_LENGTH = 40
+# Prefixes this short match a large part of the index, so their best
+# suggestions are kept until the next change
+MEMO_PREFIX_LENGTH = 2
+TOP_SIZE = 20
+
+
+def normalize_location(text):
+    """Collapse spacing and casing so "  hargeisa " and "Hargeisa" match"""
+    return ' '.join((text or '').split()).title()
+
+
+class PrefixIndex:
+    """
+    Sorted array of weighted suggestion keys searched with bisect.
+
+    Each suggestion is indexed under every word start of its text, so
+    "cor" finds "Toyota Corolla". A lookup bisects to the first key with
+    the prefix and scans forward while keys still match.
+    """
+
+    def __init__(self, top_size=TOP_SIZE):
+        self.top_size = top_size
+        # Sorted (key, kind, text) tuples
+        self.keys = []
+        # (kind, text) -> weight
+        self.weights = {}
+        self._memo = {}
+
+    def _keys(self, text):
+        words = tokenize(text)
+        return {' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(len(words))}
+
+    def load(self, weights):
+        """Replace the contents with a {(kind, text): weight} mapping, sorting once"""
+        self.weights = {entry: weight for entry, weight in weights.items() if weight > 0}
+        self.keys = sorted(
+            (key, kind, text) for kind, text in self.weights for key in self._keys(text)
+        )
+        self._memo.clear()
+
+    def add(self, kind, text, weight=1):
+        entry = (kind, text)
+        if entry not in self.weights:
+            for key in self._keys(text):
+                bisect.insort(self.keys, (key, kind, text))
+        self.weights[entry] = self.weights.get(entry, 0) + weight
+        self._memo.clear()
+
+    def remove(self, kind, text, weight=1):
+        entry = (kind, text)
+        if entry not in self.weights:
+            return
+        remaining = self.weights[entry] - weight
+        if remaining > 0:
+            self.weights[entry] = remaining
+        else:
+            del self.weights[entry]
+            for key in self._keys(text):
+                item = (key, kind, text)
+                index = bisect.bisect_left(self.keys, item)
+                if index < len(self.keys) and self.keys[index] == item:
+                    del self.keys[index]
+        self._memo.clear()
+
+    def _top(self, prefix):
+        keys = self.keys
+        index = bisect.bisect_left(keys, (prefix,))
+        entries = set()
+        while index < len(keys) and keys[index][0].startswith(prefix):
+            entries.add(keys[index][1:])
+            index += 1
+        return heapq.nlargest(
+            self.top_size,
+            ((entry, self.weights[entry]) for entry in entries),
+            key=lambda item: (item[1], item[0]),
+        )
+
+    def search(self, prefix, limit=8):
+        prefix = ' '.join(tokenize(prefix))
+        if len(prefix) > MAX_KEY_LENGTH:
+            # Keys are truncated, so check the full prefix against the text
+            wanted = f' {prefix}'
+            top = [
+                (entry, weight) for entry, weight in self._top(prefix[:MAX_KEY_LENGTH])
+                if wanted in ' ' + ' '.join(tokenize(entry[1]))
+            ]
+        elif len(prefix) <= MEMO_PREFIX_LENGTH:
+            top = self._memo.get(prefix)
+            if top is None:
+                top = self._memo[prefix] = self._top(prefix)
+        else:
+            top = self._top(prefix)
+        return [
+            {'kind': kind, 'text': text, 'weight': weight}
+            for (kind, text), weight in top[:limit]
+        ]
+
+
+class SuggestionIndex:
+    """
+    Per-process prefix index of approved ad names, categories and locations.
+
+    The index is built on a background thread so no request waits for it;
+    searches return nothing until the first build is done.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._seq = 0
+        self._checked_at = 0.0
+        self._builder_pid = None
+
+    def _build(self):
+        from ..models import Ad, Category
+
+        weights = Counter((CATEGORY, name) for name in Category.objects.values_list('name', flat=True))
+        approved = Ad.objects.filter(status='approved').values_list('name', 'location')
+        for name, location in approved.iterator(chunk_size=2000):
+            weights[(AD, name.strip())] += 1
+            if location:
+                weights[(LOCATION, normalize_location(location))] += 1
+        index = PrefixIndex()
+        index.load(weights)
+        return index
+
+    def rebuild(self):
+        """Build a fresh index from the database and swap it in"""
+        # Read the sequence first; events published during the build are
+        # replayed on top of it by the next sync
+        seq = cache.get(EVENT_SEQ_KEY, 0)
+        index = self._build()
+        with self._lock:
+            self._index = index
+            self._seq = seq
+            self._checked_at = 0.0
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Error building the suggestion index: {str(e)}")
+        finally:
+            self._builder_pid = None
+            connection.close()
+
+    def _start_rebuild(self):
+        # Called with the lock held
+        if self._builder_pid == os.getpid():
+            return
+        self._builder_pid = os.getpid()
+        threading.Thread(
+            target=self._rebuild_in_background, name='suggest-build', daemon=True
+        ).start()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < SYNC_INTERVAL:
+            return
+        with self._lock:
+            if self._index is None:
+                self._start_rebuild()
+                return
+            self._checked_at = now
+            current = cache.get(EVENT_SEQ_KEY, 0)
+            if current <= self._seq:
+                return
+            keys = [f'suggest:event:{seq}' for seq in range(self._seq + 1, current + 1)]
+            events = cache.get_many(keys)
+            if len(events) != len(keys):
+                # Part of the log expired; keep serving the old index
+                # while a new one is read from the database
+                self._start_rebuild()
+            else:
+                for key in keys:
+                    self._apply(*events[key])
+            self._seq = current
+
+    def _apply(self, op, kind, text):
+        if op == 'add':
+            self._index.add(kind, text)
+        else:
+            self._index.remove(kind, text)
+
+    def search(self, prefix, limit=8):
+        self._sync()
+        with self._lock:
+            if self._index is None:
+                return []
+            return self._index.search(prefix, limit)
+
+
+suggestion_index = SuggestionIndex()
+
+
+def publish_change(op, kind, text):
+    """Append an add/remove event for every worker's suggestion index"""
+    if not text:
+        return
+    try:
+        cache.add(EVENT_SEQ_KEY, 0, timeout=None)
+        seq = cache.incr(EVENT_SEQ_KEY)
+        cache.set(f'suggest:event:{seq}', (op, kind, text), EVENT_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error publishing suggestion change for {text}: {str(e)}")
+
+
+def publish_ad_added(name, location):
+    publish_change('add', AD, (name or '').strip())
+    publish_change('add', LOCATION, normalize_location(location))
+
+
+def publish_ad_removed(name, location):
+    publish_change('remove', AD, (name or '').strip())
+    publish_change('remove', LOCATION, normalize_location(location))
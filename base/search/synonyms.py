@@ -0,0 +1,96 @@
+# search/synonyms.py
+import logging
+import threading
+
+from django.db import connection
+
+from .backends import ATTRIBUTE_FIELDS, DESCRIPTION_FIELDS, NAME_FIELDS, get_search_backend
+from .cache import bump_ad_generations, bump_generation, get_generation
+from .text import tokenize
+
+logger = logging.getLogger(__name__)
+
+SYNONYMS = 'synonyms'
+# Fields whose words are expanded into Ad.search_synonyms
+SOURCE_FIELDS = NAME_FIELDS + DESCRIPTION_FIELDS + ATTRIBUTE_FIELDS
+
+_local = {'generation': None, 'map': {}}
+_lock = threading.Lock()
+
+
+def group_words(text):
+    """Words of a comma separated synonym group, lowercased"""
+    return sorted({word for part in (text or '').split(',') for word in tokenize(part)})
+
+
+def synonym_map():
+    """{word: other words of its groups}, reloaded when the dictionary changes"""
+    from ..models import SynonymGroup
+
+    generation = get_generation(SYNONYMS)
+    if _local['generation'] != generation:
+        with _lock:
+            mapping = {}
+            for words in SynonymGroup.objects.values_list('words', flat=True):
+                group = group_words(words)
+                for word in group:
+                    mapping.setdefault(word, set()).update(w for w in group if w != word)
+            _local['map'] = mapping
+            _local['generation'] = generation
+    return _local['map']
+
+
+def expand(ad):
+    """
+    Synonyms and spellings of the ad's words that are not in the ad itself.
+
+    Stored on Ad.search_synonyms and indexed with the other fields, so a
+    search for "gaari" is one index lookup that also finds "car" ads.
+    """
+    mapping = synonym_map()
+    if not mapping:
+        return ''
+    words = set()
+    for field in SOURCE_FIELDS:
+        words.update(tokenize(getattr(ad, field, '') or ''))
+    extra = set()
+    for word in words:
+        extra.update(mapping.get(word, ()))
+    return ' '.join(sorted(extra - words))
+
+
+def reindex_synonyms(words):
+    """Refresh the expansions of every ad that contains or was expanded with words"""
+    from ..models import Ad
+    from .backends import index_ad
+
+    bump_generation(SYNONYMS)
+    backend = get_search_backend()
+    ads = Ad.objects.filter(backend.match(sorted(words))).only('id', 'category_id', 'status', 'search_synonyms', *SOURCE_FIELDS)
+    updated = 0
+    categories = set()
+    for ad in ads.iterator(chunk_size=500):
+        expansion = expand(ad)
+        if expansion != ad.search_synonyms:
+            ad.search_synonyms = expansion
+            Ad.objects.filter(pk=ad.pk).update(search_synonyms=expansion)
+            index_ad(ad)
+            categories.add(ad.category_id)
+            updated += 1
+    if updated:
+        bump_ad_generations(categories)
+    return updated
+
+
+def reindex_synonyms_in_background(words):
+    """reindex_synonyms in a daemon thread, so admin saves return at once"""
+    def run():
+        try:
+            updated = reindex_synonyms(words)
+            logger.info(f"Reindexed {updated} ads after a synonym change")
+        except Exception as e:
+            logger.error(f"Error reindexing synonyms for {sorted(words)}: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
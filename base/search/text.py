@@ -0,0 +1,11 @@
+# search/text.py
+import re
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split free text into lowercase word tokens"""
+    if not text:
+        return []
+    return WORD_RE.findall(text.lower())
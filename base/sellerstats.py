@@ -0,0 +1,293 @@
+# sellerstats.py
+"""
+Incremental maintenance of SellerStats.
+
+A rating saved or deleted, or an ad entering or leaving the approved
+state, changes a seller's row with one UPDATE of F-expression deltas
+(apply_delta), computed against the values in the row itself so
+concurrent changes cannot overwrite each other. The average is derived
+from the rating_sum and total_ratings counters inside the same UPDATE.
+
+recompute() rebuilds rows from the ratings and ads with a single
+conditional-aggregation query. load() runs it only for a seller without
+a row yet, or when is_drifted() finds counters that contradict each
+other.
+
+reputation is a Bayesian average: the seller's ratings plus
+PRIOR_RATINGS imaginary ratings of PRIOR_MEAN, so two 5-star ratings do
+not outrank fifty 4.8s. It is kept in the same UPDATE as the counters
+and copied onto the seller's SellerRank rows, the per-category and
+per-place leaderboards, which refresh_ranks() rebuilds when the
+seller's approved ads change.
+
+Within a request (SellerStatsMiddleware) the rows read are kept in an
+identity map, so the seller badges, levels and percentages a page shows
+cost one stats read per seller however often the template asks.
+"""
+from collections import defaultdict
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, Exists, F, FloatField, IntegerField, OuterRef, Q,
+    Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+STAR_FIELDS = {
+    5: 'five_star_count',
+    4: 'four_star_count',
+    3: 'three_star_count',
+    2: 'two_star_count',
+    1: 'one_star_count',
+}
+
+PRIOR_MEAN = 3.5
+PRIOR_RATINGS = 5
+
+# {user id: SellerStats} of the current request, None outside of one
+_request_stats = ContextVar('seller_stats', default=None)
+
+
+class SellerStatsMiddleware:
+    """Scope the seller stats identity map to each request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_stats.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+
+
+def load(seller_ids):
+    """
+    {seller id: SellerStats} for the given sellers, from the request's
+    identity map where possible, computing missing or drifted rows.
+    """
+    from .models import SellerStats
+
+    loaded = _request_stats.get()
+    found = {seller_id: loaded[seller_id] for seller_id in seller_ids if loaded and seller_id in loaded}
+    missing = [seller_id for seller_id in seller_ids if seller_id not in found]
+    if missing:
+        stats = {row.user_id: row for row in SellerStats.objects.filter(user_id__in=missing)}
+        stale = [seller_id for seller_id in missing if seller_id not in stats or is_drifted(stats[seller_id])]
+        if stale:
+            recompute(stale)
+            stats.update((row.user_id, row) for row in SellerStats.objects.filter(user_id__in=stale))
+        found.update(stats)
+        if loaded is not None:
+            loaded.update(stats)
+    return found
+
+
+def forget(seller_id):
+    """Drop a seller from the request's identity map after changing the row"""
+    loaded = _request_stats.get()
+    if loaded:
+        loaded.pop(seller_id, None)
+
+
+def apply_delta(seller_id, ratings=0, rating_sum=0, stars=None, ads=0):
+    """
+    Add the deltas to a seller's stats in one UPDATE; stars is
+    {star: delta}. Sellers without stats yet are left to load(), which
+    computes them on first read, unless their reputation is on a
+    leaderboard.
+    """
+    from .models import SellerRank, SellerStats
+
+    changes = {STAR_FIELDS[star]: F(STAR_FIELDS[star]) + delta for star, delta in (stars or {}).items() if delta}
+    if ratings or rating_sum:
+        new_total = F('total_ratings') + ratings
+        new_sum = F('rating_sum') + rating_sum
+        changes['total_ratings'] = new_total
+        changes['rating_sum'] = new_sum
+        # Every expression reads the row as it was before this UPDATE
+        changes['average_rating'] = Case(
+            When(
+                Q(total_ratings__gt=-ratings),
+                then=Cast(
+                    Cast(new_sum, FloatField()) / Cast(new_total, FloatField()),
+                    DecimalField(max_digits=3, decimal_places=2),
+                ),
+            ),
+            default=Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        )
+        changes['reputation'] = (
+            (Cast(new_sum, FloatField()) + PRIOR_RATINGS * PRIOR_MEAN)
+            / (Cast(new_total, FloatField()) + PRIOR_RATINGS)
+        )
+    if ads:
+        changes['total_ads'] = F('total_ads') + ads
+    if not changes:
+        return
+    # update() and bulk_update() skip auto_now
+    changes['last_updated'] = timezone.now()
+    updated = SellerStats.objects.filter(user_id=seller_id).update(**changes)
+    forget(seller_id)
+    if 'reputation' not in changes:
+        return
+    ranks = SellerRank.objects.filter(seller_id=seller_id)
+    if not updated:
+        # No row to copy the reputation from; a seller on a leaderboard
+        # gets one now, and recompute() refreshes the ranks with it
+        if ranks.exists():
+            recompute([seller_id])
+        return
+    stats = SellerStats.objects.filter(user_id=seller_id)
+    ranks.update(
+        reputation=Subquery(stats.values('reputation')[:1]),
+        total_ratings=Subquery(stats.values('total_ratings')[:1]),
+    )
+
+
+def rating_changed(old, new):
+    """
+    Apply a rating moving from old to new, each a (seller id, stars)
+    pair or None for a rating that is created or deleted.
+    """
+    if old == new:
+        return
+    if old and new and old[0] == new[0]:
+        apply_delta(new[0], rating_sum=new[1] - old[1], stars={old[1]: -1, new[1]: 1})
+        return
+    if old:
+        apply_delta(old[0], ratings=-1, rating_sum=-old[1], stars={old[1]: -1})
+    if new:
+        apply_delta(new[0], ratings=1, rating_sum=new[1], stars={new[1]: 1})
+
+
+def reputation(rating_sum, total_ratings):
+    """Bayesian average of total_ratings ratings adding up to rating_sum"""
+    return (rating_sum + PRIOR_RATINGS * PRIOR_MEAN) / (total_ratings + PRIOR_RATINGS)
+
+
+def refresh_ranks(seller_ids):
+    """Rebuild the leaderboard rows of the given sellers from their approved ads"""
+    from .models import Ad, SellerRank, SellerStats
+
+    stats = {
+        user_id: (score, count) for user_id, score, count in
+        SellerStats.objects.filter(user_id__in=seller_ids).values_list('user_id', 'reputation', 'total_ratings')
+    }
+    scopes = defaultdict(int)
+    groups = Ad.objects.filter(advertiser_id__in=seller_ids, status='approved').order_by().values_list(
+        'advertiser_id', 'category_id', 'place_id'
+    ).annotate(count=Count('pk'))
+    for seller_id, category_id, place_id, count in groups:
+        for scope in {(None, None), (category_id, None), (None, place_id), (category_id, place_id)}:
+            scopes[(seller_id, *scope)] += count
+
+    with transaction.atomic():
+        SellerRank.objects.filter(seller_id__in=seller_ids).delete()
+        SellerRank.objects.bulk_create([
+            SellerRank(
+                seller_id=seller_id,
+                category_id=category_id,
+                place_id=place_id,
+                reputation=stats.get(seller_id, (PRIOR_MEAN, 0))[0],
+                total_ratings=stats.get(seller_id, (PRIOR_MEAN, 0))[1],
+                approved_ads=count,
+            )
+            for (seller_id, category_id, place_id), count in scopes.items()
+        ], batch_size=1000)
+
+
+def top_sellers(category=None, place=None, limit=20):
+    """SellerRank rows of a leaderboard, best first, with the sellers joined"""
+    from .models import SellerRank
+
+    return SellerRank.objects.filter(
+        category=category, place=place
+    ).select_related('seller').order_by('-reputation', '-total_ratings')[:limit]
+
+
+def is_drifted(stats):
+    """Whether the stored counters contradict each other"""
+    star_total = sum(getattr(stats, field) for field in STAR_FIELDS.values())
+    if star_total != stats.total_ratings:
+        return True
+    if not stats.total_ratings:
+        return bool(stats.rating_sum or stats.average_rating)
+    if not stats.total_ratings <= stats.rating_sum <= 5 * stats.total_ratings:
+        return True
+    expected = Decimal(stats.rating_sum) / stats.total_ratings
+    return abs(expected - Decimal(stats.average_rating)) > Decimal('0.01')
+
+
+def recompute(seller_ids):
+    """
+    Rebuild the stats of the given sellers from their ratings and approved
+    ads with one aggregation query, return the rows written.
+    """
+    from .models import User
+
+    return _recompute(User.objects.filter(pk__in=seller_ids))
+
+
+def recompute_range(start, end):
+    """
+    Rebuild the stats of every user with id in [start, end) that has
+    ratings, ads or a stats row, return the rows written.
+    """
+    from .models import Ad, SellerRating, SellerStats, User
+
+    return _recompute(User.objects.filter(pk__gte=start, pk__lt=end).filter(
+        Exists(SellerRating.objects.filter(seller=OuterRef('pk')))
+        | Exists(Ad.objects.filter(advertiser=OuterRef('pk')))
+        | Exists(SellerStats.objects.filter(user=OuterRef('pk')))
+    ))
+
+
+def _recompute(users):
+    from .models import Ad, SellerStats
+
+    approved_ads = Ad.objects.filter(advertiser=OuterRef('pk'), status='approved').order_by().values(
+        'advertiser'
+    ).annotate(count=Count('pk')).values('count')
+    rows = list(users.annotate(
+        stats_total=Count('ratings_received'),
+        stats_sum=Coalesce(Sum('ratings_received__rating'), 0),
+        stats_ads=Coalesce(Subquery(approved_ads, output_field=IntegerField()), 0),
+        **{
+            f'stats_{field}': Count('ratings_received', filter=Q(ratings_received__rating=star))
+            for star, field in STAR_FIELDS.items()
+        },
+    ).values('pk', 'stats_total', 'stats_sum', 'stats_ads', *[f'stats_{field}' for field in STAR_FIELDS.values()]))
+
+    now = timezone.now()
+    existing = {stats.user_id: stats for stats in SellerStats.objects.filter(user_id__in=[row['pk'] for row in rows])}
+    to_create, to_update = [], []
+    for row in rows:
+        stats = existing.get(row['pk']) or SellerStats(user_id=row['pk'])
+        stats.total_ratings = row['stats_total']
+        stats.rating_sum = row['stats_sum']
+        stats.total_ads = row['stats_ads']
+        stats.last_updated = now
+        for field in STAR_FIELDS.values():
+            setattr(stats, field, row[f'stats_{field}'])
+        stats.average_rating = (
+            (Decimal(stats.rating_sum) / stats.total_ratings).quantize(Decimal('0.01'))
+            if stats.total_ratings else Decimal('0.00')
+        )
+        stats.reputation = reputation(stats.rating_sum, stats.total_ratings)
+        # Placeholder until there is a messaging system, as in update_stats()
+        if not stats.response_rate and stats.total_ads and stats.total_ratings:
+            stats.response_rate = min(Decimal(100), Decimal(stats.total_ratings * 100 / stats.total_ads).quantize(Decimal('0.01')))
+        (to_update if stats.pk else to_create).append(stats)
+
+    SellerStats.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+    SellerStats.objects.bulk_update(to_update, [
+        'total_ratings', 'rating_sum', 'average_rating', 'reputation', 'response_rate', 'total_ads',
+        'last_updated', *STAR_FIELDS.values(),
+    ], batch_size=1000)
+    refresh_ranks([row['pk'] for row in rows])
+    return len(to_create) + len(to_update)
@@ -1,10 +1,21 @@
 # signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
-from .models import Ad, FeaturedAd, PendingFeaturedAd, User, Notification, Comment
+from .models import Ad, AdImage, Category, SynonymGroup, FeaturedAd, PendingFeaturedAd, User, Notification, Comment
+from .featured import run_due as run_featured_scheduler, set_featured
+from .homepage import schedule_rebuild as schedule_homepage_rebuild
+from .search import index_ad, remove_ad
+from .sellerstats import apply_delta as apply_seller_stats_delta, refresh_ranks as refresh_seller_ranks
+from .search.cache import bump_ad_generations
+from .search.suggest import CATEGORY, publish_ad_added, publish_ad_removed, publish_change
+from .search.backends import INDEXED_FIELDS
+from .search.geo import encode as geohash_encode
+from .search.hot import warm_in_background as warm_hot_queries
+from .search.locations import resolve_location
+from .search.synonyms import expand as expand_synonyms, group_words, reindex_synonyms_in_background
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,10 +29,63 @@ def track_ad_changes(sender, instance, **kwargs):
             instance._original_status = original.status
             instance._original_is_approved = original.is_approved
             instance._original_is_featured = original.is_featured
+            instance._original_name = original.name
+            instance._original_location = original.location
+            instance._original_category_id = original.category_id
         except Ad.DoesNotExist:
             instance._original_status = None
             instance._original_is_approved = None
             instance._original_is_featured = None
+            instance._original_name = None
+            instance._original_location = None
+            instance._original_category_id = None
+
+@receiver(pre_save, sender=Ad)
+def resolve_ad_location(sender, instance, update_fields=None, **kwargs):
+    """Link the free-text location to its gazetteer entry and coordinates when it changes"""
+    if update_fields is not None:
+        return
+    if instance.pk and instance.location == getattr(instance, '_original_location', None):
+        return
+    try:
+        instance.place = resolve_location(instance.location)
+        place = instance.place
+        if place and place.latitude is not None and place.longitude is not None:
+            instance.latitude = place.latitude
+            instance.longitude = place.longitude
+            instance.geohash = geohash_encode(place.latitude, place.longitude)
+        else:
+            instance.latitude = instance.longitude = None
+            instance.geohash = ''
+    except Exception as e:
+        logger.error(f"Error resolving location for ad {instance.pk}: {str(e)}")
+
+@receiver(pre_save, sender=Ad)
+def expand_ad_synonyms(sender, instance, update_fields=None, **kwargs):
+    """Store synonyms of the ad's words so they are indexed with it"""
+    if update_fields is not None:
+        return
+    try:
+        instance.search_synonyms = expand_synonyms(instance)
+    except Exception as e:
+        logger.error(f"Error expanding synonyms for ad {instance.pk}: {str(e)}")
+
+@receiver(pre_save, sender=SynonymGroup)
+def track_synonym_changes(sender, instance, **kwargs):
+    """Remember the old words so ads expanded with them get refreshed"""
+    original = SynonymGroup.objects.filter(pk=instance.pk).values_list('words', flat=True).first() if instance.pk else None
+    instance._original_words = original or ''
+
+@receiver(post_save, sender=SynonymGroup)
+def reindex_on_synonym_save(sender, instance, **kwargs):
+    """Re-expand affected ads in the background after a dictionary edit"""
+    words = set(group_words(instance.words)) | set(group_words(getattr(instance, '_original_words', '')))
+    transaction.on_commit(lambda: reindex_synonyms_in_background(words))
+
+@receiver(post_delete, sender=SynonymGroup)
+def reindex_on_synonym_delete(sender, instance, **kwargs):
+    words = set(group_words(instance.words))
+    transaction.on_commit(lambda: reindex_synonyms_in_background(words))
 
 @receiver(post_save, sender=Ad)
 def handle_ad_status_change(sender, instance, created, **kwargs):
@@ -65,9 +129,7 @@ def handle_ad_status_change(sender, instance, created, **kwargs):
             with transaction.atomic():
                 pending_featured = PendingFeaturedAd.objects.filter(ad=instance).first()
                 if pending_featured:
-                    # Use update to avoid triggering save signal
-                    Ad.objects.filter(pk=instance.pk).update(is_featured=True)
-                    
+                    # The featured scheduler sets is_featured once the start date is reached
                     FeaturedAd.objects.create(
                         ad=instance,
                         payment_screenshot=pending_featured.payment_screenshot,
@@ -80,9 +142,115 @@ def handle_ad_status_change(sender, instance, created, **kwargs):
     except Exception as e:
         logger.error(f"Error handling ad status change for ad {instance.id}: {str(e)}")
 
+@receiver(post_save, sender=Ad)
+def sync_ad_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in step with the ad's searchable fields"""
+    # Skip saves that only touch counters or flags; status decides whether
+    # the segment index holds the ad at all
+    if update_fields and not set(update_fields) & {*INDEXED_FIELDS, 'status'}:
+        return
+    index_ad(instance)
+
+@receiver(post_delete, sender=Ad)
+def drop_ad_search_index(sender, instance, **kwargs):
+    """Remove deleted ads from the full-text index"""
+    remove_ad(instance.pk)
+
+@receiver(post_save, sender=Ad)
+def invalidate_search_caches(sender, instance, created, **kwargs):
+    """Expire cached searches over the ad's categories when the approved ads change"""
+    original_status = getattr(instance, '_original_status', None)
+    if instance.status == 'approved' or original_status == 'approved':
+        category_ids = (instance.category_id, getattr(instance, '_original_category_id', None))
+        # After commit, so a search cannot cache the old rows under the new generation
+        transaction.on_commit(lambda: bump_ad_generations(category_ids))
+        transaction.on_commit(warm_hot_queries)
+        transaction.on_commit(schedule_homepage_rebuild)
+
+@receiver(post_delete, sender=Ad)
+def invalidate_search_caches_on_delete(sender, instance, **kwargs):
+    """Expire cached searches over the ad's category when an approved ad is deleted"""
+    if instance.status == 'approved':
+        category_ids = (instance.category_id,)
+        transaction.on_commit(lambda: bump_ad_generations(category_ids))
+        transaction.on_commit(warm_hot_queries)
+        transaction.on_commit(schedule_homepage_rebuild)
+
+@receiver(post_save, sender=Ad)
+def update_seller_ad_count(sender, instance, created, **kwargs):
+    """Count the ad in its seller's stats and leaderboards when it enters or leaves the approved state"""
+    was_approved = getattr(instance, '_original_status', None) == 'approved'
+    is_approved = instance.status == 'approved'
+    moved = (
+        getattr(instance, '_original_category_id', None) != instance.category_id
+        or getattr(instance, '_original_location', None) != instance.location
+    )
+    try:
+        if was_approved != is_approved:
+            apply_seller_stats_delta(instance.advertiser_id, ads=1 if is_approved else -1)
+        if was_approved != is_approved or (is_approved and moved):
+            refresh_seller_ranks([instance.advertiser_id])
+    except Exception as e:
+        logger.error(f"Error updating seller stats for ad {instance.pk}: {str(e)}")
+
+@receiver(post_delete, sender=Ad)
+def update_seller_ad_count_on_delete(sender, instance, **kwargs):
+    """Uncount a deleted approved ad from its seller's stats and leaderboards"""
+    if instance.status == 'approved':
+        try:
+            apply_seller_stats_delta(instance.advertiser_id, ads=-1)
+            refresh_seller_ranks([instance.advertiser_id])
+        except Exception as e:
+            logger.error(f"Error updating seller stats for ad {instance.pk}: {str(e)}")
+
+@receiver(post_save, sender=Ad)
+def update_search_suggestions(sender, instance, created, **kwargs):
+    """Feed approval, rejection and renames of ads to the typeahead index"""
+    was_approved = getattr(instance, '_original_status', None) == 'approved'
+    is_approved = instance.status == 'approved'
+    original_name = getattr(instance, '_original_name', None)
+    original_location = getattr(instance, '_original_location', None)
+    changed = original_name != instance.name or original_location != instance.location
+
+    if was_approved and (not is_approved or changed):
+        publish_ad_removed(original_name, original_location)
+    if is_approved and (not was_approved or changed):
+        publish_ad_added(instance.name, instance.location)
+
+@receiver(post_delete, sender=Ad)
+def remove_search_suggestions(sender, instance, **kwargs):
+    """Drop deleted approved ads from the typeahead index"""
+    if instance.status == 'approved':
+        publish_ad_removed(instance.name, instance.location)
+
+@receiver(post_save, sender=AdImage)
+def update_ad_cover_on_save(sender, instance, created, **kwargs):
+    """Keep Ad.cover_image pointing at the ad's first image"""
+    try:
+        instance.refresh_ad_cover()
+    except Exception as e:
+        logger.error(f"Error updating cover image of ad {instance.ad_id}: {str(e)}")
+
+@receiver(post_delete, sender=AdImage)
+def update_ad_cover_on_delete(sender, instance, **kwargs):
+    """Fall back to the next image when the cover is deleted"""
+    try:
+        instance.refresh_ad_cover()
+    except Exception as e:
+        logger.error(f"Error updating cover image of ad {instance.ad_id}: {str(e)}")
+
+@receiver(post_save, sender=Category)
+def add_category_suggestion(sender, instance, created, **kwargs):
+    if created:
+        publish_change('add', CATEGORY, instance.name)
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    publish_change('remove', CATEGORY, instance.name)
+
 @receiver(post_save, sender=FeaturedAd)
 def handle_featured_ad_creation(sender, instance, created, **kwargs):
-    """Handle notifications for featured ad creation and expiry"""
+    """Handle notifications for featured ad creation"""
     try:
         if created:
             Notification.objects.create(
@@ -92,20 +260,36 @@ def handle_featured_ad_creation(sender, instance, created, **kwargs):
                 notification_type='featured'
             )
             logger.info(f"Featured ad created: {instance.ad.name}")
-        
-        # Check if featured ad is expiring soon (within 3 days)
-        days_until_expiry = (instance.featured_expiry_date - timezone.now().date()).days
-        if 0 <= days_until_expiry <= 3:
-            Notification.objects.create(
-                user=instance.ad.advertiser,
-                ad=instance.ad,
-                message=f'Your featured ad "{instance.ad.name}" is expiring in {days_until_expiry} day(s)!',
-                notification_type='warning'
-            )
             
     except Exception as e:
         logger.error(f"Error handling featured ad creation for ad {instance.ad.id}: {str(e)}")
 
+@receiver(post_save, sender=FeaturedAd)
+def schedule_featured_ad(sender, instance, **kwargs):
+    """Apply new or changed featuring dates now instead of at the next scheduler tick"""
+    def run():
+        try:
+            run_featured_scheduler()
+        except Exception as e:
+            logger.error(f"Error scheduling featured ad {instance.pk}: {str(e)}")
+
+    transaction.on_commit(run)
+
+@receiver(post_delete, sender=FeaturedAd)
+def unfeature_deleted_featured_ad(sender, instance, **kwargs):
+    """Deleting an active FeaturedAd ends the featuring"""
+    try:
+        if instance.state == FeaturedAd.ACTIVE:
+            set_featured([(instance.pk, instance.ad_id, instance.ad.category_id)], False)
+    except Exception as e:
+        logger.error(f"Error unfeaturing ad {instance.ad_id}: {str(e)}")
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def rebuild_homepage_on_category_change(sender, instance, **kwargs):
+    """The homepage has one rail per category"""
+    transaction.on_commit(schedule_homepage_rebuild)
+
 @receiver(post_save, sender=PendingFeaturedAd)
 def handle_pending_featured(sender, instance, created, **kwargs):
     """Handle notifications for pending featured ad payment"""
@@ -221,34 +405,33 @@ def handle_comment_notifications(sender, instance, created, **kwargs):
     except Exception as e:
         logger.error(f"Error handling comment notification for comment {instance.id}: {str(e)}")
 
-# Signal to handle featured ad expiry checks (optional - can be run via cron job)
-@receiver(post_save, sender=FeaturedAd)
-def check_featured_ad_expiry(sender, instance, **kwargs):
-    """Check and handle expired featured ads"""
-    try:
-        if instance.featured_expiry_date < timezone.now().date():
-            # Featured ad has expired
-            instance.ad.is_featured = False
-            # Use update to avoid signal recursion
-            Ad.objects.filter(pk=instance.ad.pk).update(is_featured=False)
-            
-            Notification.objects.create(
-                user=instance.ad.advertiser,
-                ad=instance.ad,
-                message=f'Your featured ad "{instance.ad.name}" has expired.',
-                notification_type='info'
-            )
-            logger.info(f"Featured ad expired: {instance.ad.name}")
-            
-    except Exception as e:
-        logger.error(f"Error checking featured ad expiry for ad {instance.ad.id}: {str(e)}")
-
 # Utility functions for testing
 def disconnect_signals():
     """Disconnect signals for testing purposes"""
     pre_save.disconnect(track_ad_changes, sender=Ad)
+    pre_save.disconnect(resolve_ad_location, sender=Ad)
+    pre_save.disconnect(expand_ad_synonyms, sender=Ad)
+    pre_save.disconnect(track_synonym_changes, sender=SynonymGroup)
+    post_save.disconnect(reindex_on_synonym_save, sender=SynonymGroup)
+    post_delete.disconnect(reindex_on_synonym_delete, sender=SynonymGroup)
     post_save.disconnect(handle_ad_status_change, sender=Ad)
+    post_save.disconnect(sync_ad_search_index, sender=Ad)
+    post_delete.disconnect(drop_ad_search_index, sender=Ad)
+    post_save.disconnect(invalidate_search_caches, sender=Ad)
+    post_delete.disconnect(invalidate_search_caches_on_delete, sender=Ad)
+    post_save.disconnect(update_seller_ad_count, sender=Ad)
+    post_delete.disconnect(update_seller_ad_count_on_delete, sender=Ad)
+    post_save.disconnect(update_search_suggestions, sender=Ad)
+    post_delete.disconnect(remove_search_suggestions, sender=Ad)
+    post_save.disconnect(update_ad_cover_on_save, sender=AdImage)
+    post_delete.disconnect(update_ad_cover_on_delete, sender=AdImage)
+    post_save.disconnect(add_category_suggestion, sender=Category)
+    post_delete.disconnect(remove_category_suggestion, sender=Category)
     post_save.disconnect(handle_featured_ad_creation, sender=FeaturedAd)
+    post_save.disconnect(schedule_featured_ad, sender=FeaturedAd)
+    post_delete.disconnect(unfeature_deleted_featured_ad, sender=FeaturedAd)
+    post_save.disconnect(rebuild_homepage_on_category_change, sender=Category)
+    post_delete.disconnect(rebuild_homepage_on_category_change, sender=Category)
     post_save.disconnect(handle_pending_featured, sender=PendingFeaturedAd)
     pre_save.disconnect(track_user_changes, sender=User)
     post_save.disconnect(handle_user_verification, sender=User)
@@ -258,8 +441,29 @@ def disconnect_signals():
 def reconnect_signals():
     """Reconnect signals after testing"""
     pre_save.connect(track_ad_changes, sender=Ad)
+    pre_save.connect(resolve_ad_location, sender=Ad)
+    pre_save.connect(expand_ad_synonyms, sender=Ad)
+    pre_save.connect(track_synonym_changes, sender=SynonymGroup)
+    post_save.connect(reindex_on_synonym_save, sender=SynonymGroup)
+    post_delete.connect(reindex_on_synonym_delete, sender=SynonymGroup)
     post_save.connect(handle_ad_status_change, sender=Ad)
+    post_save.connect(sync_ad_search_index, sender=Ad)
+    post_delete.connect(drop_ad_search_index, sender=Ad)
+    post_save.connect(invalidate_search_caches, sender=Ad)
+    post_delete.connect(invalidate_search_caches_on_delete, sender=Ad)
+    post_save.connect(update_seller_ad_count, sender=Ad)
+    post_delete.connect(update_seller_ad_count_on_delete, sender=Ad)
+    post_save.connect(update_search_suggestions, sender=Ad)
+    post_delete.connect(remove_search_suggestions, sender=Ad)
+    post_save.connect(update_ad_cover_on_save, sender=AdImage)
+    post_delete.connect(update_ad_cover_on_delete, sender=AdImage)
+    post_save.connect(add_category_suggestion, sender=Category)
+    post_delete.connect(remove_category_suggestion, sender=Category)
     post_save.connect(handle_featured_ad_creation, sender=FeaturedAd)
+    post_save.connect(schedule_featured_ad, sender=FeaturedAd)
+    post_delete.connect(unfeature_deleted_featured_ad, sender=FeaturedAd)
+    post_save.connect(rebuild_homepage_on_category_change, sender=Category)
+    post_delete.connect(rebuild_homepage_on_category_change, sender=Category)
     post_save.connect(handle_pending_featured, sender=PendingFeaturedAd)
     pre_save.connect(track_user_changes, sender=User)
     post_save.connect(handle_user_verification, sender=User)
@@ -0,0 +1,177 @@
+# similar.py
+"""
+"More like this" neighbours of approved ads.
+
+build() encodes every approved ad as a feature vector: one-hot blocks
+for the category, ad type, price (log2 bucket), year and each
+category-specific choice field, plus name and description tokens hashed
+into TOKEN_DIMENSIONS buckets. Each block is scaled to its weight and
+the vector to unit length, so the dot product of two vectors is their
+cosine similarity. The similarity matrix is computed with NumPy in
+batches of rows, and the NEIGHBOURS best matches of every ad are stored
+as SimilarAd rows.
+
+Memory: the feature matrix takes 4 bytes per ad and column, the columns
+being TOKEN_DIMENSIONS plus one per category, ad type, price and year
+bucket and choice value in use (about 2.5 KB per ad). Each batch of
+scores takes 12 bytes per pair of ads (the float32 scores and the int64
+indexes argpartition returns), and batches are sized to stay within
+BATCH_MEMORY. The detail page then reads them with one
+indexed query (similar_ads) and needs no NumPy.
+"""
+import hashlib
+import math
+
+from .search.text import tokenize
+
+NEIGHBOURS = 12
+# Most rows scored at once, further limited by BATCH_MEMORY
+BATCH_SIZE = 1024
+BATCH_MEMORY = 256 * 1024 * 1024
+TOKEN_DIMENSIONS = 512
+YEAR_BUCKET = 3
+# Relative weight of each feature block in the cosine similarity
+WEIGHTS = {
+    'category': 3.0,
+    'ad_type': 1.0,
+    'price': 1.5,
+    'year': 1.0,
+    'choices': 1.5,
+    'tokens': 2.0,
+}
+# Name tokens count this many times a description token
+NAME_TOKEN_WEIGHT = 3.0
+
+
+def _choice_fields():
+    from .models import Ad
+
+    return [
+        field.name for field in Ad._meta.get_fields()
+        if getattr(field, 'choices', None) and field.name not in ('status', 'ad_type')
+    ]
+
+
+def _token_bucket(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), 'big') % TOKEN_DIMENSIONS
+
+
+def _price_bucket(price):
+    return int(math.log2(float(price) + 1)) if price and price > 0 else 0
+
+
+class _Encoder:
+    """Column layout of the feature matrix, fixed for one build"""
+
+    def __init__(self, ads, choice_fields):
+        self.choice_fields = choice_fields
+        self.blocks = {}
+        offset = 0
+        for name, values in (
+            ('category', {ad['category_id'] for ad in ads}),
+            ('ad_type', {ad['ad_type'] for ad in ads}),
+            ('price', {_price_bucket(ad['price']) for ad in ads}),
+            ('year', {ad['year'] // YEAR_BUCKET for ad in ads if ad['year']}),
+            ('choices', {(field, ad[field]) for ad in ads for field in choice_fields if ad[field]}),
+        ):
+            columns = {value: offset + index for index, value in enumerate(sorted(values, key=str))}
+            self.blocks[name] = columns
+            offset += len(columns)
+        self.token_offset = offset
+        self.width = offset + TOKEN_DIMENSIONS
+
+    def encode(self, ad, row):
+        """Write the features of ad into the zeroed row"""
+        import numpy as np
+
+        def one_hot(block, values):
+            columns = [self.blocks[block][value] for value in values if value in self.blocks[block]]
+            if columns:
+                row[columns] = WEIGHTS[block] / math.sqrt(len(columns))
+
+        one_hot('category', [ad['category_id']])
+        one_hot('ad_type', [ad['ad_type']])
+        one_hot('price', [_price_bucket(ad['price'])])
+        if ad['year']:
+            one_hot('year', [ad['year'] // YEAR_BUCKET])
+        one_hot('choices', [(field, ad[field]) for field in self.choice_fields if ad[field]])
+
+        tokens = row[self.token_offset:]
+        for weight, text in ((NAME_TOKEN_WEIGHT, ad['name']), (1.0, ad['description'])):
+            for token in tokenize(text):
+                tokens[_token_bucket(token)] += weight
+        np.log1p(tokens, out=tokens)
+        norm = np.linalg.norm(tokens)
+        if norm:
+            tokens *= WEIGHTS['tokens'] / norm
+
+        norm = np.linalg.norm(row)
+        if norm:
+            row /= norm
+
+
+def batch_rows(ads, memory=BATCH_MEMORY):
+    """Rows to score at once against ads rows within memory bytes"""
+    return max(1, min(BATCH_SIZE, memory // (max(ads, 1) * 12)))
+
+
+def neighbours(matrix, count=NEIGHBOURS, batch_size=None):
+    """
+    For each row of the unit-length matrix, the indexes and cosine
+    similarities of its count most similar other rows, best first.
+    """
+    import numpy as np
+
+    count = min(count, len(matrix) - 1)
+    if count <= 0:
+        return
+    batch_size = batch_size or batch_rows(len(matrix))
+    for start in range(0, len(matrix), batch_size):
+        scores = matrix[start:start + batch_size] @ matrix.T
+        # An ad is not similar to itself
+        rows = np.arange(len(scores))
+        scores[rows, rows + start] = -np.inf
+        best = np.argpartition(scores, -count, axis=1)[:, -count:]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for offset in range(len(scores)):
+            yield start + offset, best[offset], best_scores[offset]
+
+
+def build(count=NEIGHBOURS):
+    """Recompute the neighbours of every approved ad, return how many ads have some"""
+    import numpy as np
+    from django.db import transaction
+
+    from .models import Ad, SimilarAd
+
+    choice_fields = _choice_fields()
+    ads = list(Ad.objects.filter(status='approved').order_by('pk').values(
+        'pk', 'category_id', 'ad_type', 'price', 'year', 'name', 'description', *choice_fields
+    ))
+    encoder = _Encoder(ads, choice_fields)
+    matrix = np.zeros((len(ads), encoder.width), dtype=np.float32)
+    for index, ad in enumerate(ads):
+        encoder.encode(ad, matrix[index])
+
+    rows = [
+        SimilarAd(ad_id=ads[index]['pk'], similar_id=ads[other]['pk'], rank=rank, score=float(score))
+        for index, best, scores in neighbours(matrix, count)
+        for rank, (other, score) in enumerate(zip(best, scores))
+        if score > 0
+    ]
+    with transaction.atomic():
+        SimilarAd.objects.all().delete()
+        SimilarAd.objects.bulk_create(rows, batch_size=5000)
+    return len({row.ad_id for row in rows})
+
+
+def similar_ads(ad, limit=6):
+    """The precomputed neighbours of ad that are still approved, most similar first"""
+    from .models import Ad
+
+    return Ad.objects.filter(similar_to__ad=ad, status='approved').defer(
+        'search_vector'
+    ).order_by('similar_to__rank')[:limit]
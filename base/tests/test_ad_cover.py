@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from base.models import AdImage, Category
+
+from .utils import make_ad, make_user
+
+
+class AdCoverTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        # The field keeps the storage it was created with, so swap that
+        storage = mock.patch.object(
+            AdImage._meta.get_field('image'), 'storage', FileSystemStorage(location=media_root, base_url='/media/')
+        )
+        storage.start()
+        self.addCleanup(storage.stop)
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        self.ad = make_ad(make_user('seller@example.com'), category, 'Phone')
+
+    def add_image(self, name):
+        return AdImage.objects.create(ad=self.ad, image=SimpleUploadedFile(name, b'image', content_type='image/jpeg'))
+
+    def test_cover_follows_the_first_image(self):
+        self.assertEqual((self.ad.cover_image, self.ad.cover_image_url), (None, ''))
+        first = self.add_image('front.jpg')
+        second = self.add_image('back.jpg')
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.cover_image, first)
+        self.assertEqual(self.ad.cover_image_url, first.image.url)
+
+        first.delete()
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.cover_image, self.ad.cover_image_url), (second, second.image.url))
+
+        second.delete()
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.cover_image, self.ad.cover_image_url), (None, ''))
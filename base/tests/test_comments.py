@@ -0,0 +1,44 @@
+from django.test import TestCase
+
+from base.comments import thread_page
+from base.models import Category, Comment
+
+from .utils import make_ad, make_user
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        cls.seller = make_user('seller@example.com')
+        cls.buyer = make_user('buyer@example.com')
+        cls.ad = make_ad(cls.seller, category, 'Phone')
+        cls.threads = [Comment.objects.create(user=cls.buyer, ad=cls.ad, text=f'Question {i}') for i in range(5)]
+        reply = Comment.objects.create(user=cls.seller, ad=cls.ad, text='Answer', parent=cls.threads[0])
+        cls.nested = Comment.objects.create(user=cls.buyer, ad=cls.ad, text='Thanks', parent=reply)
+
+    def test_replies_point_at_their_root(self):
+        self.assertEqual(self.nested.root, self.threads[0])
+        self.assertEqual(self.nested.parent.root, self.threads[0])
+
+    def test_pages_of_threads(self):
+        with self.assertNumQueries(2):
+            page, after = thread_page(self.ad, per_page=2)
+            self.assertEqual(page, self.threads[:2])
+            self.assertEqual([reply.text for reply in page[0].thread_replies.all()], ['Answer', 'Thanks'])
+            self.assertEqual(page[0].thread_replies.all()[1].user, self.buyer)
+        self.assertEqual(after, self.threads[1].pk)
+
+        page, after = thread_page(self.ad, after=after, per_page=2)
+        self.assertEqual(page, self.threads[2:4])
+        page, after = thread_page(self.ad, after=after, per_page=2)
+        self.assertEqual((page, after), (self.threads[4:], None))
+
+    def test_load_more_endpoint(self):
+        response = self.client.get(f'/product/{self.ad.pk}/comments/', {'after': self.threads[0].pk})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIsNone(data['next'])
+        self.assertIn('Question 4', data['html'])
+        self.assertNotIn('Question 0', data['html'])
+        self.assertEqual(self.client.get(f'/product/{self.ad.pk}/comments/', {'after': 'x'}).status_code, 200)
@@ -0,0 +1,36 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from base.models import Ad, Category
+from base.search.facets import PRICE_BUCKETS, compute_facets, price_bucket_filter
+
+from .utils import make_ad, make_user
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(name='Electronics', icon='electronics')
+        cls.vehicles = Category.objects.create(name='Vehicles', icon='car')
+        seller = make_user('seller@example.com')
+        make_ad(seller, cls.electronics, 'Phone', price=Decimal('50'))
+        make_ad(seller, cls.electronics, 'Laptop', price=Decimal('700'), location='Borama')
+        make_ad(seller, cls.vehicles, 'Car', price=Decimal('25000'), ad_type='rent')
+
+    def test_counts(self):
+        facets = compute_facets(Ad.objects.filter(status='approved'))
+        self.assertEqual(
+            [(item['label'], item['count']) for item in facets['category']],
+            [('Electronics', 2), ('Vehicles', 1)],
+        )
+        self.assertEqual({item['value']: item['count'] for item in facets['ad_type']}, {'sell': 2, 'rent': 1})
+        self.assertEqual({item['label']: item['count'] for item in facets['location']}, {'Hargeisa': 2, 'Borama': 1})
+        self.assertEqual([(item['value'], item['count']) for item in facets['price']], [(0, 1), (2, 1), (5, 1)])
+
+    def test_price_bucket_filter(self):
+        self.assertEqual(price_bucket_filter('1'), {'price__gte': 100, 'price__lt': 500})
+        self.assertEqual(price_bucket_filter(len(PRICE_BUCKETS) - 1), {'price__gte': 20000})
+        for index in ('-1', str(len(PRICE_BUCKETS)), 'x', None, ''):
+            with self.subTest(index=index):
+                self.assertIsNone(price_bucket_filter(index))
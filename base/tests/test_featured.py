@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from base import featured
+from base.models import Category, FeaturedAd, Notification
+from base.search.cache import category_generation, get_generation
+
+from .utils import make_ad, make_user
+
+
+@mock.patch('base.homepage.schedule_rebuild', mock.Mock())
+@mock.patch('base.rotation.schedule_rebuild', mock.Mock())
+class FeaturedSchedulerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.category = Category.objects.create(name='Electronics', icon='electronics')
+        self.ad = make_ad(make_user('seller@example.com'), self.category, 'Phone', is_approved=True)
+        self.featured = FeaturedAd.objects.create(
+            ad=self.ad,
+            payment_screenshot='payment_screenshots/receipt.jpg',
+            featured_start_date=self.now + timedelta(hours=1),
+            featured_expiry_date=self.now + timedelta(days=5),
+        )
+
+    def run_at(self, moment):
+        with self.captureOnCommitCallbacks(execute=True):
+            next_due = featured.run_due(moment)
+        self.featured.refresh_from_db()
+        self.ad.refresh_from_db()
+        return next_due
+
+    def messages(self, notification_type):
+        return list(Notification.objects.filter(
+            ad=self.ad, notification_type=notification_type, message__startswith='Your featured ad'
+        ).values_list('message', flat=True))
+
+    def test_lifecycle(self):
+        expiry = self.featured.featured_expiry_date
+        self.assertEqual(self.run_at(self.now), self.featured.featured_start_date)
+        self.assertEqual((self.featured.state, self.ad.is_featured), (FeaturedAd.SCHEDULED, False))
+
+        generation = get_generation(category_generation(self.category.pk))
+        self.assertEqual(self.run_at(self.now + timedelta(hours=1)), expiry - featured.EXPIRING_SOON)
+        self.assertEqual((self.featured.state, self.ad.is_featured), (FeaturedAd.ACTIVE, True))
+        self.assertGreater(get_generation(category_generation(self.category.pk)), generation)
+
+        self.assertEqual(self.run_at(expiry - timedelta(days=2)), expiry)
+        self.assertTrue(self.featured.expiring_notified)
+        self.assertEqual(self.messages('warning'), ['Your featured ad "Phone" is expiring in 2 day(s)!'])
+        # Warned once only
+        self.run_at(expiry - timedelta(days=1))
+        self.assertEqual(len(self.messages('warning')), 1)
+
+        self.assertIsNone(self.run_at(expiry))
+        self.assertEqual((self.featured.state, self.ad.is_featured), (FeaturedAd.EXPIRED, False))
+        self.assertEqual(self.messages('info'), ['Your featured ad "Phone" has expired.'])
+
+    def test_moved_start_is_postponed(self):
+        self.run_at(self.now + timedelta(hours=1))
+        FeaturedAd.objects.filter(pk=self.featured.pk).update(featured_start_date=self.now + timedelta(days=1))
+        self.run_at(self.now + timedelta(hours=2))
+        self.assertEqual((self.featured.state, self.ad.is_featured), (FeaturedAd.SCHEDULED, False))
+
+    def test_scheduled_ads_that_already_expired_send_nothing(self):
+        self.run_at(self.now + timedelta(days=6))
+        self.assertEqual((self.featured.state, self.ad.is_featured), (FeaturedAd.EXPIRED, False))
+        self.assertEqual(self.messages('info'), [])
+
+    def test_deleting_an_active_featuring_unfeatures_the_ad(self):
+        self.run_at(self.now + timedelta(hours=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.featured.delete()
+        self.ad.refresh_from_db()
+        self.assertFalse(self.ad.is_featured)
@@ -0,0 +1,58 @@
+import random
+
+from django.test import TestCase
+
+from base.models import Ad, Category, Location
+from base.search.geo import covering_cells, encode, haversine_km, within_radius
+from base.views import search_context
+
+from .utils import make_ad, make_user
+
+
+class GeohashTests(TestCase):
+    def test_encode(self):
+        self.assertEqual(encode(57.64911, 10.40744), 'u4pruyd')
+        self.assertEqual(encode(57.64911, 10.40744, precision=3), 'u4p')
+
+    def test_cells_cover_the_circle(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            latitude, longitude = rng.uniform(-60, 60), rng.uniform(-179, 179)
+            radius = rng.choice((1, 5, 25, 100))
+            cells = covering_cells(latitude, longitude, radius)
+            # A point on the edge of the circle, in a random direction
+            dlat = rng.uniform(-1, 1) * radius / 111.32
+            dlon = rng.uniform(-1, 1) * radius / 111.32
+            lat, lon = latitude + dlat, longitude + dlon
+            if haversine_km(latitude, longitude, lat, lon) <= radius:
+                self.assertTrue(any(encode(lat, lon).startswith(cell) for cell in cells))
+
+
+class RadiusSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        seller = make_user('seller@example.com')
+        cls.hargeisa = make_ad(seller, category, 'Phone', location='Hargeisa')
+        cls.borama = make_ad(seller, category, 'Phone', location='Borama')
+        cls.berbera = make_ad(seller, category, 'Phone', location='Berbera')
+
+    def test_within_radius(self):
+        place = Location.objects.get(name='Hargeisa')
+        self.assertEqual(self.hargeisa.geohash, encode(place.latitude, place.longitude))
+
+        def near(radius):
+            return set(within_radius(Ad.objects.all(), place.latitude, place.longitude, radius))
+
+        self.assertEqual(near(50), {self.hargeisa})
+        self.assertEqual(near(120), {self.hargeisa, self.borama})
+        self.assertEqual(near(200), {self.hargeisa, self.borama, self.berbera})
+        distances = {ad.pk: ad.distance for ad in within_radius(Ad.objects.all(), place.latitude, place.longitude, 200)}
+        self.assertAlmostEqual(distances[self.hargeisa.pk], 0, places=3)
+
+    def test_search_page_radius(self):
+        ads = search_context({'location': 'Hargeisa', 'radius': '120'})['ads']
+        self.assertEqual({ad.pk for ad in ads}, {self.hargeisa.pk, self.borama.pk})
+        # Unusable radius parameters are ignored
+        ads = search_context({'lat': 'north', 'lon': '44', 'radius': '50'})['ads']
+        self.assertEqual(len(ads.object_list), 3)
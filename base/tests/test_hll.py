@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from base import viewcounts
+from base.hll import REGISTERS, HyperLogLog
+from base.models import AdVisitorSketch, Category
+
+from .utils import make_ad, make_user
+
+
+def sketch_of(visitors):
+    sketch = HyperLogLog()
+    for visitor in visitors:
+        sketch.add(visitor)
+    return sketch
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_counts_within_the_error(self):
+        self.assertEqual(HyperLogLog().count(), 0)
+        self.assertEqual(sketch_of(['a', 'a', 'b']).count(), 2)
+        for distinct in (100, 1000, 50000):
+            with self.subTest(distinct=distinct):
+                sketch = sketch_of(f'visitor-{i}' for i in range(distinct))
+                self.assertAlmostEqual(sketch.count() / distinct, 1, delta=0.1)
+
+    def test_merge_is_a_union(self):
+        monday = sketch_of(range(0, 3000))
+        tuesday = sketch_of(range(2000, 5000))
+        self.assertAlmostEqual(monday.merge(tuesday).count() / 5000, 1, delta=0.1)
+
+    def test_sparse_and_dense_round_trips(self):
+        small = sketch_of(range(20))
+        self.assertLess(len(small.to_bytes()), REGISTERS)
+        self.assertEqual(HyperLogLog.from_bytes(small.to_bytes()).registers, small.registers)
+        large = sketch_of(range(5000))
+        self.assertEqual(len(large.to_bytes()), REGISTERS + 1)
+        self.assertEqual(HyperLogLog.from_bytes(large.to_bytes()).registers, large.registers)
+        self.assertEqual(HyperLogLog.from_bytes(None).count(), 0)
+
+
+class VisitorSketchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        cls.ad = make_ad(make_user('seller@example.com'), category, 'Phone')
+        cls.other = make_ad(make_user('other@example.com'), category, 'Tv')
+
+    def store(self, days_ago, visitors):
+        day = timezone.localdate() - timedelta(days=days_ago)
+        viewcounts.write_sketches({(self.ad.pk, day): sketch_of(visitors)})
+
+    def test_unique_visitors_over_days(self):
+        self.store(0, ['a', 'b'])
+        self.store(0, ['b', 'c'])
+        self.store(3, ['c', 'd'])
+        self.store(10, ['e'])
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk], days=1), {self.ad.pk: 3})
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk], days=7), {self.ad.pk: 4})
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk, self.other.pk]), {self.ad.pk: 5, self.other.pk: 0})
+
+    def test_compaction_keeps_all_time_counts(self):
+        for days_ago, visitors in ((0, ['a']), (20, ['b', 'c']), (30, ['c', 'd']), (40, ['e'])):
+            self.store(days_ago, visitors)
+        removed = viewcounts.compact_sketches(timezone.localdate() - timedelta(days=10))
+        self.assertEqual(removed, 2)
+        self.assertEqual(
+            list(AdVisitorSketch.objects.filter(ad=self.ad).order_by('day').values_list('cumulative', flat=True)),
+            [True, False],
+        )
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk]), {self.ad.pk: 5})
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk], days=7), {self.ad.pk: 1})
@@ -0,0 +1,52 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from base import homepage
+from base.models import Category
+
+from .utils import make_ad, make_user
+
+
+class HomepageSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones', icon='phone')
+        seller = make_user('seller@example.com')
+        cls.ads = [make_ad(seller, cls.phones, f'Phone {i}', is_featured=i == 0) for i in range(homepage.ADS_PER_CATEGORY + 2)]
+        make_ad(seller, cls.phones, 'Pending phone', status='pending')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_contents(self):
+        snapshot = homepage.build_snapshot()
+        self.assertEqual(snapshot['featured_count'], 1)
+        (rail,) = [category for category in snapshot['categories'] if category['id'] == self.phones.pk]
+        self.assertEqual(rail['approved_ads_count'], len(self.ads))
+        self.assertEqual(len(rail['approved_ads']), homepage.ADS_PER_CATEGORY)
+        self.assertEqual(rail['approved_ads'][0]['category_name'], 'Phones')
+        self.assertNotIn('Pending phone', [card['name'] for card in rail['approved_ads']])
+
+    def test_stale_snapshots_are_served_while_rebuilding(self):
+        with mock.patch.object(homepage.threading, 'Thread') as thread:
+            fresh = homepage.get_snapshot()
+            self.assertEqual(homepage.get_snapshot(), fresh)
+            thread.assert_not_called()
+
+            cache.set(homepage.SNAPSHOT_KEY, dict(fresh, expires_at=timezone.now() - timedelta(seconds=1)))
+            self.assertEqual(homepage.get_snapshot()['built_at'], fresh['built_at'])
+            homepage.get_snapshot()
+        # One rebuild per REBUILD_DELAY however many requests see it stale
+        thread.assert_called_once()
+
+    def test_index_reads_the_snapshot(self):
+        homepage.rebuild()
+        # Featured slots come from the rotation pool, tested on their own
+        with mock.patch('base.views.pick_featured_slots', return_value=[]), self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Phone 1')
@@ -0,0 +1,70 @@
+from django.test import TestCase
+
+from base.models import Category, Location, SellerRank, SellerRating, SellerStats
+from base.sellerstats import PRIOR_MEAN, reputation, top_sellers
+
+from .utils import make_ad, make_user
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones', icon='phone')
+        cls.cars = Category.objects.create(name='Cars', icon='car')
+        cls.hargeisa = Location.objects.get(name='Hargeisa')
+        cls.borama = Location.objects.get(name='Borama')
+        cls.raters = [make_user(f'rater{i}@example.com') for i in range(3)]
+        cls.phone_seller = make_user('phones@example.com')
+        cls.car_seller = make_user('cars@example.com')
+        for seller in (cls.phone_seller, cls.car_seller):
+            seller.get_seller_stats()
+        make_ad(cls.phone_seller, cls.phones, 'Phone', location='Hargeisa')
+        make_ad(cls.car_seller, cls.cars, 'Car', location='Borama')
+        for rater in cls.raters:
+            SellerRating.objects.create(seller=cls.phone_seller, rater=rater, rating=5)
+        SellerRating.objects.create(seller=cls.car_seller, rater=cls.raters[0], rating=5)
+
+    def sellers(self, **scope):
+        return [rank.seller for rank in top_sellers(**scope)]
+
+    def test_scopes(self):
+        # Three 5-star ratings outrank a single one
+        self.assertEqual(self.sellers(), [self.phone_seller, self.car_seller])
+        self.assertEqual(self.sellers(category=self.cars), [self.car_seller])
+        self.assertEqual(self.sellers(place=self.hargeisa), [self.phone_seller])
+        self.assertEqual(self.sellers(category=self.phones, place=self.borama), [])
+        rank = top_sellers(category=self.phones, place=self.hargeisa)[0]
+        self.assertAlmostEqual(rank.reputation, reputation(15, 3))
+        self.assertEqual((rank.total_ratings, rank.approved_ads), (3, 1))
+
+    def test_ratings_move_the_ranks(self):
+        for rater in self.raters[1:]:
+            SellerRating.objects.create(seller=self.car_seller, rater=rater, rating=5)
+        lowered = SellerRating.objects.get(seller=self.phone_seller, rater=self.raters[0])
+        lowered.rating = 1
+        lowered.save()
+        SellerRating.objects.get(seller=self.phone_seller, rater=self.raters[1]).delete()
+        self.assertEqual(self.sellers(), [self.car_seller, self.phone_seller])
+
+    def test_unapproved_ads_leave_the_board(self):
+        ad = self.car_seller.ad_set.get()
+        ad.status = 'rejected'
+        ad.save()
+        self.assertEqual(self.sellers(category=self.cars), [])
+
+    def test_first_rating_of_a_ranked_seller_without_stats(self):
+        seller = make_user('new@example.com')
+        make_ad(seller, self.phones, 'Tablet', location='Hargeisa')
+        SellerStats.objects.filter(user=seller).delete()
+        self.assertAlmostEqual(SellerRank.objects.get(seller=seller, category=None, place=None).reputation, PRIOR_MEAN)
+
+        SellerRating.objects.create(seller=seller, rater=self.raters[0], rating=5)
+        rank = SellerRank.objects.get(seller=seller, category=None, place=None)
+        self.assertAlmostEqual(rank.reputation, reputation(5, 1))
+        self.assertEqual(rank.total_ratings, 1)
+        self.assertEqual(SellerStats.objects.get(user=seller).total_ratings, 1)
+
+    def test_page(self):
+        response = self.client.get('/top-sellers/', {'category': self.cars.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([rank.seller for rank in response.context['ranks']], [self.car_seller])
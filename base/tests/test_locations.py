@@ -0,0 +1,53 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from base.models import Ad, Category, Location, LocationAlias, SellerRank
+from base.search.cache import APPROVED_ADS, category_generation, get_generation
+from base.search.locations import location_candidates, location_filter, resolve_location
+
+from .utils import make_ad, make_user
+
+
+class GazetteerTests(TestCase):
+    def test_aliases_and_accents(self):
+        hargeisa = Location.objects.get(name='Hargeisa')
+        self.assertEqual(resolve_location('Hargeysa'), hargeisa)
+        self.assertEqual(resolve_location('  HARGÉISA '), hargeisa)
+        self.assertEqual(resolve_location('Jigjiga Yar, Hargeisa'), hargeisa)
+        self.assertIsNone(resolve_location('Atlantis'))
+        self.assertIsNone(resolve_location(''))
+        self.assertEqual(location_candidates('Jigjiga Yar, Hargeisa'), ['jigjiga yar hargeisa', 'jigjiga yar', 'hargeisa'])
+
+    def test_region_covers_its_places(self):
+        hargeisa = Location.objects.get(name='Hargeisa')
+        seller = make_user('seller@example.com')
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        ad = make_ad(seller, category, 'Phone', location='Hargeysa')
+        self.assertEqual(ad.place, hargeisa)
+        self.assertIn(ad, Ad.objects.filter(location_filter(hargeisa.region)))
+        self.assertNotIn(ad, Ad.objects.filter(location_filter(Location.objects.get(name='Borama'))))
+
+
+class ResolveAdLocationsTests(TestCase):
+    def test_new_alias_links_ads_and_refreshes_ranks(self):
+        hargeisa = Location.objects.get(name='Hargeisa')
+        seller = make_user('seller@example.com')
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        ad = make_ad(seller, category, 'Phone', location='Ceel Baraf')
+        self.assertIsNone(ad.place)
+        self.assertFalse(SellerRank.objects.filter(seller=seller, place=hargeisa).exists())
+
+        LocationAlias.objects.create(location=hargeisa, name='Ceel Baraf')
+        generations = get_generation(APPROVED_ADS), get_generation(category_generation(category.pk))
+        call_command('resolve_ad_locations', stdout=StringIO())
+
+        ad.refresh_from_db()
+        self.assertEqual(ad.place, hargeisa)
+        self.assertEqual(ad.geohash != '', hargeisa.latitude is not None)
+        self.assertTrue(SellerRank.objects.filter(seller=seller, place=hargeisa, category=None).exists())
+        self.assertEqual(
+            (get_generation(APPROVED_ADS), get_generation(category_generation(category.pk))),
+            (generations[0] + 1, generations[1] + 1),
+        )
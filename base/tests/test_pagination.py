@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.test import Client
+from django.utils import timezone
+
+from base.models import Ad, Category
+from base.search import KeysetPaginator, rank_ads
+from base.search.pagination import decode_cursor, encode_cursor
+from base.search.ranking import scoring_time
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+class KeysetCursorTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Electronics', icon='electronics')
+        seller = make_user('seller@example.com')
+        cls.ads = [make_ad(seller, cls.category, f'Phone {i}', is_featured=i % 3 == 0) for i in range(8)]
+
+    def paginator(self, keyword='', **kwargs):
+        return KeysetPaginator(rank_ads(Ad.objects.filter(category=self.category), keyword, **kwargs), 3)
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(after=cursor)
+            pages.append([ad.pk for ad in page])
+            if not page.has_next():
+                return pages, page
+            cursor = page.next_cursor
+
+    def test_forward_and_back(self):
+        paginator = self.paginator()
+        expected = [ad.pk for ad in paginator.queryset]
+        pages, last = self.walk(paginator)
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual(len(pages), 3)
+
+        backwards, page = [], last
+        while page.has_previous():
+            page = paginator.get_page(before=page.previous_cursor)
+            backwards.insert(0, [ad.pk for ad in page])
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_scoring_time_travels_in_the_cursor(self):
+        scored_at = timezone.now() - timedelta(days=2)
+        queryset = rank_ads(Ad.objects.filter(category=self.category), 'phone', now=scored_at)
+        paginator = KeysetPaginator(queryset, 3, snapshot=scored_at)
+        first = paginator.get_page()
+        self.assertEqual(scoring_time(first.next_cursor), scored_at)
+
+        pages, _ = self.walk(paginator)
+        self.assertCountEqual([pk for page in pages for pk in page], [ad.pk for ad in self.ads])
+
+    def test_count_is_capped(self):
+        paginator = KeysetPaginator(Ad.objects.order_by('-id'), 3, count_cap=5)
+        self.assertEqual((paginator.count, paginator.count_is_estimate), (5, True))
+        paginator.set_count(42, False)
+        self.assertEqual(paginator.count, 42)
+
+    def test_malformed_cursors(self):
+        self.assertIsNone(decode_cursor('not a cursor'))
+        self.assertEqual(decode_cursor(encode_cursor([1, 'a'])), [1, 'a'])
+        first_page = [ad.pk for ad in self.paginator().get_page()]
+        for cursor in (
+            'garbage',
+            encode_cursor([1, 2]),
+            encode_cursor(['x', 'y', 'z', 'w']),
+            encode_cursor([0, True, '2026-13-45T00:00:00+00:00', 1]),
+            encode_cursor([0, True, None, 1]),
+            encode_cursor({'key': [0, 'x'], 'at': 'later'}),
+        ):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([ad.pk for ad in self.paginator().get_page(after=cursor)], first_page)
+                self.assertEqual([ad.pk for ad in self.paginator().get_page(before=cursor)], first_page)
+                self.assertEqual([ad.pk for ad in self.paginator('phone').get_page(after=cursor)], [
+                    ad.pk for ad in self.paginator('phone').get_page()
+                ])
+
+    def test_bad_cursors_do_not_break_the_search_page(self):
+        client = Client()
+        for cursor in (encode_cursor(['x', 'y', 'z', 'w']), encode_cursor([0, 'x', 'not a date', 1])):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(client.get('/search/', {'q': 'phone', 'after': cursor}).status_code, 200)
+                self.assertEqual(client.get('/search/', {'before': cursor}).status_code, 200)
@@ -0,0 +1,57 @@
+from base.models import Category
+from base.search.query import parse_query
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+class QueryParsingTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(name='Electronics', icon='electronics')
+        cls.vehicles = Category.objects.create(name='Vehicles', icon='car')
+        cls.seller = make_user('seller@example.com')
+        cls.typed_phone = make_ad(cls.seller, cls.electronics, 'Samsung Galaxy', description='Good phone', electronics_type='phone')
+        cls.untyped_phone = make_ad(cls.seller, cls.electronics, 'Samsung phone', description='Barely used')
+        cls.car = make_ad(cls.seller, cls.vehicles, 'Toyota Vitz car', vehicle_type='car', is_automatic=True)
+        cls.manual_car = make_ad(cls.seller, cls.vehicles, 'Toyota Corolla car', vehicle_type='car')
+
+    def search(self, q):
+        from base.views import search_context
+
+        return search_context({'q': q})
+
+    def test_choice_words_stay_in_the_text(self):
+        parsed = parse_query('samsung phone')
+        self.assertEqual(parsed.text, 'samsung phone')
+        self.assertEqual(parsed.boosts, {'electronics_type': 'phone'})
+        self.assertEqual(parsed.filters, {})
+
+    def test_transmission_is_a_boost(self):
+        parsed = parse_query('toyota automatic')
+        self.assertEqual(parsed.text, 'toyota automatic')
+        self.assertEqual(parsed.boosts, {'is_automatic': True})
+
+    def test_prices_and_years_become_filters(self):
+        parsed = parse_query('toyota under 5k 2015')
+        self.assertEqual(parsed.text, 'toyota')
+        self.assertEqual(parsed.filters, {'price__lte': 5000, 'year': 2015})
+        self.assertEqual(parsed.labels, ['Under $5,000', '2015'])
+
+        parsed = parse_query('car 20k-10k')
+        self.assertEqual(parsed.filters, {'price__gte': 10000, 'price__lte': 20000})
+
+    def test_category_and_place(self):
+        parsed = parse_query('electronics in hargeysa', [self.electronics, self.vehicles])
+        self.assertEqual(parsed.category, self.electronics)
+        self.assertEqual(parsed.location, 'Hargeysa')
+        self.assertEqual(parsed.text, '')
+
+    def test_choice_words_find_untyped_ads(self):
+        found = [ad.pk for ad in self.search('phone')['ads']]
+        self.assertCountEqual(found, [self.typed_phone.pk, self.untyped_phone.pk])
+        found = [ad.pk for ad in self.search('samsung phone')['ads']]
+        self.assertCountEqual(found, [self.typed_phone.pk, self.untyped_phone.pk])
+
+    def test_boosts_rank_matching_ads_first(self):
+        found = [ad.pk for ad in self.search('toyota automatic')['ads']]
+        self.assertEqual(found, [self.car.pk, self.manual_car.pk])
@@ -0,0 +1,59 @@
+import os
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from base.models import SearchLog, SearchQueryStat
+from base.search import querylog
+
+
+class QueryStringTests(TestCase):
+    def test_normalized_and_canonical(self):
+        params = querylog.normalize_params({'q': '  Toyota   HILUX ', 'after': 'cursor', 'lat': '9.5', 'location': ''})
+        self.assertEqual(params, {'q': 'toyota hilux'})
+        self.assertEqual(querylog.query_string({'q': 'a&b', 'category': '2'}), 'category=2&q=a%26b')
+
+    def test_long_queries_are_cut_before_encoding(self):
+        query = querylog.query_string({'q': 'ü' * 300})
+        self.assertLessEqual(len(query), querylog.MAX_QUERY_LENGTH)
+        self.assertTrue(query.endswith('%BC'))
+
+
+class SearchLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # No background flusher; the tests flush themselves
+        pid = mock.patch.object(querylog._buffer, 'flusher_pid', os.getpid())
+        pid.start()
+        self.addCleanup(pid.stop)
+        querylog._buffer.take()
+        self.addCleanup(querylog._buffer.take)
+
+    def test_record_and_rollup(self):
+        for latency in range(1, 11):
+            querylog.record({'q': 'Toyota'}, results=latency % 2, latency_ms=latency)
+        querylog.record({'q': 'phone', 'radius': '10'}, results=3, latency_ms=5)
+        querylog.record({'q': 'nothing'}, results=0, latency_ms=5)
+        self.assertEqual(SearchLog.objects.count(), 0)
+        querylog.flush()
+        self.assertEqual(SearchLog.objects.count(), 12)
+
+        self.assertEqual(querylog.rollup_day(timezone.localdate()), 3)
+        stat = SearchQueryStat.objects.get(query='q=toyota')
+        self.assertEqual((stat.searches, stat.zero_results), (10, 5))
+        self.assertEqual((stat.p50_ms, stat.p95_ms, stat.p99_ms), (5, 10, 10))
+
+        # Radius searches and queries that never find anything are not hot
+        self.assertEqual(querylog.pick_hot_queries(), ['q=toyota'])
+        self.assertEqual(querylog.hot_queries(), ['q=toyota'])
+
+    def test_full_buffer_is_written_in_the_background(self):
+        with mock.patch.object(querylog.threading, 'Thread') as thread:
+            for _ in range(querylog.BUFFER_SIZE):
+                querylog.record({'q': 'phone'}, results=1, latency_ms=1)
+        (call,) = thread.call_args_list
+        self.assertEqual(call.kwargs['target'], querylog.write_entries)
+        self.assertEqual(len(call.kwargs['args'][0]), querylog.BUFFER_SIZE)
+        self.assertEqual(querylog._buffer.entries, [])
@@ -0,0 +1,77 @@
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from base import rotation
+from base.models import Category, FeaturedAd
+
+from .utils import make_ad, make_user
+
+
+class RotationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        seller = make_user('seller@example.com')
+        now = timezone.now()
+        cls.featured = []
+        for i, days in enumerate((10, 10, 20)):
+            ad = make_ad(seller, category, f'Phone {i}', is_approved=True)
+            cls.featured.append(FeaturedAd.objects.create(
+                ad=ad, payment_screenshot='payment_screenshots/receipt.jpg',
+                featured_start_date=now, featured_expiry_date=now + timedelta(days=days),
+            ))
+        FeaturedAd.objects.update(state=FeaturedAd.ACTIVE)
+
+    def setUp(self):
+        cache.clear()
+        rotation._impressions.take()
+        self.addCleanup(rotation._impressions.take)
+        # Never flush from a thread during the tests
+        interval = mock.patch.object(rotation, 'FLUSH_INTERVAL', float('inf'))
+        interval.start()
+        self.addCleanup(interval.stop)
+
+    def test_slots_follow_paid_days(self):
+        ten_days, _, twenty_days = (featured.pk for featured in self.featured)
+        served = Counter(card['featured_id'] for _ in range(400) for card in rotation.pick(slots=1))
+        self.assertEqual(sum(served.values()), 400)
+        self.assertAlmostEqual(served[twenty_days] / served[ten_days], 2, delta=0.1)
+
+    def test_flushed_impressions_are_persisted_once(self):
+        first = self.featured[0].pk
+        rotation.pick(slots=3)
+        rotation.pick(slots=1)
+        self.assertEqual(cache.get(rotation._counter_key(first)), None)
+
+        rotation.flush()
+        self.assertEqual(rotation._impressions.counts, Counter())
+        self.assertEqual(sum(cache.get(rotation._counter_key(f.pk)) or 0 for f in self.featured), 4)
+
+        # A rebuild running elsewhere owns the counters
+        cache.add(rotation.POOL_LOCK_KEY, 1)
+        pool = rotation.rebuild_pool()
+        self.assertEqual(sum(card['impressions'] for card in pool['ads']), 0)
+        self.assertNotEqual(cache.get(rotation.POOL_KEY)['version'], pool['version'])
+        cache.delete(rotation.POOL_LOCK_KEY)
+
+        pool = rotation.rebuild_pool()
+        self.assertEqual(sum(card['impressions'] for card in pool['ads']), 4)
+        self.assertEqual(cache.get(rotation.POOL_KEY)['version'], pool['version'])
+        self.assertIsNone(cache.get(rotation.POOL_LOCK_KEY))
+        self.assertEqual(sum(cache.get(rotation._counter_key(f.pk)) for f in self.featured), 0)
+
+        rotation.rebuild_pool()
+        self.assertEqual(sum(FeaturedAd.objects.values_list('impressions', flat=True)), 4)
+
+    def test_stale_pool_is_served_while_rebuilding(self):
+        pool = rotation.rebuild_pool()
+        cache.set(rotation.POOL_KEY, dict(pool, expires_at=timezone.now() - timedelta(seconds=1)))
+        with mock.patch.object(rotation.threading, 'Thread') as thread:
+            rotation.pick()
+            rotation.pick()
+        thread.assert_called_once()
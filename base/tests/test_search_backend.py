@@ -0,0 +1,42 @@
+from base.models import Ad, Category
+from base.search import get_search_backend
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+class SearchBackendTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        seller = make_user('seller@example.com')
+        cls.named = make_ad(seller, category, 'Samsung phone', description='Barely used')
+        cls.described = make_ad(seller, category, 'Galaxy S10', description='Samsung flagship')
+        cls.other = make_ad(seller, category, 'Laptop', description='Dell')
+
+    def test_match_and_rank(self):
+        backend = get_search_backend()
+        ranked = Ad.objects.filter(backend.match(['samsung'])).annotate(
+            score=backend.rank(['samsung'])
+        ).order_by('-score')
+        # A hit in the name outranks one in the description
+        self.assertEqual([ad.pk for ad in ranked], [self.named.pk, self.described.pk])
+        self.assertEqual(
+            list(Ad.objects.filter(backend.match(['samsung', 'phone'], require_all=True))),
+            [self.named],
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        backend = get_search_backend()
+        self.other.name = 'Samsung laptop'
+        self.other.save()
+        self.assertIn(self.other, Ad.objects.filter(backend.match(['samsung'])))
+        self.named.delete()
+        self.assertEqual(list(Ad.objects.filter(backend.match(['phone']))), [])
+
+    def test_listings_do_not_load_the_search_vector(self):
+        from base.views import search_context
+
+        ads = search_context({'q': 'samsung'})['ads']
+        self.assertTrue(ads.object_list)
+        for ad in ads:
+            self.assertIn('search_vector', ad.get_deferred_fields())
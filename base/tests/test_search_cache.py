@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from base.models import Ad, Category
+from base.search import KeysetPaginator, rank_ads
+from base.search.cache import (
+    APPROVED_ADS, bump_generation, category_generation, get_generation, make_key, search_generation,
+)
+from base.search.facets import cached_facets
+from base.search.results import cached_page
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+@mock.patch('base.signals.schedule_homepage_rebuild', mock.Mock())
+@mock.patch('base.signals.warm_hot_queries', mock.Mock())
+class SearchCacheTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones', icon='phone')
+        cls.cars = Category.objects.create(name='Cars', icon='car')
+        cls.seller = make_user('seller@example.com')
+        cls.phone = make_ad(cls.seller, cls.phones, 'Samsung phone')
+
+    def page(self, category):
+        queryset = rank_ads(Ad.objects.filter(status='approved', category=category), '')
+        return [ad.pk for ad in cached_page(KeysetPaginator(queryset, 10), {'category': str(category.pk)})]
+
+    def add_ad(self, category, name, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_ad(self.seller, category, name, **fields)
+
+    def test_generations(self):
+        self.assertEqual(get_generation(APPROVED_ADS), 1)
+        bump_generation(APPROVED_ADS)
+        self.assertEqual(get_generation(APPROVED_ADS), 2)
+        cache.clear()
+        bump_generation(APPROVED_ADS)
+        self.assertEqual(get_generation(APPROVED_ADS), 2)
+        self.assertEqual(search_generation(self.phones.pk), 'c1')
+        self.assertEqual(make_key('x', 1, {'a': 1, 'b': 2}), make_key('x', 1, {'b': 2, 'a': 1}))
+        self.assertNotEqual(make_key('x', 1, {'a': 1}), make_key('x', 2, {'a': 1}))
+
+    def test_saves_expire_only_their_category(self):
+        self.assertEqual(self.page(self.phones), [self.phone.pk])
+        # Written behind the signals' back, so only the cache hides it
+        sneaky = Ad.objects.bulk_create([Ad(
+            advertiser=self.seller, category=self.phones, name='Nokia', price=1, location='Hargeisa', status='approved',
+        )])[0]
+        self.assertEqual(self.page(self.phones), [self.phone.pk])
+
+        self.add_ad(self.cars, 'Toyota')
+        self.assertEqual(self.page(self.phones), [self.phone.pk])
+
+        # A pending ad changes no listing
+        pending = self.add_ad(self.phones, 'Pending phone', status='pending')
+        self.assertEqual(self.page(self.phones), [self.phone.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pending.status = 'approved'
+            pending.save()
+        self.assertCountEqual(self.page(self.phones), [self.phone.pk, sneaky.pk, pending.pk])
+
+    def test_deletes_and_moves_expire_both_categories(self):
+        self.assertEqual(self.page(self.phones), [self.phone.pk])
+        self.assertEqual(self.page(self.cars), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.category = self.cars
+            self.phone.save()
+        self.assertEqual(self.page(self.phones), [])
+        self.assertEqual(self.page(self.cars), [self.phone.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.delete()
+        self.assertEqual(self.page(self.cars), [])
+
+    def test_facets_follow_the_generation(self):
+        queryset = Ad.objects.filter(status='approved')
+        self.assertEqual(cached_facets(queryset, {})['category'][0]['count'], 1)
+        self.add_ad(self.phones, 'Nokia phone')
+        self.assertEqual(cached_facets(queryset, {})['category'][0]['count'], 2)
@@ -0,0 +1,83 @@
+import os
+from unittest import mock
+
+from base.models import Category
+from base.search import segments
+from base.search.segments import SegmentIndex
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+class SegmentIndexTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Electronics', icon='electronics')
+        cls.seller = make_user('seller@example.com')
+        cls.phone = make_ad(cls.seller, cls.category, 'Samsung phone', description='Barely used')
+        cls.tv = make_ad(cls.seller, cls.category, 'Samsung tv')
+        cls.pending = make_ad(cls.seller, cls.category, 'Samsung tablet', status='pending')
+
+    def setUp(self):
+        super().setUp()
+        self.index = SegmentIndex(os.path.join(self.index_dir, 'segments'))
+        # No background writer; the tests flush themselves
+        self.index._writer_pid = os.getpid()
+        self.addCleanup(self.index.flush)
+
+    def search(self, *terms, require_all=False):
+        return self.index._load(self.index.read_manifest()).search(terms, require_all)
+
+    def test_rebuild_indexes_approved_ads(self):
+        self.index.rebuild(chunk_size=1)
+        scores = self.search('samsung')
+        self.assertEqual(set(scores), {self.phone.pk, self.tv.pk})
+        self.assertEqual(set(self.search('sam', 'pho', require_all=True)), {self.phone.pk})
+        self.assertEqual(len(self.index.read_manifest()['base']), 2)
+
+    def test_deltas_override_the_base(self):
+        self.index.rebuild()
+        self.phone.name = 'Nokia phone'
+        self.index.append_delta(ads=[self.phone], deleted=[self.tv.pk])
+        self.assertEqual(self.search('samsung'), {})
+        self.assertEqual(set(self.search('nokia')), {self.phone.pk})
+
+        # Rejected ads leave the index
+        self.phone.status = 'rejected'
+        self.index.append_delta(ads=[self.phone])
+        self.assertEqual(self.search('phone'), {})
+
+    def test_queue_waits_for_commit(self):
+        self.index.rebuild()
+        self.pending.status = 'approved'
+        self.tv.status = 'pending'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index.queue(ads=[self.pending, self.tv])
+            self.assertEqual(self.index._pending, {})
+        self.index.flush()
+        self.assertEqual(set(self.search('samsung')), {self.phone.pk, self.pending.pk})
+
+    @mock.patch.object(segments, 'MAX_DELTAS', 100)
+    def test_merge_keeps_results(self):
+        self.index.rebuild()
+        ads = [make_ad(self.seller, self.category, f'Samsung watch {i}') for i in range(3)]
+        for ad in ads:
+            self.index.append_delta(ads=[ad])
+        self.index.append_delta(deleted=[self.tv.pk])
+        before = self.search('samsung')
+
+        # Small deltas merge into one delta next to the base
+        with mock.patch.object(segments, 'FULL_MERGE_RATIO', 100):
+            self.index.merge()
+        manifest = self.index.read_manifest()
+        self.assertEqual((len(manifest['base']), len(manifest['deltas'])), (1, 1))
+        self.assertEqual(set(self.search('samsung')), set(before))
+
+        # Once they hold enough of the base's docs, they fold into it
+        self.index.append_delta(ads=[make_ad(self.seller, self.category, 'Samsung fridge')])
+        before = self.search('samsung')
+        self.index.merge()
+        manifest = self.index.read_manifest()
+        self.assertEqual((len(manifest['base']), len(manifest['deltas'])), (1, 0))
+        self.assertEqual(set(self.search('samsung')), set(before))
+        self.assertNotIn(self.tv.pk, before)
+        self.assertEqual(sorted(name for name in os.listdir(self.index.path) if name.endswith('.seg')), manifest['base'])
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from base.models import Category, SellerRating, SellerStats, User
+from base.sellerstats import SellerStatsMiddleware, is_drifted, load
+
+from .utils import make_ad, make_user
+
+
+class SellerStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_user('seller@example.com')
+        cls.raters = [make_user(f'rater{i}@example.com') for i in range(2)]
+
+    def stats(self):
+        return SellerStats.objects.get(user=self.seller)
+
+    def test_rating_deltas(self):
+        self.seller.get_seller_stats()
+        first = SellerRating.objects.create(seller=self.seller, rater=self.raters[0], rating=5)
+        second = SellerRating.objects.create(seller=self.seller, rater=self.raters[1], rating=3)
+        stats = self.stats()
+        self.assertEqual((stats.total_ratings, stats.rating_sum), (2, 8))
+        self.assertEqual(stats.average_rating, Decimal('4.00'))
+        self.assertEqual((stats.five_star_count, stats.three_star_count), (1, 1))
+        self.assertAlmostEqual(stats.reputation, (8 + 5 * 3.5) / 7)
+
+        first.rating = 4
+        first.save()
+        stats = self.stats()
+        self.assertEqual((stats.total_ratings, stats.rating_sum), (2, 7))
+        self.assertEqual((stats.five_star_count, stats.four_star_count), (0, 1))
+        self.assertEqual(stats.average_rating, Decimal('3.50'))
+
+        second.delete()
+        stats = self.stats()
+        self.assertEqual((stats.total_ratings, stats.rating_sum, stats.three_star_count), (1, 4, 0))
+        self.assertEqual(stats.average_rating, Decimal('4.00'))
+        self.assertFalse(is_drifted(stats))
+
+    def test_approved_ads_are_counted(self):
+        self.seller.get_seller_stats()
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        ad = make_ad(self.seller, category, 'Phone', status='pending')
+        self.assertEqual(self.stats().total_ads, 0)
+        ad.status = 'approved'
+        ad.save()
+        make_ad(self.seller, category, 'Tv')
+        self.assertEqual(self.stats().total_ads, 2)
+        ad.delete()
+        self.assertEqual(self.stats().total_ads, 1)
+
+    def test_drifted_rows_are_recomputed(self):
+        SellerRating.objects.create(seller=self.seller, rater=self.raters[0], rating=5)
+        SellerStats.objects.update_or_create(user=self.seller, defaults={'total_ratings': 3})
+        self.assertEqual(self.seller.get_seller_stats().total_ratings, 1)
+
+
+
+class IdentityMapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_user('seller@example.com')
+        cls.rater = make_user('rater@example.com')
+        cls.seller.get_seller_stats()
+
+    def in_request(self, view):
+        return SellerStatsMiddleware(lambda request: view())(None)
+
+    def read_everything(self):
+        seller = User.objects.get(pk=self.seller.pk)
+        return (
+            seller.get_average_rating(), seller.get_rating_count(),
+            seller.get_rating_distribution(), seller.get_positive_rating_percentage(),
+        )
+
+    def test_one_read_per_seller_and_request(self):
+        with self.assertNumQueries(2):
+            # The user, then its stats once
+            self.in_request(self.read_everything)
+        # Outside a request every stats read goes to the database
+        with self.assertNumQueries(4):
+            self.read_everything()
+        with self.assertNumQueries(2):
+            # A new request reads the row again
+            self.in_request(self.read_everything)
+
+    def test_changes_drop_the_cached_row(self):
+        def rate_between_reads():
+            before = self.seller.get_seller_stats().total_ratings
+            SellerRating.objects.create(seller=self.seller, rater=self.rater, rating=5)
+            return before, self.seller.get_seller_stats().total_ratings
+
+        self.assertEqual(self.in_request(rate_between_reads), (0, 1))
+        self.assertEqual(load([self.seller.pk])[self.seller.pk].total_ratings, 1)
+
+
+class RecomputeCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        cls.sellers = [make_user(f'seller{i}@example.com') for i in range(3)]
+        rater = make_user('rater@example.com')
+        for stars, seller in enumerate(cls.sellers, start=3):
+            seller.get_seller_stats()
+            SellerRating.objects.create(seller=seller, rater=rater, rating=stars)
+            make_ad(seller, category, f'Phone {stars}')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.checkpoint = os.path.join(directory, 'checkpoint.json')
+        SellerStats.objects.update(total_ratings=0, rating_sum=0, five_star_count=0, total_ads=9)
+
+    def recompute(self, *args):
+        call_command(
+            'recompute_seller_stats', '--workers', '1', '--chunk-size', '1', '--checkpoint', self.checkpoint,
+            *args, stdout=StringIO(),
+        )
+
+    def test_rows_are_rebuilt(self):
+        self.recompute()
+        for stars, seller in enumerate(self.sellers, start=3):
+            stats = SellerStats.objects.get(user=seller)
+            self.assertEqual((stats.total_ratings, stats.rating_sum, stats.total_ads), (1, stars, 1))
+            self.assertFalse(is_drifted(stats))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_skips_finished_chunks(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'chunk_size': 1, 'done': [self.sellers[0].pk]}, f)
+        self.recompute('--resume')
+        self.assertEqual(SellerStats.objects.get(user=self.sellers[0]).total_ads, 9)
+        self.assertEqual(SellerStats.objects.get(user=self.sellers[1]).total_ads, 1)
+
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'chunk_size': 50, 'done': []}, f)
+        with self.assertRaises(CommandError):
+            self.recompute('--resume')
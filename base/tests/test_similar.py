@@ -0,0 +1,60 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from base import similar
+from base.models import Category, SimilarAd
+
+from .utils import make_ad, make_user
+
+
+class NeighbourTests(SimpleTestCase):
+    def test_batches_match_a_single_pass(self):
+        rng = np.random.default_rng(3)
+        matrix = rng.random((50, 8), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        whole = {row: (list(best), list(scores)) for row, best, scores in similar.neighbours(matrix, 5, batch_size=50)}
+        for row, best, scores in similar.neighbours(matrix, 5, batch_size=7):
+            self.assertEqual(list(best), whole[row][0])
+            self.assertNotIn(row, best)
+            self.assertEqual(list(scores), sorted(scores, reverse=True))
+        self.assertEqual(len(whole), 50)
+
+    def test_batch_rows_stay_within_memory(self):
+        self.assertEqual(similar.batch_rows(10), similar.BATCH_SIZE)
+        self.assertEqual(similar.batch_rows(1_000_000, memory=120_000_000), 10)
+        self.assertEqual(similar.batch_rows(10 ** 9), 1)
+        self.assertEqual(list(similar.neighbours(np.ones((1, 4), dtype=np.float32))), [])
+
+
+class SimilarAdsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        phones = Category.objects.create(name='Phones', icon='phone')
+        cars = Category.objects.create(name='Cars', icon='car')
+        seller = make_user('seller@example.com')
+        cls.galaxy = make_ad(seller, phones, 'Samsung Galaxy S10', description='Android phone')
+        cls.note = make_ad(seller, phones, 'Samsung Galaxy Note', description='Android phone, big screen')
+        cls.iphone = make_ad(seller, phones, 'iPhone 12', description='Apple phone', price=900)
+        cls.car = make_ad(seller, cars, 'Toyota Vitz', ad_type='rent', price=20000, year=2015)
+        cls.pending = make_ad(seller, phones, 'Samsung Galaxy S9', description='Android phone', status='pending')
+
+    def test_build_and_read(self):
+        call_command('build_similar_ads', '--neighbours', '2', stdout=StringIO())
+        self.assertFalse(SimilarAd.objects.filter(ad=self.pending).exists())
+        self.assertEqual(list(similar.similar_ads(self.galaxy)), [self.note, self.iphone])
+        self.assertEqual(list(similar.similar_ads(self.galaxy, limit=1)), [self.note])
+        self.assertNotIn(self.car, similar.similar_ads(self.note))
+
+        # Neighbours that stop being approved drop out until the next build
+        self.note.status = 'rejected'
+        self.note.save()
+        self.assertEqual(list(similar.similar_ads(self.galaxy)), [self.iphone])
+
+    def test_detail_page_shows_them(self):
+        similar.build()
+        response = self.client.get(f'/product/{self.galaxy.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.note, response.context['similar_items'])
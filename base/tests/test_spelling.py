@@ -0,0 +1,65 @@
+import os
+from collections import Counter
+from unittest import mock
+
+from base.models import Category
+from base.search import spelling
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+class SymmetricDeleteTests(SearchIndexTestCase):
+    def test_deletes_and_distance(self):
+        self.assertEqual(spelling.deletes('car', 1), {'car', 'ar', 'cr', 'ca'})
+        self.assertTrue(all(len(key) >= 5 for key in spelling.deletes('toyotacorolla')))
+        self.assertEqual(spelling.edit_distance('toyota', 'toyota'), 0)
+        self.assertEqual(spelling.edit_distance('toyta', 'toyota'), 1)
+        self.assertEqual(spelling.edit_distance('toyoat', 'toyota'), 1)
+        self.assertEqual(spelling.edit_distance('tyt', 'toyota'), spelling.MAX_DISTANCE + 1)
+
+    def test_lookup_prefers_close_then_frequent_words(self):
+        path = os.path.join(self.index_dir, spelling.FILENAME)
+        spelling.write_dictionary(path, Counter({'toyota': 5, 'hilux': 2, 'hilax': 1, 'samsung': 3}))
+        dictionary = spelling.SpellingDictionary(path)
+        self.addCleanup(dictionary.close)
+        self.assertEqual(dictionary.lookup('toyota'), ('toyota', 0))
+        self.assertEqual(dictionary.lookup('toyta'), ('toyota', 1))
+        self.assertEqual(dictionary.lookup('hilox'), ('hilux', 1))
+        self.assertEqual(dictionary.lookup('smasnug'), ('samsung', 2))
+        self.assertIsNone(dictionary.lookup('bicycle'))
+
+
+class CorrectionTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Vehicles', icon='car')
+        seller = make_user('seller@example.com')
+        make_ad(seller, category, 'Toyota Corolla', description='Clean automatic')
+        make_ad(seller, category, 'Misspelt Toyotta', status='pending')
+
+    def setUp(self):
+        super().setUp()
+        # No refresher thread during the tests
+        pid = mock.patch.object(spelling._holder, 'refresher_pid', os.getpid())
+        pid.start()
+        self.addCleanup(pid.stop)
+        spelling._holder.checked_at = 0.0
+
+    def test_corrections_from_approved_ads(self):
+        self.assertEqual(spelling.corrections('toyta'), {})
+        self.assertTrue(spelling.rebuild(force=True))
+        spelling._holder.checked_at = 0.0
+
+        found = spelling.corrections('Toyta corola, 2015 automatik xy')
+        self.assertEqual(found, {'toyta': 'toyota', 'corola': 'corolla', 'automatik': 'automatic'})
+        self.assertEqual(spelling.correct('Toyta corola, 2015', found), 'toyota corolla, 2015')
+        # Pending ads do not teach the dictionary their spelling
+        self.assertEqual(spelling.corrections('toyotta'), {'toyotta': 'toyota'})
+
+    def test_refresher_starts_on_first_use(self):
+        spelling._holder.refresher_pid = None
+        with mock.patch.object(spelling.threading, 'Thread') as thread:
+            spelling.corrections('toyta')
+            spelling.corrections('corola')
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from base.models import Category
+from base.search.suggest import AD, CATEGORY, LOCATION, MAX_KEY_LENGTH, PrefixIndex, SuggestionIndex
+
+from .utils import make_ad, make_user
+
+
+class PrefixIndexTests(TestCase):
+    def test_word_starts_and_weights(self):
+        index = PrefixIndex()
+        index.add(AD, 'Toyota Corolla')
+        index.add(AD, 'Toyota Corolla')
+        index.add(AD, 'Toyota Hilux')
+        index.add(LOCATION, 'Hargeisa')
+        self.assertEqual(index.search('cor'), [{'kind': AD, 'text': 'Toyota Corolla', 'weight': 2}])
+        self.assertEqual([item['text'] for item in index.search('toy')], ['Toyota Corolla', 'Toyota Hilux'])
+        self.assertEqual([item['text'] for item in index.search('  TOYOTA   h')], ['Toyota Hilux'])
+        self.assertEqual(index.search('x'), [])
+
+    def test_remove_drops_keys_at_zero(self):
+        index = PrefixIndex()
+        index.add(AD, 'Samsung phone', weight=2)
+        index.add(AD, 'Samsung tv')
+        self.assertEqual(len(index.search('s')), 2)
+        index.remove(AD, 'Samsung phone')
+        self.assertEqual(index.search('phone')[0]['weight'], 1)
+        index.remove(AD, 'Samsung phone')
+        index.remove(AD, 'Never added')
+        # The memoized short prefix is dropped with the change
+        self.assertEqual([item['text'] for item in index.search('s')], ['Samsung tv'])
+        self.assertEqual(len(index.keys), 2)
+
+    def test_long_keys_are_capped(self):
+        index = PrefixIndex()
+        long_name = ' '.join(['word'] * 30)
+        index.add(AD, long_name)
+        index.add(AD, long_name + ' extra')
+        self.assertTrue(all(len(key) <= MAX_KEY_LENGTH for key, _, _ in index.keys))
+        self.assertEqual(len(index.search('word')), 2)
+        self.assertEqual([item['text'] for item in index.search(' '.join(['word'] * 29) + ' extra')], [
+            long_name + ' extra'
+        ])
+
+
+class SuggestionIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_build_and_replay_changes(self):
+        category = Category.objects.create(name='Vehicles', icon='car')
+        seller = make_user('seller@example.com')
+        ad = make_ad(seller, category, 'Toyota Corolla', location=' hargeisa ')
+        make_ad(seller, category, 'Pending Pickup', status='pending')
+
+        index = SuggestionIndex()
+        index.rebuild()
+        self.assertEqual([item['kind'] for item in index.search('veh')], [CATEGORY])
+        self.assertEqual([item['text'] for item in index.search('harg')], ['Hargeisa'])
+        self.assertEqual(index.search('pick'), [])
+
+        ad.name = 'Toyota Hilux'
+        ad.save()
+        index._checked_at = 0.0
+        self.assertEqual([item['text'] for item in index.search('toy')], ['Toyota Hilux'])
+
+    def test_searches_wait_for_the_first_build(self):
+        index = SuggestionIndex()
+        index._start_rebuild = lambda: None
+        self.assertEqual(index.search('anything'), [])
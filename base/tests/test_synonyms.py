@@ -0,0 +1,45 @@
+from base.models import Ad, Category, SynonymGroup
+from base.search import get_search_backend
+from base.search.cache import APPROVED_ADS, bump_generation, get_generation
+from base.search.synonyms import SYNONYMS, expand, group_words, reindex_synonyms
+
+from .utils import SearchIndexTestCase, make_ad, make_user
+
+
+class SynonymTests(SearchIndexTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Electronics', icon='electronics')
+        cls.seller = make_user('seller@example.com')
+
+    def setUp(self):
+        super().setUp()
+        bump_generation(SYNONYMS)
+
+    def found(self, word):
+        return list(Ad.objects.filter(get_search_backend().match([word])))
+
+    def test_group_words(self):
+        self.assertEqual(group_words(' Jawaal, mobaylka ,, JAWAAL'), ['jawaal', 'mobaylka'])
+
+    def test_expansions_are_indexed_with_the_ad(self):
+        SynonymGroup.objects.create(words='jawaal, mobaylka')
+        bump_generation(SYNONYMS)
+        ad = make_ad(self.seller, self.category, 'Samsung jawaal')
+        self.assertEqual(ad.search_synonyms, expand(ad))
+        self.assertIn('mobaylka', ad.search_synonyms.split())
+        self.assertEqual(self.found('mobaylka'), [ad])
+
+    def test_dictionary_edits_reindex_existing_ads(self):
+        ad = make_ad(self.seller, self.category, 'Samsung jawaal')
+        self.assertEqual(self.found('mobaylka'), [])
+
+        SynonymGroup.objects.create(words='jawaal, mobaylka')
+        generation = get_generation(APPROVED_ADS)
+        self.assertEqual(reindex_synonyms({'jawaal', 'mobaylka'}), 1)
+        self.assertEqual(self.found('mobaylka'), [ad])
+        self.assertGreater(get_generation(APPROVED_ADS), generation)
+
+        SynonymGroup.objects.filter(words='jawaal, mobaylka').delete()
+        self.assertEqual(reindex_synonyms({'jawaal', 'mobaylka'}), 1)
+        self.assertEqual(self.found('mobaylka'), [])
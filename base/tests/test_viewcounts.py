@@ -0,0 +1,71 @@
+import os
+from collections import Counter
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from base import viewcounts
+from base.hll import HyperLogLog
+from base.models import Category
+
+from .utils import make_ad, make_user
+
+
+class ViewCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics', icon='electronics')
+        cls.ad = make_ad(make_user('seller@example.com'), category, 'Phone')
+
+    def setUp(self):
+        viewcounts._counter.take()
+        self.addCleanup(viewcounts._counter.take)
+        # No background flusher; the tests flush themselves
+        pid = mock.patch.object(viewcounts._counter, 'flusher_pid', os.getpid())
+        pid.start()
+        self.addCleanup(pid.stop)
+
+    def buffer(self, views, visitors):
+        sketch = HyperLogLog()
+        for visitor in visitors:
+            sketch.add(visitor)
+        viewcounts._counter.put_back(Counter({self.ad.pk: views}), {(self.ad.pk, timezone.localdate()): sketch})
+
+    def test_views_are_buffered(self):
+        with self.assertNumQueries(0):
+            for visitor in ('a', 'b', 'a', None):
+                viewcounts.record_view(self.ad.pk, visitor)
+        counts, sketches = viewcounts._counter.take()
+        self.assertEqual(counts, Counter({self.ad.pk: 4}))
+        self.assertEqual(sketches[(self.ad.pk, timezone.localdate())].count(), 2)
+
+    def test_detail_page_counts_a_view(self):
+        self.assertEqual(self.client.get(f'/product/{self.ad.pk}/').status_code, 200)
+        viewcounts.flush()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views, 1)
+
+    def test_flush(self):
+        self.buffer(3, ['a', 'b'])
+        viewcounts.flush()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views, 3)
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk], days=1), {self.ad.pk: 2})
+        self.assertEqual(viewcounts._counter.take(), (Counter(), {}))
+
+    def test_failed_flush_puts_everything_back(self):
+        self.buffer(3, ['a', 'b'])
+        with mock.patch.object(viewcounts, 'write_sketches', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                viewcounts.flush()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views, 0)
+
+        self.buffer(2, ['b', 'c'])
+        viewcounts.flush()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views, 5)
+        self.assertEqual(viewcounts.unique_visitors([self.ad.pk]), {self.ad.pk: 3})
+
@@ -0,0 +1,31 @@
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from base.models import Ad, User
+
+
+def make_user(email):
+    return User.objects.create_user(email=email, password='secret', full_name=email.split('@')[0])
+
+
+def make_ad(advertiser, category, name, **fields):
+    fields.setdefault('price', Decimal('100'))
+    fields.setdefault('location', 'Hargeisa')
+    fields.setdefault('status', 'approved')
+    return Ad.objects.create(advertiser=advertiser, category=category, name=name, **fields)
+
+
+class SearchIndexTestCase(TestCase):
+    """Runs with its own SEARCH_INDEX_DIR (no spelling dictionary) and an empty cache"""
+
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir, ignore_errors=True)
+        settings_override = override_settings(SEARCH_INDEX_DIR=self.index_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
@@ -17,6 +17,7 @@ urlpatterns = [
     # Product
     path('product/<int:ad_id>/', views.product_detail, name='product_detail'),
     path('product/<int:ad_id>/comment/', views.add_comment, name='add_comment'),
+    path('product/<int:ad_id>/comments/', views.comment_threads, name='comment_threads'),
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
     path('reply_to_comment/<int:comment_id>/', views.reply_to_comment, name='reply_to_comment'),
 
@@ -62,6 +63,7 @@ urlpatterns = [
 
     # Profiles
     path('view_advertiser_profile/<str:username>/', views.view_advertiser_profile, name='view_advertiser_profile'),
+    path('top-sellers/', views.top_sellers, name='top_sellers'),
 
     # Dashboard & Navigation
     path('', views.index, name='index'),
@@ -69,6 +71,7 @@ urlpatterns = [
     path('menu/', views.menu, name='menu'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('search/', views.search_ads, name='search_ads'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('categories/<int:category_id>/', views.product_list, name='product_list'),
 
     # Notifications
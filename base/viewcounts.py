@@ -0,0 +1,182 @@
+# viewcounts.py
+"""
+Write-behind counters for ad views.
+
+A page view only bumps an in-process counter and adds the visitor to an
+in-process HyperLogLog sketch of the ad's visitors that day. A
+background flusher adds the counts to Ad.views every FLUSH_INTERVAL
+seconds, with one UPDATE per distinct increment instead of one per view,
+so a popular listing no longer queues every request on its row lock, and
+merges the sketches into AdVisitorSketch. What is still buffered is
+written when the worker exits.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .hll import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+
+
+class _ViewCounter:
+    def __init__(self):
+        self.counts = Counter()
+        self.sketches = {}
+        self.lock = threading.Lock()
+        self.flusher_pid = None
+
+    def add(self, ad_id, visitor=None):
+        with self.lock:
+            self.counts[ad_id] += 1
+            if visitor:
+                key = (ad_id, timezone.localdate())
+                self.sketches.setdefault(key, HyperLogLog()).add(visitor)
+            # Started lazily, and again in each forked worker
+            if self.flusher_pid != os.getpid():
+                self.flusher_pid = os.getpid()
+                threading.Thread(target=self.run, daemon=True).start()
+
+    def take(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            sketches, self.sketches = self.sketches, {}
+        return counts, sketches
+
+    def put_back(self, counts, sketches):
+        with self.lock:
+            self.counts.update(counts)
+            for key, sketch in sketches.items():
+                if key in self.sketches:
+                    sketch.merge(self.sketches[key])
+                self.sketches[key] = sketch
+
+    def run(self):
+        stop = threading.Event()
+        while not stop.wait(FLUSH_INTERVAL):
+            try:
+                flush()
+            except Exception as e:
+                logger.error(f"Error flushing ad view counts: {str(e)}")
+            finally:
+                connection.close()
+
+
+_counter = _ViewCounter()
+
+
+def visitor_key(request):
+    """Who is viewing: the user, else the session, else a hash of IP and user agent"""
+    if request.user.is_authenticated:
+        return f'u:{request.user.pk}'
+    if request.session.session_key:
+        return f's:{request.session.session_key}'
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return f'a:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def record_view(ad_id, visitor=None):
+    """Count one view of an ad, written to Ad.views within FLUSH_INTERVAL"""
+    _counter.add(ad_id, visitor)
+
+
+def write_counts(counts):
+    """Add {ad id: views} to Ad.views, grouping ads with the same increment"""
+    from .models import Ad
+
+    by_increment = defaultdict(list)
+    for ad_id, count in counts.items():
+        by_increment[count].append(ad_id)
+    # All or nothing, so a failed flush can put every count back
+    with transaction.atomic():
+        for count, ad_ids in by_increment.items():
+            Ad.objects.filter(pk__in=ad_ids).update(views=F('views') + count)
+
+
+def write_sketches(sketches):
+    """Merge {(ad id, day): HyperLogLog} into the stored daily sketches"""
+    from .models import Ad, AdVisitorSketch
+
+    # Views of ads deleted since are dropped
+    live = set(Ad.objects.filter(pk__in={ad_id for ad_id, _ in sketches}).values_list('pk', flat=True))
+    with transaction.atomic():
+        for (ad_id, day), sketch in sketches.items():
+            if ad_id not in live:
+                continue
+            row, created = AdVisitorSketch.objects.select_for_update().get_or_create(
+                ad_id=ad_id, day=day, defaults={'registers': sketch.to_bytes()}
+            )
+            if not created:
+                row.registers = sketch.merge(HyperLogLog.from_bytes(row.registers)).to_bytes()
+                row.save(update_fields=['registers'])
+
+
+@atexit.register
+def flush():
+    """Write the buffered views, e.g. on graceful worker shutdown"""
+    counts, sketches = _counter.take()
+    if not counts and not sketches:
+        return
+    try:
+        with transaction.atomic():
+            write_counts(counts)
+            write_sketches(sketches)
+    except Exception:
+        # Put them back for the next attempt
+        _counter.put_back(counts, sketches)
+        raise
+
+
+def unique_visitors(ad_ids, days=None):
+    """
+    {ad id: estimated distinct visitors} over the last days days
+    including today, or over all time when days is None.
+    """
+    from .models import AdVisitorSketch
+
+    rows = AdVisitorSketch.objects.filter(ad_id__in=ad_ids)
+    if days is not None:
+        rows = rows.filter(day__gt=timezone.localdate() - timedelta(days=days), cumulative=False)
+    merged = {}
+    for ad_id, registers in rows.values_list('ad_id', 'registers').iterator():
+        sketch = HyperLogLog.from_bytes(registers)
+        merged[ad_id] = merged[ad_id].merge(sketch) if ad_id in merged else sketch
+    return {ad_id: merged[ad_id].count() if ad_id in merged else 0 for ad_id in ad_ids}
+
+
+def compact_sketches(before):
+    """
+    Fold each ad's sketches dated before the given day into one cumulative
+    row, return how many rows were removed.
+    """
+    from .models import AdVisitorSketch
+
+    old = AdVisitorSketch.objects.filter(day__lt=before).order_by('ad_id', 'day')
+    merged = {}
+    for ad_id, day, registers in old.values_list('ad_id', 'day', 'registers').iterator():
+        sketch = HyperLogLog.from_bytes(registers)
+        if ad_id in merged:
+            merged[ad_id][1].merge(sketch)
+            merged[ad_id][0] = day
+        else:
+            merged[ad_id] = [day, sketch]
+
+    removed = 0
+    with transaction.atomic():
+        for ad_id, (last_day, sketch) in merged.items():
+            deleted, _ = AdVisitorSketch.objects.filter(ad_id=ad_id, day__lt=before).exclude(day=last_day).delete()
+            AdVisitorSketch.objects.filter(ad_id=ad_id, day=last_day).update(
+                cumulative=True, registers=sketch.to_bytes()
+            )
+            removed += deleted
+    return removed
@@ -1,6 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Category, AdImage, Ad, User, Comment, FeaturedAd, FeaturedAdHistory, PendingFeaturedAd, Notification, Favorite ,SellerRating, SellerStats
+from .homepage import get_snapshot as homepage_snapshot
+from .rotation import pick as pick_featured_slots
+from .viewcounts import record_view, unique_visitors, visitor_key
+from .comments import thread_page
+from .sellerstats import top_sellers as seller_leaderboard
+from .similar import similar_ads
 from .forms import AdForm, SignupForm, LoginForm, AuthenticationForm, CommentForm, AdPaidForm, UserProfileForm
+from .search import rank_ads, KeysetPaginator, EXACT_TIER, CLOSE_TIER
+from .search.facets import cached_facets, price_bucket_filter, price_bucket_label
+from .search.geo import MAX_RADIUS_KM, RADIUS_CHOICES, within_radius
+from .search.locations import location_filter, resolve_location
+from .search.query import parse_query
+from .search.ranking import scoring_time
+from .search.querylog import record as record_search
+from .search.results import cached_page
+from .search.spelling import corrections as spelling_corrections, correct as correct_spelling
+from .search.suggest import suggestion_index
+from .search.text import tokenize
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
@@ -54,6 +71,7 @@ from django.core.mail.message import EmailMultiAlternatives
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 import threading
+import time
 import traceback
 
 
@@ -338,27 +356,15 @@ def logout_user(request):
     return redirect('index')
 
 def index(request):
-    # Get featured ads
-    featured_ads = Ad.objects.filter(
-        status='approved',  # Use status instead of is_approved
-        featuredad__featured_start_date__lte=timezone.now(),
-        featuredad__featured_expiry_date__gte=timezone.now()
-    ).prefetch_related('images')
-    
-    # Get all categories with approved ads
-    categories = Category.objects.annotate(
-        approved_ads_count=Count('ad', filter=Q(ad__status='approved'))
-    ).prefetch_related(
-        Prefetch(
-            'ad_set',
-            queryset=Ad.objects.filter(status='approved').order_by('-created_at')[:20],  # Show 20 ads
-            to_attr='approved_ads'
-        )
-    )
+    # Featured ads and category rails come from the precomputed snapshot,
+    # rebuilt in the background when approvals or featuring change
+    snapshot = homepage_snapshot()
     
     return render(request, 'base/index.html', {
-        'categories': categories,
-        'featured_products': featured_ads,
+        'categories': snapshot['categories'],
+        'featured_count': snapshot['featured_count'],
+        # Least-served featured ads for the slots, weighted by paid days
+        'featured_slots': pick_featured_slots(),
     })
 def category_detail(request, category_id):
     """
@@ -371,7 +377,7 @@ def category_detail(request, category_id):
     ads = Ad.objects.filter(
         category=category, 
         status='approved'
-    ).select_related('category').prefetch_related('images').order_by('-created_at')
+    ).select_related('category').defer('search_vector').order_by('-created_at')
     
     # Group ads by their type based on the category
     subcategories = group_ads_by_type(category.name, ads)
@@ -554,12 +560,8 @@ def handle_redirect(request, category_id):
     """
     return category_detail(request, category_id)
 def menu(request):
-    # Get approved ads that are currently featured
-    featured_ads = Ad.objects.filter(
-        is_approved=True,
-        featuredad__featured_start_date__lte=timezone.now(),
-        featuredad__featured_expiry_date__gte=timezone.now()
-    ).prefetch_related('featuredad')
+    # Get approved ads that are currently featured (kept current by base.featured)
+    featured_ads = Ad.objects.filter(status='approved', is_featured=True).defer('search_vector')
 
     # Handle 'is_paid' from GET parameters
     is_paid = request.GET.get('is_paid', 'false').lower() == 'true'
@@ -821,11 +823,9 @@ def toggle_favorite(request, ad_id):
 @login_required(login_url='login')
 def my_favorites(request):
     categories = Category.objects.all()
-    # Get user's favorites with related ad data and prefetch images
+    # Get user's favorites with related ad data; cards read Ad.cover_image_url
     favorites = Favorite.objects.filter(user=request.user).select_related(
         'ad__category'
-    ).prefetch_related(
-        'ad__images'
     )
     
 
@@ -843,14 +843,17 @@ def product_detail(request, ad_id):
     ad = get_object_or_404(Ad, pk=ad_id)
     categories = Category.objects.all()
     
-    # Increment view count
-    Ad.objects.filter(pk=ad.pk).update(views=F('views') + 1)
+    # Increment view count (buffered, written in batches)
+    record_view(ad.pk, visitor_key(request))
     
-    # Get similar items
-    similar_items = Ad.objects.filter(
-        category=ad.category, 
-        status='approved'
-    ).exclude(id=ad.id).order_by('-created_at')[:6]
+    # Get similar items, precomputed by build_similar_ads; ads approved
+    # since the last build fall back to the newest in the category
+    similar_items = list(similar_ads(ad))
+    if not similar_items:
+        similar_items = Ad.objects.filter(
+            category=ad.category, 
+            status='approved'
+        ).exclude(id=ad.id).defer('search_vector').order_by('-created_at')[:6]
     
     # Get user's favorites if authenticated
     if request.user.is_authenticated:
@@ -910,8 +913,6 @@ def product_detail(request, ad_id):
                     rating.save()
                     messages.success(request, 'Thank you for your rating!')
                 
-                # Update seller stats
-                seller_stats.update_stats()
                 return redirect('product_detail', ad_id=ad_id)
     
     # Comment form handling (your existing code)
@@ -926,13 +927,14 @@ def product_detail(request, ad_id):
     else:
         form = CommentForm()
         
-    comments = Comment.objects.filter(ad=ad, parent=None)
+    comments, next_comments = thread_page(ad)
     
     return render(request, 'base/ad_detail.html', {
         'ad': ad,
         'categories': categories,
         'form': form,
         'comments': comments,
+        'next_comments': next_comments,
         'user_favorites': user_favorites,
         'similar_items': similar_items,
         'seller_stats': seller_stats,
@@ -943,128 +945,170 @@ def product_detail(request, ad_id):
 @login_required
 def delete_rating(request, rating_id):
     rating = get_object_or_404(SellerRating, id=rating_id, rater=request.user)
-    seller = rating.seller
     rating.delete()
     
-    # Update seller stats
-    seller_stats = seller.get_seller_stats()
-    seller_stats.update_stats()
-    
     messages.success(request, 'Your rating has been deleted.')
     return redirect('base/product_detail', ad_id=request.GET.get('next', ''))
-def search_ads(request):
+def search_context(params):
+    """Template context of a search, for the view and the cache warmer"""
     # Get search parameters
     categories = Category.objects.all()
-    keyword = request.GET.get('q', '').strip()
-    location = request.GET.get('location', '').strip()
-    category_id = request.GET.get('category', '').strip()
-    
-    # Start with approved ads only
-    base_query = Ad.objects.filter(status='approved')
-    ads = base_query
-    has_exact = False
-    has_similar = False
-    
-    # Extract state from location if possible
-    state = None
-    if location:
-        state_match = re.search(r'\b([A-Z]{2})\b', location, re.IGNORECASE)
-        state = state_match.group(1).upper() if state_match else None
+    keyword = params.get('q', '').strip()
+    location = params.get('location', '').strip()
+    category_id = params.get('category', '').strip()
     
-    # Build dynamic filters for exact matches
-    exact_filters = Q()
+    # Start with approved ads only; the listing never shows the tsvector
+    base_query = Ad.objects.filter(status='approved').select_related('category').defer('search_vector')
+
+    # Structured parts of the query ("under 5k", "2015", "Hargeisa") become
+    # indexed filters; choice words ("car", "automatic") stay in the text
+    # and only raise ads with that value. Explicit filter parameters win
+    # over what the parser found
+    parsed = parse_query(keyword, categories)
+    base_query = base_query.filter(**parsed.filters)
+    boost = Q(**parsed.boosts) if parsed.boosts else None
+    if not location and parsed.location:
+        location = parsed.location
+    if not category_id and parsed.category:
+        category_id = str(parsed.category.id)
     
-    # Keyword search (search multiple fields)
-    if keyword:
-        keyword_query = Q()
-        for word in keyword.split():
-            keyword_query |= (
-                Q(name__icontains=word) |
-                Q(description__icontains=word) |
-                Q(motortype__icontains=word) |
-                Q(geartype__icontains=word) |
-                Q(color__icontains=word)
-            )
-        exact_filters &= keyword_query
-    
-    # Location search
-    if location:
-        location_query = Q()
-        location_query |= Q(location__icontains=location)
-        
-        if state:
-            location_query |= Q(location__icontains=state)
-        
-        exact_filters &= location_query
+    # Location only decides the tier: ads elsewhere still show as close matches.
+    # Known places are an indexed lookup on Ad.place; anything outside the
+    # gazetteer falls back to matching the free text
+    location_query = Q()
+    place = resolve_location(location) if location else None
+    if place:
+        location_query = location_filter(place)
+    elif location:
+        location_query = Q(location__icontains=location)
+
+    # Radius search around the browser's position ("near me") or the place
+    radius = params.get('radius', '').strip()
+    center = None
+    try:
+        radius = min(float(radius), MAX_RADIUS_KM) if radius else None
+        if params.get('lat') and params.get('lon'):
+            center = (float(params['lat']), float(params['lon']))
+    except ValueError:
+        radius = center = None
+    if center is None and place and place.latitude is not None:
+        center = (place.latitude, place.longitude)
+    if radius and radius > 0 and center and -90 <= center[0] <= 90 and -180 <= center[1] <= 180:
+        base_query = within_radius(base_query, center[0], center[1], radius)
+    else:
+        radius = None
     
     # Category search (direct category only - no subcategories)
+    category_name = ""
     if category_id:
-        try:
-            # Filter by direct category only
-            exact_filters &= Q(category__id=category_id)
-        except (ValueError, Category.DoesNotExist):
-            # Handle invalid category IDs gracefully
-            pass
-    
-    # Apply all filters for exact matches
-    ads = base_query.filter(exact_filters).order_by('-is_featured', '-created_at')
-    has_exact = ads.exists()
+        category = next((c for c in categories if str(c.id) == category_id), None)
+        if category:
+            base_query = base_query.filter(category=category)
+            category_name = category.name
+        else:
+            category_id = ''
     
-    # SIMILAR ADS - Only show same category vehicles
-    similar_ads = base_query.none()
-    if not has_exact or ads.count() < 5:
-        similar_query = Q()
-        
-        # Maintain the same category filter for similar listings
-        if category_id:
-            try:
-                # Filter by direct category only
-                similar_query &= Q(category__id=category_id)
-            except (ValueError, Category.DoesNotExist):
-                pass
-        
-        # Keyword similarity (match any word)
-        if keyword:
-            keyword_similar = Q()
-            for word in keyword.split()[:3]:  # Limit to first 3 words
-                keyword_similar |= (
-                    Q(name__icontains=word) |
-                    Q(description__icontains=word)
-                )
-            similar_query &= keyword_similar
-        
-        # Apply similar query and exclude exact matches
-        similar_ads = base_query.filter(similar_query).exclude(id__in=ads.values_list('id', flat=True))
-        
-        # Order by featured and date
-        similar_ads = similar_ads.order_by('-is_featured', '-created_at')[:8]
-        
-        has_similar = similar_ads.exists()
+    # Facet drill-down filters
+    ad_type = params.get('ad_type', '').strip()
+    if ad_type in dict(Ad.AD_TYPE_CHOICES):
+        base_query = base_query.filter(ad_type=ad_type)
+    else:
+        ad_type = ''
+    price_range = params.get('price', '').strip()
+    price_filter = price_bucket_filter(price_range)
+    if price_filter:
+        base_query = base_query.filter(**price_filter)
+    else:
+        price_range = ''
     
-    # Get category name if exists
-    category_name = ""
-    if category_id:
-        try:
-            category_name = Category.objects.get(id=category_id).name
-        except (ValueError, Category.DoesNotExist):
-            pass
+    # Every page of a search is scored at the time of its first page, which
+    # the cursors carry along
+    scored_at = scoring_time(params.get('after') or params.get('before'))
+
+    def run_search(text):
+        # One ranked query covers both exact and close matches
+        ads = rank_ads(base_query, text, exact_filter=location_query, boost=boost, now=scored_at)
+
+        # Facet counts and the page's ad ids are cached per query until an
+        # ad in the searched category (or any ad, across categories) changes
+        search_params = {
+            'q': tokenize(text),
+            'location': location.lower(),
+            'category': category_id,
+            'ad_type': ad_type,
+            'price': price_range,
+            'radius': radius,
+            'center': center if radius else None,
+            'filters': parsed.filters,
+            'boosts': parsed.boosts,
+        }
+        facets = cached_facets(ads, search_params)
+
+        # Keyset pagination: no OFFSET scan and a capped count
+        paginator = KeysetPaginator(ads, 12, snapshot=scored_at)
+        page_ads = cached_page(
+            paginator, search_params,
+            after=params.get('after'),
+            before=params.get('before'),
+        )
+        return facets, page_ads
+
+    facets, page_ads = run_search(parsed.text)
+
+    # "Did you mean": a query without hits is retried once with misspelled
+    # words corrected; otherwise the correction is only offered as a link
+    spelling = spelling_corrections(parsed.text) if parsed.text else {}
+    corrected_from = ''
+    suggested_query = ''
+    if spelling:
+        first_page = not params.get('after') and not params.get('before')
+        if first_page and not page_ads.object_list:
+            facets, page_ads = run_search(correct_spelling(parsed.text, spelling))
+            corrected_from = keyword
+            keyword = correct_spelling(keyword, spelling)
+        else:
+            suggested_query = correct_spelling(keyword, spelling)
 
-    # Pagination
-    paginator = Paginator(ads, 12)
-    page_number = request.GET.get('page')
-    page_ads = paginator.get_page(page_number)
+    # Split the page into tiers in memory instead of querying each one
+    exact_ads = [ad for ad in page_ads if ad.match_tier == EXACT_TIER]
+    close_matches = [ad for ad in page_ads if ad.match_tier == CLOSE_TIER]
     
-    return render(request, 'base/search_results.html', {
+    return {
         'ads': page_ads,
-        'similar_ads': similar_ads,
+        'exact_ads': exact_ads,
+        'similar_ads': close_matches,
         'keyword': keyword,
         'location': location,
         'categories': categories,
         'category_name': category_name,
-        'has_exact': has_exact,
-        'has_similar': has_similar,
-        'has_results': has_exact or has_similar
-    })
+        'facets': facets,
+        'ad_type_label': dict(Ad.AD_TYPE_CHOICES).get(ad_type, ''),
+        'price_label': price_bucket_label(int(price_range)) if price_range else '',
+        'radius': radius,
+        'radius_choices': RADIUS_CHOICES,
+        'query_labels': parsed.labels,
+        'corrected_from': corrected_from,
+        'suggested_query': suggested_query,
+        'can_search_radius': bool(place and place.latitude is not None) or bool(params.get('lat')),
+        'has_exact': bool(exact_ads),
+        'has_similar': bool(close_matches),
+        'has_results': bool(page_ads.object_list)
+    }
+
+def search_ads(request):
+    started = time.monotonic()
+    context = search_context(request.GET)
+    response = render(request, 'base/search_results.html', context)
+    # Rendering evaluates the count, so logging it costs no extra query
+    results = context['ads'].paginator.count if context['has_results'] else 0
+    record_search(request.GET, results, (time.monotonic() - started) * 1000)
+    return response
+
+def search_suggest(request):
+    """Typeahead suggestions served from the in-memory prefix index"""
+    prefix = request.GET.get('q', '').strip()[:50]
+    suggestions = suggestion_index.search(prefix) if prefix else []
+    return JsonResponse({'suggestions': suggestions})
 
 @login_required(login_url='login')
 def add_comment(request, ad_id):
@@ -1080,17 +1124,46 @@ def add_comment(request, ad_id):
     return redirect('product_detail', ad_id=ad_id)
 
 
+def comment_threads(request, ad_id):
+    """The next page of comment threads, for "load more" on the ad page"""
+    ad = get_object_or_404(Ad, pk=ad_id)
+    try:
+        after = int(request.GET.get('after', ''))
+    except ValueError:
+        after = None
+    comments, next_comments = thread_page(ad, after=after)
+    html = render_to_string('base/comment_threads.html', {'comments': comments}, request=request)
+    return JsonResponse({'html': html, 'next': next_comments})
+
+
+def top_sellers(request):
+    """Leaderboard of sellers by Bayesian reputation, optionally per category and place"""
+    categories = Category.objects.all()
+    category = None
+    category_id = request.GET.get('category', '').strip()
+    if category_id:
+        category = next((c for c in categories if str(c.id) == category_id), None)
+    location = request.GET.get('location', '').strip()
+    place = resolve_location(location) if location else None
+
+    return render(request, 'base/top_sellers.html', {
+        'categories': categories,
+        'category': category,
+        'location': location,
+        'place': place,
+        'ranks': seller_leaderboard(category=category, place=place),
+    })
 
 
 def view_profile(request, username):
     user = get_object_or_404(User, username=username)
-    ads = Ad.objects.filter(advertiser=user)
+    ads = Ad.objects.filter(advertiser=user).defer('search_vector')
     return render(request, 'base/profile.html', {'user': user, 'ads': ads})
 
 
 def view_advertiser_profile(request, username):
     user = User.objects.get(username=username)
-    ads = Ad.objects.filter(advertiser=user)
+    ads = Ad.objects.filter(advertiser=user).defer('search_vector')
     
     return render(request, 'base/view_advertiser_profile.html', {'advertiser': user, 'ads': ads})
 
@@ -1110,7 +1183,7 @@ def product_list(request, category_id):
     category = get_object_or_404(Category, pk=category_id)
     categories = Category.objects.all()
 
-    ads = Ad.objects.filter(category=category)
+    ads = Ad.objects.filter(category=category).defer('search_vector')
     return render(request, 'base/product_list.html', {'categories': categories,'category': category, 'ads': ads})
 
 @login_required(login_url='login')
@@ -1144,7 +1217,14 @@ def reply_to_comment(request, comment_id):
 def dashboard(request):
     user = request.user
     categories = Category.objects.all()
-    ads = Ad.objects.filter(advertiser=user).order_by('-created_at')
+    ads = list(Ad.objects.filter(advertiser=user).defer('search_vector').order_by('-created_at'))
+
+    ad_ids = [ad.pk for ad in ads]
+    visitors_week = unique_visitors(ad_ids, days=7)
+    visitors_total = unique_visitors(ad_ids)
+    for ad in ads:
+        ad.unique_visitors_week = visitors_week[ad.pk]
+        ad.unique_visitors = visitors_total[ad.pk]
 
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=user)
@@ -1182,5 +1262,5 @@ class AdDetailView(DetailView):
 
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        Ad.objects.filter(pk=obj.pk).update(views=F('views') + 1)
+        record_view(obj.pk, visitor_key(self.request))
         return obj
\ No newline at end of file